@@ -0,0 +1,337 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local stand-in for a vLLM-style OpenAI-compatible server with automatic prefix caching.
+
+Requests to /v1/chat/completions are rendered into one prompt string the way
+a chat template would (role markers, text, a fixed-size placeholder per
+image), cut into blocks and looked up in an LRU prefix cache keyed by chained
+block hashes, as vLLM's automatic prefix caching does: a block hits only if
+every block before it hit too. The reply is a fixed string or comes from a
+callable, and the usage reports `prompt_tokens_details.cached_tokens`.
+Optionally the server sleeps for the prefill of the uncached tokens and a
+fixed decode time, so latency follows the cache hit rate.
+
+For throughput runs the server also takes a latency distribution added to
+every request (`--latency lognormal:800,0.4`), a weighted set of replies
+drawn per request (`--replies replies.json`, a list of strings or of
+{"text": ..., "weight": ...}) and an error rate answered with 429 or 503 as a
+loaded endpoint would; all draws come from one seeded generator.
+
+    python benchmarks/mock_vlm_server.py --port 8000 --reply "<action>...</action>"
+    python benchmarks/mock_vlm_server.py --latency uniform:200,1200 --replies replies.json --error_rate 0.02
+    GET  /stats   cache and request counters
+    POST /reset   clear the cache and the counters
+
+Token counts are estimated as characters / 4, which is enough to compare
+prompt layouts with each other.
+"""
+
+import sys
+import math
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+BLOCK_TOKENS = 16
+IMAGE_TOKENS = 1024
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+
+def parse_latency(spec):
+    """
+    Latency distribution in milliseconds from `spec`; returns a callable taking a random.Random.
+    fixed:MS | uniform:LO,HI | normal:MEAN,STD | lognormal:MEDIAN,SIGMA (None/empty: no latency)
+    """
+    if not spec:
+        return None
+    name, _, values = spec.partition(':')
+    try:
+        values = [float(value) for value in values.split(',')] if values else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}.get(name)
+    if expected is None or len(values) != expected:
+        raise ValueError(f"Invalid latency spec: {spec} (use one of {', '.join(LATENCY_DISTRIBUTIONS)})")
+    if name == 'fixed':
+        return lambda rng: values[0]
+    if name == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == 'normal':
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    return lambda rng: values[0] * math.exp(rng.gauss(0.0, values[1]))
+
+
+def load_replies(path):
+    """Weighted replies from a JSON file: a list of strings or of {"text": ..., "weight": ...}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    return [(item, 1.0) if isinstance(item, str) else (item['text'], float(item.get('weight', 1.0))) for item in items]
+
+
+def render_prompt(messages, image_tokens=IMAGE_TOKENS):
+    """Chat-template-like prompt of `messages`; every image becomes `image_tokens` tokens derived from its URL."""
+    parts = []
+    for message in messages:
+        parts.append(f"<|im_start|>{message.get('role', 'user')}\n")
+        content = message.get('content') or ''
+        if isinstance(content, str):
+            content = [{'type': 'text', 'text': content}]
+        for part in content:
+            if part.get('type', 'text') == 'text':
+                parts.append(part.get('text', ''))
+                continue
+            url = (part.get('image_url') or {}).get('url', '')
+            digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+            size = image_tokens * CHARS_PER_TOKEN
+            parts.append('<|vision_start|>' + (digest * (size // len(digest) + 1))[:size] + '<|vision_end|>')
+        parts.append('<|im_end|>\n')
+    parts.append('<|im_start|>assistant\n')
+    return ''.join(parts)
+
+
+class PrefixCache:
+    """LRU cache of prompt blocks keyed by the hash of the block and every block before it."""
+
+    def __init__(self, capacity_blocks=65536, block_chars=BLOCK_TOKENS * CHARS_PER_TOKEN):
+        self.capacity_blocks = capacity_blocks
+        self.block_chars = block_chars
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt):
+        """Return the number of prompt characters served from the cache and store the prompt's blocks."""
+        cached = 0
+        parent = b''
+        hit = True
+        with self._lock:
+            for start in range(0, len(prompt) - self.block_chars + 1, self.block_chars):
+                parent = hashlib.sha1(parent + prompt[start:start + self.block_chars].encode('utf-8')).digest()
+                if hit and parent in self._blocks:
+                    self._blocks.move_to_end(parent)
+                    cached += self.block_chars
+                    continue
+                hit = False
+                self._blocks[parent] = True
+                if len(self._blocks) > self.capacity_blocks:
+                    self._blocks.popitem(last=False)
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+class MockVLMServer:
+    """
+    :param reply: reply text, or a callable taking the request's messages and returning it
+    :param prefill_ms_per_1k: simulated prefill time per 1000 uncached prompt tokens
+    :param decode_ms: simulated decode time per request
+    :param latency: extra latency per request, a parse_latency spec or callable
+    :param replies: [(text, weight)] drawn per request instead of `reply`
+    :param error_rate: share of requests answered with 429 or 503 instead of a completion
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reply='OK', prefill_ms_per_1k=0.0, decode_ms=0.0,
+                 cache_blocks=65536, image_tokens=IMAGE_TOKENS, latency=None, replies=None, error_rate=0.0, seed=42):
+        self.reply = reply
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self.decode_ms = decode_ms
+        self.image_tokens = image_tokens
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.replies = replies
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.cache = PrefixCache(cache_blocks)
+        self._lock = threading.Lock()
+        self.reset()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset(self):
+        self.cache.clear()
+        with self._lock:
+            self.requests = 0
+            self.prompt_tokens = 0
+            self.cached_tokens = 0
+            self.busy_seconds = 0.0
+            self.errors = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'prompt_tokens': self.prompt_tokens,
+                'cached_tokens': self.cached_tokens,
+                'hit_ratio': self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                'busy_seconds': self.busy_seconds,
+                'errors': self.errors,
+            }
+
+    def draw_error(self):
+        """Status of an injected error for the next request, or None."""
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self.rng.random() >= self.error_rate:
+                return None
+            self.errors += 1
+            return self.rng.choice((429, 503))
+
+    def complete(self, body):
+        """Answer one chat completion request body (a dict)."""
+        messages = body.get('messages', [])
+        prompt = render_prompt(messages, self.image_tokens)
+        cached_chars = self.cache.lookup(prompt)
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+        cached_tokens = cached_chars // CHARS_PER_TOKEN
+        delay_ms = self.prefill_ms_per_1k * (prompt_tokens - cached_tokens) / 1000 + self.decode_ms
+        if self.latency is not None or self.replies:
+            with self._lock:
+                if self.latency is not None:
+                    delay_ms += self.latency(self.rng)
+                if self.replies:
+                    text = self.rng.choices([reply for reply, _ in self.replies], [weight for _, weight in self.replies])[0]
+        delay = delay_ms / 1000
+        if delay > 0:
+            time.sleep(delay)
+        if not self.replies:
+            text = self.reply(messages) if callable(self.reply) else self.reply
+        completion_tokens = len(text) // CHARS_PER_TOKEN
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.busy_seconds += delay
+        return {
+            'id': f'chatcmpl-mock-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': cached_tokens},
+            },
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip('/').endswith('/stats'):
+                    self._send(200, server.stats())
+                else:
+                    self._send(404, {'error': {'message': f'unknown path {self.path}'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if self.path.rstrip('/').endswith('/reset'):
+                    server.reset()
+                    self._send(200, server.stats())
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': f'unknown path {self.path}'}})
+                    return
+                try:
+                    body = json.loads(raw or b'{}')
+                except ValueError as e:
+                    self._send(400, {'error': {'message': f'invalid JSON: {e}'}})
+                    return
+                status = server.draw_error()
+                if status is not None:
+                    self._send(status, {'error': {'message': 'injected error', 'code': status}}, {'Retry-After': '1'})
+                    return
+                self._send(200, server.complete(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread; returns self."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock VLM server with simulated automatic prefix caching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--reply", default="OK", help="Reply text of every request.")
+    parser.add_argument("--prefill_ms_per_1k", type=float, default=0.0, help="Simulated prefill time per 1000 uncached prompt tokens.")
+    parser.add_argument("--decode_ms", type=float, default=0.0, help="Simulated decode time per request.")
+    parser.add_argument("--cache_blocks", type=int, default=65536, help="Prefix cache capacity in blocks of 16 tokens.")
+    parser.add_argument("--latency", default=None, help="Extra latency per request in ms: fixed:MS, uniform:LO,HI, normal:MEAN,STD or lognormal:MEDIAN,SIGMA.")
+    parser.add_argument("--replies", default=None, help="JSON file of weighted replies drawn per request (overrides --reply).")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of requests answered with 429/503.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the latency, reply and error draws.")
+    args = parser.parse_args()
+
+    server = MockVLMServer(args.host, args.port, reply=args.reply, prefill_ms_per_1k=args.prefill_ms_per_1k,
+                           decode_ms=args.decode_ms, cache_blocks=args.cache_blocks, latency=parse_latency(args.latency),
+                           replies=load_replies(args.replies) if args.replies else None,
+                           error_rate=args.error_rate, seed=args.seed)
+    print(f"Mock VLM server on {server.base_url}", file=sys.stderr)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prefix-cache reuse of the agents' prompt layouts.
+
+Runs episodes of each agent backend against the mock VLM server (a local
+stand-in for vLLM with automatic prefix caching) on synthetic screenshots and
+reports, per backend and history setting, how many prompt tokens the server
+served from its prefix cache. The replies are scripted per backend so every
+step parses and the history grows as in a real episode.
+
+    python benchmarks/prefix_cache.py --steps 20 --tasks 3
+    python benchmarks/prefix_cache.py --backends vanilla plan-reflect --output prefix_cache.json
+"""
+
+import os
+import sys
+import json
+import copy
+import logging
+import argparse
+import tempfile
+import itertools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml
+from PIL import Image, ImageDraw
+
+from mock_vlm_server import MockVLMServer
+from src.agent.registry import load_backend, create_mode_agent
+
+HISTORY_SETTINGS = {
+    'full': None,
+    'window': {'window': 8},
+    'window+fold': {'window': 8, 'fold_every': 4},
+}
+
+
+def _vanilla(n):
+    return ('<action>\n{"name": "mobile_use", "arguments": {"action": "click", "coordinate": [%d, 500]}}\n</action>\n'
+            '<thinking>\nTap the item in row %d\n</thinking>' % (100 + n, n))
+
+
+def _qwen3(n):
+    return ('Thought: Row %d is the next item.\nAction: Tap the item in row %d.\n<tool_call>\n'
+            '{"name": "mobile_use", "arguments": {"action": "click", "coordinate": [%d, 500]}}\n</tool_call>' % (n, n, 100 + n))
+
+
+def _atlas(n):
+    return 'Thoughts: Tap the item in row %d.\nActions: CLICK <point>[[%d,500]]</point>' % (n, 100 + n)
+
+
+def _tars(n):
+    return "Thought: Tap the item in row %d.\nAction: click(start_box='(%d,500)')" % (n, 100 + n)
+
+
+def _plan_reflect(n, messages):
+    system = ''.join(part.get('text', '') for part in messages[0]['content']) if messages[0]['role'] == 'system' else ''
+    user = ''.join(part.get('text', '') for part in messages[-1]['content'] if part.get('type') == 'text')
+    if 'planner' in system:
+        return '<reasoning>\nRow %d is next.\n</reasoning>\n<action_plan>\nTap the item in row %d\n</action_plan>' % (n, n)
+    if 'analyst' in system:
+        return ('<reasoning>\nThe screen changed as planned.\n</reasoning>\n<planning_reflection>\nNo issues found in planning.\n'
+                '</planning_reflection>\n<execution_reflection>\nNo issues found in execution.\n</execution_reflection>')
+    if 'memory agent' in system or 'memory agent' in user:
+        return '<memory>\nRow %d shows price %d.\n</memory>' % (n, 10 + n)
+    return ('<action>\n{"name": "mobile_use", "arguments": {"action": "click", "coordinate": [%d, 500]}}\n</action>\n'
+            '<description>\nTap the item in row %d\n</description>' % (100 + n, n))
+
+
+# backend: (config file, key of the agent config, registry target or None for a multi-agent mode, reply)
+BACKENDS = {
+    'vanilla': ('config/default.yaml', 'agent', 'src.agent.agent:VanillaAgent', _vanilla),
+    'qwen3': ('config/qwen3.yaml', 'agent', 'src.agent.agent_qwen3:Qwen3Agent', _qwen3),
+    'atlas': ('config/osatlas.yaml', 'agent', 'src.agent.agent_atlas:AtlasAgent', _atlas),
+    'tars': ('config/uitars.yaml', 'agent', 'src.agent.agent_tars:TarsAgent', _tars),
+    'plan-reflect': ('config/mlas.yaml', 'plan-reflect', None, _plan_reflect),
+}
+
+
+def make_screenshots(folder, count, size=(540, 1170)):
+    """Distinct synthetic screenshots, one per step."""
+    paths = []
+    for i in range(count):
+        image = Image.new('RGB', size, ((37 * i) % 256, (91 * i) % 256, (151 * i) % 256))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([20, 40 + 30 * (i % 30), size[0] - 20, 60 + 30 * (i % 30)], fill=(255, 255, 255))
+        path = os.path.join(folder, f'screen_{i:03d}.png')
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+def load_agent_config(backend, server, history):
+    config_file, key, _, _ = BACKENDS[backend]
+    with open(os.path.join(ROOT, config_file), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    agent_config = copy.deepcopy(config['agent'] if key == 'agent' else config['agent'][key])
+    agent_config.update(api_key='mock', base_url=server.base_url)
+    if history is not None:
+        agent_config['history'] = history
+    return agent_config
+
+
+def run_backend(backend, server, history, screenshots, tasks, steps):
+    _, key, target, reply = BACKENDS[backend]
+    counter = itertools.count(1)
+    if target is None:
+        server.reply = lambda messages: reply(next(counter), messages)
+        agent = create_mode_agent(key, {key: load_agent_config(backend, server, history)})
+    else:
+        server.reply = lambda messages: reply(next(counter))
+        agent = load_backend(target)(load_agent_config(backend, server, history))
+    server.reset()
+    for task in range(tasks):
+        agent.set_task(f'Benchmark task {task}: open the list and check the item in row {steps}')
+        for step in range(steps):
+            agent.agent_step(screenshots[(task * steps + step) % len(screenshots)])
+        if hasattr(agent, 'flush'):
+            agent.flush()
+    if hasattr(agent, 'close'):
+        agent.close()
+    stats = server.stats()
+    stats['prompt_tokens_per_request'] = stats['prompt_tokens'] / stats['requests'] if stats['requests'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prefix-cache reuse of the agents' prompts against a mock vLLM-style server")
+    parser.add_argument("--backends", nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--history", nargs='+', default=list(HISTORY_SETTINGS), choices=list(HISTORY_SETTINGS))
+    parser.add_argument("--tasks", type=int, default=3, help="Episodes per backend (default: 3).")
+    parser.add_argument("--steps", type=int, default=20, help="Steps per episode (default: 20).")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder, MockVLMServer() as server:
+        screenshots = make_screenshots(folder, args.tasks * args.steps)
+        print(f"{'backend':<14} {'history':<12} {'requests':>9} {'prompt tok':>11} {'cached tok':>11} {'hit ratio':>10} {'tok/request':>12}")
+        for backend in args.backends:
+            for name in args.history:
+                row = run_backend(backend, server, HISTORY_SETTINGS[name], screenshots, args.tasks, args.steps)
+                results[f'{backend}/{name}'] = row
+                print(f"{backend:<14} {name:<12} {row['requests']:>9} {row['prompt_tokens']:>11} {row['cached_tokens']:>11} "
+                      f"{row['hit_ratio']:>10.3f} {row['prompt_tokens_per_request']:>12.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Startup-time benchmark of the evaluation entry points.
+
+Every measurement runs in a fresh interpreter, as a short-lived per-shard
+process would: bare interpreter start, importing each entry point, resolving
+each agent backend through the registry, and importing every backend at once
+(what run_colorbench.py used to do).
+
+    python benchmarks/startup_time.py --repeat 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.agent.registry import MODEL_BACKENDS
+
+ENTRY_POINTS = ['run_colorbench', 'run_colorbench_multi_agent', 'run_colorbench_async']
+
+TIMED = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+
+def run_once(code):
+    """Wall time of a fresh interpreter running `code`, and the time spent inside `code`."""
+    start = os.times().elapsed
+    result = subprocess.run([sys.executable, '-c', TIMED.format(code=code)], cwd=ROOT, capture_output=True, text=True)
+    wall = os.times().elapsed - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed')
+    return wall, float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(code, repeat):
+    try:
+        runs = [run_once(code) for _ in range(repeat)]
+    except RuntimeError as e:
+        return {'error': str(e)}
+    return {
+        'wall_median': statistics.median(wall for wall, _ in runs),
+        'import_median': statistics.median(inner for _, inner in runs),
+        'import_min': min(inner for _, inner in runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure interpreter startup and import time of the evaluation entry points")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per measurement (default: 5).")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    cases = {'interpreter': 'pass'}
+    for module in ENTRY_POINTS:
+        cases[f'import {module}'] = f'import {module}'
+    for target in dict.fromkeys(target for _, target in MODEL_BACKENDS):
+        cases[f'backend {target}'] = f"from src.agent.registry import load_backend; load_backend('{target}')"
+    cases['all backends (eager)'] = (
+        "from src.agent.registry import MODEL_BACKENDS, load_backend\n"
+        "for _, target in MODEL_BACKENDS: load_backend(target)"
+    )
+
+    results = {}
+    print(f"{'case':<55} {'wall (s)':>10} {'import (s)':>11} {'min (s)':>9}")
+    for name, code in cases.items():
+        results[name] = measure(code, args.repeat)
+        row = results[name]
+        if 'error' in row:
+            print(f"{name:<55} error: {row['error']}")
+        else:
+            print(f"{name:<55} {row['wall_median']:>10.3f} {row['import_median']:>11.3f} {row['import_min']:>9.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+End-to-end throughput of the evaluation runners without a model endpoint.
+
+Each case runs run_colorbench.py or run_colorbench_multi_agent.py unchanged
+in a fresh process, on a temporary config (a subset of tasks.json, its own
+output folder) and with one of these policies:
+
+- scripted-milestone: replays the milestones of each task (src/agent/scripted_agent.py)
+- scripted-random:    seeded random walk over graph.json
+- mock-vlm:           the real agent (qwen for run_colorbench.py, plan-reflect
+                      for the multi-agent runner) against the local mock VLM
+                      server, with a latency distribution and weighted replies
+
+and reports wall time, steps/s, tasks/s, CPU time and peak RSS of the runner
+process (from os.wait4), at each --workers value of the multi-agent runner.
+Steps are counted from the saved trajectories. Without the screenshot folder
+placeholder screenshots are generated for the mock-vlm policy; the scripted
+policies never read images.
+
+    python benchmarks/throughput.py --tasks 20 --workers 1 4 16
+    python benchmarks/throughput.py --policies mock-vlm --latency lognormal:500,0.5 --error_rate 0.02
+"""
+
+import os
+import sys
+import json
+import copy
+import time
+import logging
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml
+from PIL import Image
+
+from mock_vlm_server import MockVLMServer
+
+# runner: (script, base config)
+RUNNERS = {
+    'single': ('run_colorbench.py', 'config/default.yaml'),
+    'multi': ('run_colorbench_multi_agent.py', 'config/mlas.yaml'),
+}
+
+POLICIES = ('scripted-milestone', 'scripted-random', 'mock-vlm')
+
+# agent of the mock-vlm policy per runner (--model / --mode)
+MOCK_AGENTS = {'single': 'qwen', 'multi': 'plan-reflect'}
+
+
+def _reply(arguments, description):
+    # every tag the vanilla, planner, reflector, executor and memory parsers look for, so one reply fits every phase
+    return ('<reasoning>\n%s\n</reasoning>\n<action_plan>\n%s\n</action_plan>\n'
+            '<planning_reflection>\nNo issues found in planning.\n</planning_reflection>\n'
+            '<execution_reflection>\nNo issues found in execution.\n</execution_reflection>\n'
+            '<memory>\nNothing new to remember.\n</memory>\n'
+            '<action>\n{"name": "mobile_use", "arguments": %s}\n</action>\n'
+            '<description>\n%s\n</description>\n<thinking>\n%s\n</thinking>'
+            % (description, description, json.dumps(arguments), description, description))
+
+
+# weighted replies of the mock-vlm policy: mostly clicks, some swipes and waits, a few terminations
+DEFAULT_REPLIES = [
+    (_reply({'action': 'click', 'coordinate': [540, 1200]}, 'Tap the middle of the screen'), 4.0),
+    (_reply({'action': 'click', 'coordinate': [960, 180]}, 'Tap the top right button'), 2.0),
+    (_reply({'action': 'click', 'coordinate': [120, 2200]}, 'Tap the bottom left tab'), 2.0),
+    (_reply({'action': 'swipe', 'coordinate': [540, 1600], 'coordinate2': [540, 600]}, 'Scroll down the list'), 1.0),
+    (_reply({'action': 'wait', 'time': 1}, 'Wait for the page to load'), 0.5),
+    (_reply({'action': 'terminate', 'status': 'success'}, 'The task is done'), 0.5),
+]
+
+
+def load_yaml(path):
+    with open(os.path.join(ROOT, path), 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def write_tasks(workdir, count):
+    """First `count` tasks of tasks.json (by task_id) as the run's tasks file; returns (path, first id, last id)."""
+    config = load_yaml(RUNNERS['single'][1])
+    with open(os.path.join(ROOT, config['tasks']['tasks_file']), 'r', encoding='utf-8') as f:
+        tasks = sorted(json.load(f), key=lambda item: item.get('task_id', 0))[:count]
+    path = os.path.join(workdir, 'tasks.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tasks, f, ensure_ascii=False)
+    return path, tasks[0].get('task_id', 0), tasks[-1].get('task_id', 0)
+
+
+def make_node_images(folder, graph_file):
+    """Placeholder screenshot for every node of the graph, named like the node."""
+    os.makedirs(folder, exist_ok=True)
+    with open(graph_file, 'r', encoding='utf-8') as f:
+        nodes = set(json.load(f))
+    for i, node in enumerate(sorted(nodes)):
+        Image.new('RGB', (270, 585), ((37 * i) % 256, (91 * i) % 256, (151 * i) % 256)).save(os.path.join(folder, node))
+    return folder
+
+
+def write_config(runner, policy, workdir, tasks_file, max_steps, image_folder, server=None):
+    config = copy.deepcopy(load_yaml(RUNNERS[runner][1]))
+    graph_file = os.path.join(ROOT, config['graph']['graph_file'])
+    config['graph']['graph_file'] = graph_file
+    config['tasks'] = {'tasks_file': tasks_file, 'max_steps': max_steps}
+    config['path'] = {'image_folder': image_folder, 'output_folder': os.path.join(workdir, 'output')}
+    if policy == 'mock-vlm':
+        agent_config = config['agent'] if runner == 'single' else config['agent'][MOCK_AGENTS[runner]]
+        agent_config.update(api_key='mock', base_url=server.base_url)
+    else:
+        agent_config = {'graph_file': graph_file, 'tasks_file': tasks_file, 'root_node': config['graph']['root_node']}
+        if runner == 'single':
+            config['agent'] = agent_config
+        else:
+            config['agent'][policy] = dict(agent_config, plan=False, reflect=False, memory=False)
+    path = os.path.join(workdir, 'config.yaml')
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path, config['path']['output_folder']
+
+
+def count_steps(output_folder):
+    """(tasks, steps) of the trajectories saved under `output_folder`."""
+    tasks = steps = 0
+    for folder, _, files in os.walk(output_folder):
+        if 'trajectory.json' not in files:
+            continue
+        with open(os.path.join(folder, 'trajectory.json'), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        trajectory = data['trajectory'] if isinstance(data, dict) else data
+        tasks += 1
+        steps += sum(1 for step in trajectory if step.get('action') is not None)
+    return tasks, steps
+
+
+def run_case(runner, policy, workers, args, tasks, server, image_folder):
+    """Run one runner process and measure it; returns a result row."""
+    tasks_file, task_start, task_end = tasks
+    with tempfile.TemporaryDirectory(prefix='colorbench_throughput_') as workdir:
+        os.makedirs(os.path.join(workdir, 'log'))
+        config_path, output_folder = write_config(runner, policy, workdir, tasks_file, args.max_steps, image_folder, server)
+        script = os.path.join(ROOT, RUNNERS[runner][0])
+        agent = MOCK_AGENTS[runner] if policy == 'mock-vlm' else policy
+        if runner == 'single':
+            command = [sys.executable, script, '--config', config_path, '--model', agent]
+        else:
+            command = [sys.executable, script, '--config', config_path, '--model', 'throughput', '--mode', agent,
+                       '--max_workers', str(workers), '--task_start', str(task_start), '--task_end', str(task_end)]
+        env = dict(os.environ)
+        # measure the model path, not the record/replay cache
+        env.pop('COLORBENCH_RESPONSE_CACHE', None)
+        if server is not None:
+            server.reset()
+
+        log_path = os.path.join(workdir, 'runner.log')
+        with open(log_path, 'w') as log:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            _, status, usage = os.wait4(process.pid, 0)
+            wall = time.perf_counter() - start
+            process.returncode = os.waitstatus_to_exitcode(status)
+        done, steps = count_steps(output_folder)
+        if process.returncode != 0 or not done:
+            with open(log_path, 'r', errors='replace') as f:
+                lines = f.read().strip().splitlines()
+            errors = [line for line in lines if ' - ERROR - ' in line] or lines[-1:]
+            return {'error': f"exit code {process.returncode}, {done} trajectories: {errors[-1] if errors else ''}"}
+
+        row = {
+            'tasks': done,
+            'steps': steps,
+            'wall_seconds': wall,
+            'steps_per_second': steps / wall if wall else 0.0,
+            'tasks_per_second': done / wall if wall else 0.0,
+            'cpu_seconds': usage.ru_utime + usage.ru_stime,
+            'cpu_utilization': (usage.ru_utime + usage.ru_stime) / wall if wall else 0.0,
+            # ru_maxrss is in KiB on Linux, bytes on macOS
+            'peak_rss_mb': usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        }
+        if server is not None:
+            row['model_requests'] = server.stats()['requests']
+        return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure steps/s, tasks/s, CPU and memory of the evaluation runners with scripted or mock-model policies")
+    parser.add_argument("--runners", nargs='+', default=list(RUNNERS), choices=list(RUNNERS))
+    parser.add_argument("--policies", nargs='+', default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--workers", nargs='+', type=int, default=[1, 4, 16], help="--max_workers values of the multi-agent runner (default: 1 4 16).")
+    parser.add_argument("--tasks", type=int, default=20, help="Number of tasks per case, the first ones by task_id (default: 20).")
+    parser.add_argument("--max_steps", type=int, default=20, help="max_steps of every case (default: 20).")
+    parser.add_argument("--latency", default='lognormal:300,0.5', help="Mock server latency per request in ms (see mock_vlm_server.parse_latency).")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of mock server requests answered with 429/503.")
+    parser.add_argument("--image_folder", default=None, help="Screenshot folder of the mock-vlm policy (default: the config's, else placeholders).")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='colorbench_throughput_') as shared:
+        tasks = write_tasks(shared, args.tasks)
+        server = None
+        image_folder = args.image_folder or os.path.join(ROOT, load_yaml(RUNNERS['single'][1])['path']['image_folder'])
+        if 'mock-vlm' in args.policies:
+            server = MockVLMServer(replies=DEFAULT_REPLIES, latency=args.latency, error_rate=args.error_rate).start()
+            if not os.path.isdir(image_folder):
+                graph_file = os.path.join(ROOT, load_yaml(RUNNERS['single'][1])['graph']['graph_file'])
+                image_folder = make_node_images(os.path.join(shared, 'images'), graph_file)
+        try:
+            print(f"{'runner':<7} {'policy':<19} {'workers':>7} {'tasks':>6} {'steps':>6} {'wall (s)':>9} "
+                  f"{'steps/s':>9} {'tasks/s':>8} {'cpu (s)':>8} {'cpu %':>6} {'rss (MB)':>9}")
+            for runner in args.runners:
+                for policy in args.policies:
+                    for workers in (args.workers if runner == 'multi' else [1]):
+                        row = run_case(runner, policy, workers, args, tasks, server if policy == 'mock-vlm' else None, image_folder)
+                        results[f'{runner}/{policy}/{workers}'] = row
+                        if 'error' in row:
+                            print(f"{runner:<7} {policy:<19} {workers:>7} error: {row['error']}")
+                            continue
+                        print(f"{runner:<7} {policy:<19} {workers:>7} {row['tasks']:>6} {row['steps']:>6} {row['wall_seconds']:>9.2f} "
+                              f"{row['steps_per_second']:>9.1f} {row['tasks_per_second']:>8.2f} {row['cpu_seconds']:>8.2f} "
+                              f"{row['cpu_utilization'] * 100:>6.0f} {row['peak_rss_mb']:>9.1f}")
+        finally:
+            if server is not None:
+                server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,7 @@ import logging
 import colorlog
 from pathlib import Path
 import yaml
+from src.test.graph_binary import load_graph_data
 
 def setup_logging(log_file_path):
     """配置日志系统"""
@@ -97,8 +98,7 @@ def main():
     checkpoint_path = "./checkpoints"
     image_folder = "./final_graph_images_919"
     graph_json = "./final_graph_0914.json"
-    with open(graph_json, 'r', encoding='utf-8') as f:
-        graph_data = json.load(f)
+    graph_data = load_graph_data(graph_json)  # JSON or binary graph
 
     node_bboxes = {}
     for source,targets in graph_data.items():
@@ -15,26 +15,29 @@
 """
 This file is to construct a graph for demonstration-based learning when traversing the trajectory 
 """
-from FlagEmbedding import BGEM3FlagModel, FlagModel
-import torch
 import os
+import sys
 import json
+import shutil
 import logging
 import traceback
 import datetime
 import colorlog
 import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
 from dotenv import load_dotenv
-from src.graph_construction.graph import Graph
+from src.graph_construction.graph import Graph, precompute_descriptions, embeddings_path
+from src.graph_construction.graph_merge import merge_app_graphs, merge_app_embeddings, flatten_graph, default_flat_path
+from src.graph_construction.model_provider import configure_embedding_model
 load_dotenv()
 
-model = FlagModel("./models--BAAI--bge-large-zh-v1.5/snapshots/79e7739b6ab944e86d6171e44d24c997fc1e0116", query_instruction_for_retrieval="为这个句子生成表示以用于检索相关文章：", use_fp16=True)
+logger = logging.getLogger(__name__)
 
-if torch.cuda.is_available():
-    torch.device('cuda:0')
-else:
-    torch.device('cpu')
+# every app worker loads its own embedding model and runs --describe_workers VLM threads
+DEFAULT_APP_WORKERS = 4
 
 def setup_logging(log_file_path):
     """配置日志系统"""
@@ -81,6 +84,67 @@ def main():
         default=None,
         help="Path to save results.",
     )  
+    parser.add_argument(
+        "--index_backend",
+        default='exact',
+        choices=['exact', 'hnsw'],
+        help="Nearest-node search: exact matrix product or approximate HNSW (needs hnswlib).",
+    )
+    parser.add_argument(
+        "--vlm_top_k",
+        type=int,
+        default=3,
+        help="Candidate nodes per insert that may be checked by the VLM (default: 3).",
+    )
+    parser.add_argument(
+        "--phash_reject",
+        type=int,
+        default=None,
+        help="Skip candidates more than this many dHash bits (of 64) away without a VLM call and send the closest ones to the VLM first, e.g. 24 (default: off, rank by text similarity).",
+    )
+    parser.add_argument(
+        "--describe_workers",
+        type=int,
+        default=8,
+        help="Concurrent VLM requests of the description pre-pass (default: 8, 0 disables the pre-pass).",
+    )
+    parser.add_argument(
+        "--embed_batch_size",
+        type=int,
+        default=256,
+        help="Descriptions per model.encode batch in the pre-pass (default: 256).",
+    )
+    parser.add_argument(
+        "--app",
+        default='美团',
+        help="App of the trajectories (default app of trajectories without one in --by_app mode).",
+    )
+    parser.add_argument(
+        "--by_app",
+        action='store_true',
+        help="Shard trajectories by app, build the app graphs in parallel processes and merge them.",
+    )
+    parser.add_argument(
+        "--app_workers",
+        type=int,
+        default=None,
+        help=f"Processes building app graphs in --by_app mode; each loads its own embedding model and runs --describe_workers VLM requests (default: min(apps, {DEFAULT_APP_WORKERS})).",
+    )
+    parser.add_argument(
+        "--embedding_model",
+        default=None,
+        help="FlagEmbedding model for description embeddings, loaded on first use (default: $EMBEDDING_MODEL_PATH).",
+    )
+    parser.add_argument(
+        "--base_graph",
+        default=None,
+        help="Incremental ingest: load this saved graph with its stored embeddings, add only trajectories it does not contain yet, and write the updated snapshot plus a delta file.",
+    )
+    parser.add_argument(
+        "--flat_output",
+        default=None,
+        help="Path of the flattened {screenshot: {screenshot: [actions]}} graph (default: <output_file>_flat.json).",
+    )
 
     log_file_path = './results/construct_graph.log'
     setup_logging(log_file_path)
@@ -92,6 +156,8 @@ def main():
     # If output file is not specified, create one based on input filename
     if args.input_folder is None:
         input_folder = Path('./examples/trajectories')
+    else:
+        input_folder = Path(args.input_folder)
     if args.output_file is None:
         output_path = Path('./results/graph.json')
     else:
@@ -105,10 +171,68 @@ def main():
     logger.info(f"Input folder path: {input_folder}")
     logger.info(f"Output file: {output_path}")
 
-    graph = Graph(app='美团')
-    task_dirs = os.listdir(input_folder) 
+    options = {
+        'index_backend': args.index_backend,
+        'vlm_top_k': args.vlm_top_k,
+        'phash_reject': args.phash_reject,
+        'describe_workers': args.describe_workers,
+        'embed_batch_size': args.embed_batch_size,
+        'embedding_model': args.embedding_model,
+    }
+    configure_embedding_model(args.embedding_model)
+    tasks = load_trajectory_tasks(input_folder)
+
+    if args.base_graph is not None:
+        if args.by_app:
+            raise ValueError("--base_graph cannot be combined with --by_app")
+        graph_data = ingest_graph(args.base_graph, tasks, input_folder, options, output_path, default_app=args.app)
+    elif not args.by_app:
+        graph = build_graph(args.app, tasks, input_folder, options, output_path)
+        graph_data = graph.to_dict()
+    else:
+        # nodes of different apps never merge, so every app is built in its own process
+        shards = defaultdict(list)
+        for task_dir, task_data in tasks:
+            shards[task_app(task_data, args.app)].append((task_dir, task_data))
+        app_dir = output_dir / 'apps'
+        os.makedirs(app_dir, exist_ok=True)
+        app_workers = args.app_workers or min(len(shards), DEFAULT_APP_WORKERS) or 1
+        logger.info(f"Building {len(shards)} app graphs with {app_workers} processes: {sorted(shards)}")
+
+        app_paths = {}
+        with ProcessPoolExecutor(max_workers=app_workers) as executor:
+            futures = {
+                executor.submit(build_app_graph, app, app_tasks, input_folder, options, app_dir / f'{app}.json'): app
+                for app, app_tasks in shards.items()
+            }
+            for future in as_completed(futures):
+                app = futures[future]
+                try:
+                    app_paths[app] = future.result()
+                    logger.info(f"App graph of {app} finished: {app_paths[app]}")
+                except Exception as e:
+                    logger.error(f"构建 {app} 的图时出错: {e}")
+
+        failed_apps = sorted(set(shards) - set(app_paths))
+        if failed_apps:
+            # a merged graph without these apps would look complete, so none is written
+            logger.error(f"以下应用的图构建失败，未写入合并图: {failed_apps} (finished app graphs are kept in {app_dir})")
+            sys.exit(1)
+
+        graph_data = save_merged_graph(app_paths, output_path)
+
+    logger.info(f"Graph saved to {output_path}")
+
+    flat_path = Path(args.flat_output) if args.flat_output else Path(default_flat_path(output_path))
+    with open(flat_path, 'w', encoding='utf-8') as f:
+        json.dump(flatten_graph(graph_data), f, ensure_ascii=False, indent=2)
+    logger.info(f"Flattened graph saved to {flat_path}")
+
 
-    for task_dir in task_dirs:
+def load_trajectory_tasks(input_folder):
+    """Load every `<task_dir>/<task_dir>.json` trajectory under input_folder as [(task_dir, task_data)]."""
+    tasks = []
+    for task_dir in os.listdir(input_folder):
         if task_dir.endswith('.json'):
             continue
 
@@ -121,7 +245,43 @@ def main():
         except Exception as e:
             logger.info(f"错误: 加载 {task_dir} 的json文件时出错: {str(e)}")
             continue
-        
+        tasks.append((task_dir, task_data))
+    return tasks
+
+
+def task_app(task_data, default_app):
+    """App of a trajectory: its 'app' field, else the app of its first open action, else default_app."""
+    if task_data.get('app'):
+        return task_data['app']
+    for step_data in task_data.get('trajectory', []):
+        try:
+            action = json.loads(step_data['action'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if str(action.get('action_type', '')).lower() == 'open' and action.get('app'):
+            return action['app']
+    return default_app
+
+
+def build_graph(app, tasks, input_folder, options, output_path, graph=None, checkpoint=True):
+    """
+    Build the graph of one app from its trajectories, or add them to `graph`.
+    With checkpoint the graph is saved after every task.
+    """
+    if graph is None:
+        graph = Graph(app=app, index_backend=options['index_backend'], vlm_top_k=options['vlm_top_k'], phash_reject=options['phash_reject'])
+
+    # pre-pass: describe every observation concurrently and embed the descriptions in batches
+    precomputed = {}
+    if options['describe_workers'] > 0:
+        image_paths = [
+            os.path.join(input_folder, task_dir, f'observation_{i}.png')
+            for task_dir, task_data in tasks
+            for i in range(len(task_data['trajectory']))
+        ]
+        precomputed = precompute_descriptions(image_paths, app=app, max_workers=options['describe_workers'], batch_size=options['embed_batch_size'])
+
+    for task_dir, task_data in tasks:
         query = task_data['task']   
         logger.info(f"Processing task: {query} with id {task_dir}")
         new_trajectory = True
@@ -132,13 +292,118 @@ def main():
             logger.info(f"Start Updating graph with step {i+1} for task {query}")
             step_data['screenshot'] = os.path.join(input_folder, task_dir, f'observation_{i}.png')  
             step_data['query'] = query
+            if step_data['screenshot'] in precomputed:
+                step_data['page_description'], step_data['page_embedding'] = precomputed[step_data['screenshot']]
             last_edge, last_node = graph.update(data=step_data, new_trajectory= new_trajectory, last_node=last_node, last_edge=last_edge, threshold=0.85, step=i) 
             new_trajectory = False
             logger.info(f"Updated graph with step {i+1} for task {query}")
+        graph.add_task(task_dir)
 
-        graph.save_graph(save_path=output_path)
+        if checkpoint:
+            graph.save_graph(save_path=output_path)
+    return graph
 
-    logger.info(f"Graph saved to {output_path}")
+
+def save_merged_graph(app_paths, output_path):
+    """Merge the saved app graphs {app: path} into output_path, with their stored embeddings in merged order."""
+    app_graphs, app_embeddings = [], []
+    for app in sorted(app_paths):
+        with open(app_paths[app], 'r', encoding='utf-8') as f:
+            app_graphs.append(json.load(f))
+        stored = embeddings_path(str(app_paths[app]))
+        app_embeddings.append(np.load(stored) if os.path.exists(stored) else None)
+    graph_data = merge_app_graphs(app_graphs)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(graph_data, f, indent=4, ensure_ascii=False, default=str)
+    embeddings = merge_app_embeddings(app_graphs, app_embeddings)
+    if embeddings is not None:
+        np.save(embeddings_path(str(output_path)), embeddings)
+    else:
+        logger.warning(f"Not every app graph has stored embeddings, {output_path} is saved without them")
+    return graph_data
+
+
+def ingest_graph(base_graph_path, tasks, input_folder, options, output_path, default_app=None):
+    """
+    Incremental ingest: load a saved graph with its stored embeddings (no images, no model.encode),
+    insert only the trajectories it does not contain yet and write the updated snapshot to
+    output_path plus a delta next to it. Returns the snapshot dict.
+    A merged --by_app snapshot is ingested app by app, see ingest_app_graphs.
+    """
+    with open(base_graph_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f).get('metadata', {})
+    if metadata.get('apps'):
+        return ingest_app_graphs(base_graph_path, metadata['apps'], tasks, input_folder, options, output_path, default_app)
+
+    graph = Graph(index_backend=options['index_backend'], vlm_top_k=options['vlm_top_k'], phash_reject=options['phash_reject'])
+    graph.load_graph(str(base_graph_path))
+    if not graph.tasks:
+        logger.warning(f"{base_graph_path} does not record its trajectories, every trajectory in the input folder is ingested")
+    known = set(graph.tasks)
+    new_tasks = [(task_dir, task_data) for task_dir, task_data in tasks if task_dir not in known]
+    logger.info(f"Ingesting {len(new_tasks)} new trajectories into {graph} ({len(tasks) - len(new_tasks)} already in the graph)")
+
+    build_graph(graph.app, new_tasks, input_folder, options, output_path, graph=graph, checkpoint=False)
+    graph.save_graph(save_path=output_path)
+    stem, ext = os.path.splitext(str(output_path))
+    graph.save_delta(f"{stem}_delta_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{ext or '.json'}")
+    return graph.to_dict()
+
+
+def ingest_app_graphs(base_graph_path, apps, tasks, input_folder, options, output_path, default_app=None):
+    """
+    Incremental ingest into a merged --by_app snapshot. Nodes of different apps never merge and global
+    node ids are renumbered by every merge, so new trajectories are split by app and ingested into the
+    app graphs under apps/ next to the snapshot (new apps get a new app graph), each app graph writes
+    its own delta, and the app graphs are merged again into output_path.
+    """
+    base_app_dir = Path(base_graph_path).parent / 'apps'
+    app_dir = Path(output_path).parent / 'apps'
+    app_paths = {app: base_app_dir / f'{app}.json' for app in apps}
+    missing = sorted(app for app, path in app_paths.items() if not path.exists())
+    if missing:
+        raise ValueError(f"{base_graph_path} is merged from several app graphs, but {missing} are not in {base_app_dir}")
+
+    known = set()
+    for path in app_paths.values():
+        with open(path, 'r', encoding='utf-8') as f:
+            known.update(json.load(f).get('metadata', {}).get('tasks', []))
+    shards = defaultdict(list)
+    for task_dir, task_data in tasks:
+        if task_dir not in known:
+            shards[task_app(task_data, default_app)].append((task_dir, task_data))
+    logger.info(f"Ingesting {sum(len(app_tasks) for app_tasks in shards.values())} new trajectories into {len(shards)} app graphs "
+                f"of {base_graph_path}: {sorted(shards)}")
+
+    os.makedirs(app_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    for app in sorted(shards):
+        graph = Graph(app=app, index_backend=options['index_backend'], vlm_top_k=options['vlm_top_k'], phash_reject=options['phash_reject'])
+        if app in app_paths:
+            graph.load_graph(str(app_paths[app]))
+        app_path = app_dir / f'{app}.json'
+        build_graph(app, shards[app], input_folder, options, app_path, graph=graph, checkpoint=False)
+        graph.save_graph(save_path=app_path)
+        graph.save_delta(str(app_dir / f'{app}_delta_{stamp}.json'))
+        app_paths[app] = app_path
+    # the next ingest of output_path looks for every app graph next to it
+    for app, path in app_paths.items():
+        if path.parent.resolve() != app_dir.resolve():
+            for source in (str(path), embeddings_path(str(path))):
+                if os.path.exists(source):
+                    shutil.copy(source, app_dir)
+            app_paths[app] = app_dir / path.name
+    return save_merged_graph(app_paths, output_path)
+
+
+def build_app_graph(app, tasks, input_folder, options, output_path):
+    """Worker process entry of --by_app: build and save one app graph, return its path."""
+    logging.getLogger(__name__).info(f"[{os.getpid()}] Building graph of {app} from {len(tasks)} trajectories")
+    # spawned workers do not inherit the parent's configuration
+    configure_embedding_model(options['embedding_model'])
+    graph = build_graph(app, tasks, input_folder, options, output_path)
+    graph.save_graph(save_path=output_path)
+    return str(output_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
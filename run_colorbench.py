@@ -23,13 +23,9 @@ import time
 from pathlib import Path
 from dotenv import load_dotenv
 import yaml
-from src.agent import VanillaAgent
-from src.agent.agent_atlas import AtlasAgent
-from src.agent.agent_tars import TarsAgent
-from src.agent.agent_tars_dpo import TarsDPOAgent
-from src.agent.agent_qwen3 import Qwen3Agent
-from src.agent.agent_api import APIAgent
+from src.agent.registry import create_agent
 from src.test.graph_tools import Graph_DataSet
+from src.test.run_manifest import RunManifest, resolve_run_dir
 
 load_dotenv()
 
@@ -84,6 +80,11 @@ def main():
         default='gpt',  
         help="API model to use.",
     )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="Run directory (output_folder/config_name) of an interrupted run to resume.",
+    )
 
     args = parser.parse_args()
     tmp_time = datetime.datetime.now().strftime("%m%d_%H%M") 
@@ -93,38 +94,31 @@ def main():
     parent_dir = config['path']['image_folder']
     graph_json_file = config['graph']['graph_file']
     output_dir = config['path']['output_folder']
+    output_dir, config_name = resolve_run_dir(args.resume, output_dir, config_name)
     os.makedirs(output_dir, exist_ok=True)
 
-    log_file_path = f'./log/{config_name}.log'
+    log_file_path = f'./log/{config_name}.log' if not args.resume else f'./log/{config_name}_resume_{tmp_time}.log'
     setup_logging(log_file_path)
     logger = logging.getLogger(__name__)
     logger.info("Progress Start!")
 
     graph_dataset = Graph_DataSet(config['graph'])
-    if 'qwen3' in args.model:
-        agent = Qwen3Agent(config['agent'])
-    elif 'qwen' in args.model:
-        agent = VanillaAgent(config['agent'])
-    elif 'owl' in args.model:
-        agent = VanillaAgent(config['agent'])
-    elif 'atlas' in args.model:
-        agent = AtlasAgent(config['agent'])
-    elif 'tars_dpo' in args.model:
-        agent = TarsDPOAgent(config['agent'])
-    elif 'tars' in args.model:
-        agent = TarsAgent(config['agent'])
-    elif 'api' in args.model:
-        agent = APIAgent(model=args.api)
-    else:
-        # use your own agent
-        raise ValueError(f"Unsupported agent model: {args.model}")
+    # only the selected backend is imported, see src/agent/registry.py to add your own agent
+    agent = create_agent(args.model, config['agent'], api=args.api)
 
 
     task_json = config['tasks']['tasks_file']
     with open(task_json, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    for task_item in data:
+    manifest = RunManifest(os.path.join(output_dir, config_name))
+    manifest.mark_run(config_name, vars(args))
+    pending_tasks = manifest.pending(data)
+    if args.resume:
+        logger.info(f"继续运行 {config_name}: 已完成 {len(data) - len(pending_tasks)} 个任务, 剩余 {len(pending_tasks)} 个任务")
+
+    for task_item in pending_tasks:
         task = task_item['query']
+        manifest.mark_started(task_item)
         graph_dataset.set_task(task)
         agent.set_task(task)
         complete = False
@@ -149,7 +143,24 @@ def main():
         # save trajectory
         use_time = time.time() - start_time
         logger.info(f"任务 '{task}' 执行结束, 总步数: {current_step}, 用时: {use_time:.2f} 秒")
-        graph_dataset.save_trajectory(output_dir, use_time, save_image=False, config_name=config_name, parent_dir = parent_dir)
+        trajectory_dir = graph_dataset.save_trajectory(output_dir, use_time, save_image=False, config_name=config_name, parent_dir = parent_dir)
+        result = {
+            'task_id': task_item.get('task_id'),
+            'task': task,
+            'success': complete and current_step < max_step,
+            'steps': current_step,
+            'time': use_time
+        }
+        history_window = getattr(agent, 'history_window', None)
+        if history_window is not None:
+            report = history_window.report()
+            logger.info(f"历史 token 估计: {report['history_tokens']} (完整历史 {report['full_history_tokens']}, 节省 {report['saved_tokens']})")
+            result['history_tokens'] = report['history_tokens']
+            result['full_history_tokens'] = report['full_history_tokens']
+        prefix_tracker = getattr(agent, 'prefix_tracker', None)
+        if prefix_tracker is not None:
+            result['prefix_reuse'] = round(prefix_tracker.report()['reuse_ratio'], 4)
+        manifest.mark_finished(task_item, trajectory=trajectory_dir, result=result)
         logger.info(f"任务轨迹已保存")
 
 
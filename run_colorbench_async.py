@@ -0,0 +1,362 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Asyncio counterpart of run_colorbench_multi_agent.py.
+
+Episodes are coroutines instead of threads, so hundreds of them can be in
+flight at once; the number of concurrent VLM requests is bounded by a
+RequestLimiter (global cap plus optional per-endpoint concurrency / rate).
+Graph stepping and the trajectory output layout are the same as the
+multithreaded runner.
+"""
+
+import os
+import time
+import json
+import asyncio
+import logging
+import argparse
+import datetime
+from dotenv import load_dotenv
+from src.agent.plan_reflect_agent import PlanReflectAgent
+from src.agent.async_client import RequestLimiter, set_request_limiter
+from src.test.graph_tools_ma import Graph_DataSet
+from src.test.graph_index import load_compiled_graph
+from src.test.run_manifest import RunManifest, resolve_run_dir
+from src.test.scoring import IncrementalScorer, ResultStream, stream_task_result, should_abort, format_metrics
+from run_colorbench_multi_agent import setup_console_encoding, setup_logging, load_yaml
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+async def run_episode(task_item, config, mode, shared_graph, output_dir, parent_dir, config_name, episode_slots, manifest=None):
+    """Run one task until it answers, fails or hits max_steps; same result dict as ThreadSafeTaskExecutor."""
+    task_id = task_item.get('task_id', 'unknown')
+    task = task_item['query']
+
+    async with episode_slots:
+        try:
+            logger.info(f"Task {task_id}: Starting: {task}")
+            if manifest is not None:
+                manifest.mark_started(task_item)
+            agent = PlanReflectAgent(config['agent'][mode])
+            graph_dataset = Graph_DataSet(config['graph'], compiled_graph=shared_graph)
+            graph_dataset.set_task(task)
+            agent.set_task(task)
+
+            complete = False
+            image_path = graph_dataset.home_page
+            max_step = config['tasks']['max_steps']
+            current_step = 0
+            start_time = time.time()
+
+            while not complete and current_step < max_step:
+                image_path = os.path.join(parent_dir, image_path)
+
+                action, action_description, error = await agent.aagent_step(image_path)
+                if error:
+                    logger.error(f"Task {task_id}: agent step failed: {error}")
+                    complete = True
+                    continue
+
+                image_path, answer = graph_dataset.step(
+                    action,
+                    action_description=action_description,
+                    action_step_info=agent.step_history[-1] if agent.step_history else None
+                )
+
+                if answer:
+                    logger.info(f"Task {task_id}: completed! Answer: {answer}")
+                    complete = True
+                elif image_path is None:
+                    logger.warning(f"Task {task_id}: failed at step {current_step}")
+                    complete = True
+                current_step += 1
+
+            use_time = time.time() - start_time
+            logger.info(f"Task {task_id}: finished. Steps: {current_step}, Time: {use_time:.2f}s")
+            # the last step's memory may still be running in pipeline_memory mode
+            await agent.aflush()
+            graph_dataset.fill_step_info(agent.step_history)
+
+            # image copying is blocking file IO, keep it off the event loop
+            trajectory_dir = await asyncio.to_thread(
+                graph_dataset.save_trajectory,
+                output_dir,
+                use_time,
+                save_image=True,
+                config_name=config_name,
+                parent_dir=parent_dir,
+                task_id=task_id
+            )
+
+            result = {
+                'task_id': task_id,
+                'task': task,
+                'success': complete and current_step < max_step,
+                'steps': current_step,
+                'time': use_time,
+                'trajectory': trajectory_dir
+            }
+            if manifest is not None:
+                manifest.mark_finished(task_item, trajectory=trajectory_dir, result=result)
+            return result
+
+        except Exception as e:
+            logger.error(f"Task {task_id}: failed with error: {str(e)}")
+            return {
+                'task_id': task_id,
+                'task': task,
+                'success': False,
+                'error': str(e)
+            }
+
+
+async def run_all(args, config, task_range, output_dir, parent_dir, config_name, manifest=None, scorer=None, result_stream=None):
+    """
+    Run all episodes; each result is scored and streamed as soon as its episode
+    finishes. Returns (results, aborted).
+    """
+    set_request_limiter(RequestLimiter(
+        max_in_flight=args.max_inflight_requests,
+        endpoint_concurrency=args.endpoint_concurrency,
+        endpoint_rps=args.endpoint_rps
+    ))
+    shared_graph = load_compiled_graph(config['graph']['graph_file'])
+    episode_slots = asyncio.Semaphore(args.max_concurrency)
+
+    episodes = [
+        asyncio.ensure_future(run_episode(task_item, config, args.mode, shared_graph, output_dir, parent_dir, config_name, episode_slots, manifest))
+        for task_item in task_range
+    ]
+    results = []
+    aborted = False
+    for next_done in asyncio.as_completed(episodes):
+        result = await next_done
+        results.append(result)
+        if scorer is None:
+            continue
+        # trajectory.json is small, scoring it inline does not stall the loop noticeably
+        metrics = stream_task_result(result, scorer, result_stream)
+        logger.info(f"[LIVE] {format_metrics(metrics)}")
+        if should_abort(metrics, args.abort_sr_below, args.abort_min_tasks):
+            aborted = True
+            logger.warning(f"[ABORT] SR {metrics['SR']:.2%} < {args.abort_sr_below:.2%} after {metrics['scored_tasks']} tasks, cancelling remaining episodes")
+            for episode in episodes:
+                episode.cancel()
+            await asyncio.gather(*episodes, return_exceptions=True)
+            break
+    return results, aborted
+
+
+def main():
+    setup_console_encoding()
+
+    parser = argparse.ArgumentParser(
+        description="Run tasks concurrently on asyncio with bounded in-flight VLM requests"
+    )
+    parser.add_argument(
+        "--config",
+        default='./config/mlas.yaml',
+        help="Path to the config YAML file.",
+    )
+    parser.add_argument(
+        "--model",
+        default='gui-owl-32b',
+        help="Model configuration to use.",
+    )
+    parser.add_argument(
+        "--mode",
+        default='plan-reflect',
+        help="Agent mode to use (only plan-reflect is supported).",
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=200,
+        help="Maximum number of episodes running at once (default: 200).",
+    )
+    parser.add_argument(
+        "--max_inflight_requests",
+        type=int,
+        default=64,
+        help="Maximum number of VLM requests in flight across all endpoints (default: 64).",
+    )
+    parser.add_argument(
+        "--endpoint_concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of VLM requests in flight per endpoint (default: unbounded).",
+    )
+    parser.add_argument(
+        "--endpoint_rps",
+        type=float,
+        default=None,
+        help="Maximum number of VLM requests started per second per endpoint (default: unbounded).",
+    )
+    parser.add_argument(
+        "--task_start",
+        type=int,
+        default=160,
+        help="Start task ID (default: 160).",
+    )
+    parser.add_argument(
+        "--task_end",
+        type=int,
+        default=170,
+        help="End task ID (default: 170).",
+    )
+    parser.add_argument(
+        "--no_use_plan",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--no_use_reflect",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--no_use_memory",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--use_glm",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="Run directory (output_folder/config_name) of an interrupted run to resume.",
+    )
+    parser.add_argument(
+        "--abort_sr_below",
+        type=float,
+        default=None,
+        help="Cancel the remaining episodes once the live SR drops below this value (e.g. 0.05).",
+    )
+    parser.add_argument(
+        "--abort_min_tasks",
+        type=int,
+        default=20,
+        help="Number of scored tasks before --abort_sr_below is checked (default: 20).",
+    )
+
+    args = parser.parse_args()
+    if args.mode != 'plan-reflect':
+        raise ValueError(f"Unsupported mode: {args.mode}")
+
+    tmp_time = datetime.datetime.now().strftime("%m%d_%H%M")
+    config_name = f'tasks_glm{args.use_glm}_{args.task_start}_{args.task_end}_{args.mode}_{args.model}_noplan{args.no_use_plan}_noreflect{args.no_use_reflect}_nomemory{args.no_use_memory}_async_{tmp_time}'
+
+    config = load_yaml(args.config)
+    parent_dir = config['path']['image_folder']
+    output_dir = config['path']['output_folder']
+    output_dir, config_name = resolve_run_dir(args.resume, output_dir, config_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    log_file_path = f'./log/{config_name}.log' if not args.resume else f'./log/{config_name}_resume_{tmp_time}.log'
+    os.makedirs('./log', exist_ok=True)
+    setup_logging(log_file_path)
+    logger.info("Starting Async Tasks Execution!")
+
+    # renew config
+    if args.no_use_memory:
+        config['agent'][args.mode]['memory'] = False
+    if args.no_use_reflect:
+        config['agent'][args.mode]['reflect'] = False
+    if args.no_use_plan:
+        config['agent'][args.mode]['plan'] = False
+    config['agent'][args.mode]['glm'] = args.use_glm
+
+    task_json = config['tasks']['tasks_file']
+    with open(task_json, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    task_range = [item for item in data if args.task_start <= item.get('task_id', 0) <= args.task_end]
+    logger.info(f"Processing {len(task_range)} tasks ({args.task_start}-{args.task_end}) with {args.max_concurrency} concurrent episodes and {args.max_inflight_requests} in-flight requests")
+
+    manifest = RunManifest(os.path.join(output_dir, config_name))
+    manifest.mark_run(config_name, vars(args))
+    pending_tasks = manifest.pending(task_range)
+    previous_results = manifest.finished_results(task_range)
+    if args.resume:
+        logger.info(f"Resuming {config_name}: {len(task_range) - len(pending_tasks)} tasks already finished, "
+                    f"{len(manifest.in_flight())} in-flight tasks re-queued, {len(pending_tasks)} tasks to run")
+
+    # per-task records and live SR/CR/AC, written as each episode finishes
+    scorer = IncrementalScorer(data, queries=[item['query'] for item in task_range])
+    result_stream = ResultStream(os.path.join(output_dir, config_name, 'results.jsonl'))
+    for result in previous_results:
+        if result.get('trajectory') and os.path.exists(os.path.join(result['trajectory'], 'trajectory.json')):
+            scorer.add_trajectory(result['task'], result['trajectory'])
+
+    total_start_time = time.time()
+    new_results, aborted = asyncio.run(run_all(args, config, pending_tasks, output_dir, parent_dir, config_name, manifest, scorer, result_stream))
+    results = previous_results + new_results
+    total_time = time.time() - total_start_time
+
+    completed_tasks = sum(1 for result in results if result['success'])
+    failed_tasks = sum(1 for result in results if 'error' in result)
+    for result in results:
+        if result['success']:
+            logger.info(f"[SUCCESS] Task {result['task_id']} completed successfully in {result['time']:.2f}s")
+        elif 'error' in result:
+            logger.error(f"[FAILED] Task {result['task_id']} failed: {result['error']}")
+        else:
+            logger.info(f"[FAILED] Task {result['task_id']} completed with failure.")
+
+    logger.info("=" * 80)
+    logger.info("ASYNC EXECUTION SUMMARY")
+    logger.info("=" * 80)
+    logger.info(f"Total tasks: {len(task_range)}")
+    logger.info(f"Completed successfully: {completed_tasks}")
+    logger.info(f"Failed: {failed_tasks}")
+    logger.info(f"Success rate: {completed_tasks/len(task_range)*100:.1f}%")
+    logger.info(f"Total execution time: {total_time:.2f}s")
+    logger.info(f"Average time per task: {total_time/len(task_range):.2f}s")
+    logger.info(f"Concurrent episodes: {args.max_concurrency}, in-flight requests: {args.max_inflight_requests}")
+    logger.info("=" * 80)
+
+    summary_file = os.path.join(output_dir, config_name, 'execution_summary.json')
+    os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+
+    summary_data = {
+        'config_name': config_name,
+        'mode': args.mode,
+        'model': args.model,
+        'max_concurrency': args.max_concurrency,
+        'max_inflight_requests': args.max_inflight_requests,
+        'endpoint_concurrency': args.endpoint_concurrency,
+        'endpoint_rps': args.endpoint_rps,
+        'task_range': f"{args.task_start}-{args.task_end}",
+        'total_tasks': len(task_range),
+        'completed_tasks': completed_tasks,
+        'failed_tasks': failed_tasks,
+        'success_rate': completed_tasks/len(task_range)*100,
+        'total_execution_time': total_time,
+        'average_time_per_task': total_time/len(task_range),
+        'aborted': aborted,
+        'metrics': scorer.metrics(),
+        'results': results
+    }
+
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary_data, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"Execution summary saved to: {summary_file}")
+    logger.info("Async execution completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Batch counterpart of run_colorbench_async.py for offline model sweeps.
+
+--batch_size episodes step in lockstep: every model request of the agents is
+parked by a LockstepBatcher until all running episodes are waiting on the
+model, then the requests go to a batch backend as one batch (an
+OpenAI-compatible server, an OpenAI Batch API job, or a local vLLM engine)
+and the answers are scattered back to each episode, which then calls its
+Graph_DataSet.step. A finished episode's slot goes to the next task, so the
+batch stays full. Trajectories, manifest and live scores are the same as the
+async runner's.
+
+    python run_colorbench_batch.py --batch_size 32 --backend server
+    python run_colorbench_batch.py --batch_size 256 --backend vllm --engine_model /path/to/model
+"""
+
+import os
+import time
+import json
+import logging
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from src.agent.registry import create_mode_agent
+from src.agent.transport import set_request_handler
+from src.agent.batch_inference import BATCH_BACKENDS, LockstepBatcher, create_batch_backend
+from src.test.graph_tools_ma import Graph_DataSet
+from src.test.graph_index import load_compiled_graph
+from src.test.run_manifest import RunManifest, resolve_run_dir
+from src.test.scoring import IncrementalScorer, ResultStream, stream_task_result, format_metrics
+from run_colorbench_multi_agent import setup_console_encoding, setup_logging, load_yaml
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def run_episode(task_item, config, mode, shared_graph, batcher, output_dir, parent_dir, config_name, manifest=None):
+    """Run one task until it answers, fails or hits max_steps; same result dict as the async runner."""
+    task_id = task_item.get('task_id', 'unknown')
+    task = task_item['query']
+
+    batcher.episode_started()
+    try:
+        logger.info(f"Task {task_id}: Starting: {task}")
+        if manifest is not None:
+            manifest.mark_started(task_item)
+        agent = create_mode_agent(mode, config['agent'])
+        graph_dataset = Graph_DataSet(config['graph'], compiled_graph=shared_graph)
+        graph_dataset.set_task(task)
+        agent.set_task(task)
+
+        complete = False
+        image_path = graph_dataset.home_page
+        max_step = config['tasks']['max_steps']
+        current_step = 0
+        start_time = time.time()
+
+        while not complete and current_step < max_step:
+            image_path = os.path.join(parent_dir, image_path)
+
+            action, action_description, error = agent.agent_step(image_path)
+            if error:
+                logger.error(f"Task {task_id}: agent step failed: {error}")
+                complete = True
+                continue
+
+            image_path, answer = graph_dataset.step(
+                action,
+                action_description=action_description,
+                action_step_info=agent.step_history[-1] if agent.step_history else None
+            )
+
+            if answer:
+                logger.info(f"Task {task_id}: completed! Answer: {answer}")
+                complete = True
+            elif image_path is None:
+                logger.warning(f"Task {task_id}: failed at step {current_step}")
+                complete = True
+            current_step += 1
+
+        use_time = time.time() - start_time
+        logger.info(f"Task {task_id}: finished. Steps: {current_step}, Time: {use_time:.2f}s")
+        agent.flush()
+        agent.close()
+        graph_dataset.fill_step_info(agent.step_history)
+
+        trajectory_dir = graph_dataset.save_trajectory(
+            output_dir,
+            use_time,
+            save_image=True,
+            config_name=config_name,
+            parent_dir=parent_dir,
+            task_id=task_id
+        )
+
+        result = {
+            'task_id': task_id,
+            'task': task,
+            'success': complete and current_step < max_step,
+            'steps': current_step,
+            'time': use_time,
+            'trajectory': trajectory_dir
+        }
+        if manifest is not None:
+            manifest.mark_finished(task_item, trajectory=trajectory_dir, result=result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Task {task_id}: failed with error: {str(e)}")
+        return {
+            'task_id': task_id,
+            'task': task,
+            'success': False,
+            'error': str(e)
+        }
+    finally:
+        batcher.episode_finished()
+
+
+def run_all(args, config, task_range, output_dir, parent_dir, config_name, manifest=None, scorer=None, result_stream=None):
+    """Run all episodes --batch_size at a time in lockstep; returns (results, batcher)."""
+    backend = create_batch_backend(
+        args.backend,
+        work_dir=os.path.join(output_dir, config_name, 'batch_jobs'),
+        engine_model=args.engine_model,
+        max_workers=args.batch_size,
+        poll_interval=args.poll_interval
+    )
+    batcher = LockstepBatcher(backend, max_batch=args.max_batch, max_wait=args.max_wait)
+    shared_graph = load_compiled_graph(config['graph']['graph_file'])
+
+    set_request_handler(batcher)
+    server = threading.Thread(target=batcher.serve, name='lockstep-batcher', daemon=True)
+    server.start()
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.batch_size, thread_name_prefix='episode') as pool:
+            episodes = [
+                pool.submit(run_episode, task_item, config, args.mode, shared_graph, batcher, output_dir, parent_dir, config_name, manifest)
+                for task_item in task_range
+            ]
+            for episode in as_completed(episodes):
+                result = episode.result()
+                results.append(result)
+                if scorer is not None:
+                    metrics = stream_task_result(result, scorer, result_stream)
+                    logger.info(f"[LIVE] {format_metrics(metrics)}")
+    finally:
+        batcher.close()
+        server.join()
+        set_request_handler(None)
+        backend.close()
+    return results, batcher
+
+
+def main():
+    setup_console_encoding()
+
+    parser = argparse.ArgumentParser(
+        description="Run tasks in lockstep and send the model requests of each phase as one batch"
+    )
+    parser.add_argument(
+        "--config",
+        default='./config/mlas.yaml',
+        help="Path to the config YAML file.",
+    )
+    parser.add_argument(
+        "--model",
+        default='gui-owl-32b',
+        help="Model configuration to use.",
+    )
+    parser.add_argument(
+        "--mode",
+        default='plan-reflect',
+        help="Agent mode to use (only plan-reflect is supported).",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=32,
+        help="Number of episodes stepping in lockstep (default: 32).",
+    )
+    parser.add_argument(
+        "--backend",
+        default='server',
+        choices=BATCH_BACKENDS,
+        help="server: concurrent requests to the configured endpoint; openai-batch: one Batch API job per batch; vllm: local engine.",
+    )
+    parser.add_argument(
+        "--engine_model",
+        default=None,
+        help="Model path of the vllm backend.",
+    )
+    parser.add_argument(
+        "--max_batch",
+        type=int,
+        default=None,
+        help="Most requests per batch (default: unbounded).",
+    )
+    parser.add_argument(
+        "--max_wait",
+        type=float,
+        default=0.05,
+        help="Seconds without a new request before a partial batch is sent (default: 0.05).",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=30.0,
+        help="Seconds between status checks of an openai-batch job (default: 30).",
+    )
+    parser.add_argument(
+        "--task_start",
+        type=int,
+        default=160,
+        help="Start task ID (default: 160).",
+    )
+    parser.add_argument(
+        "--task_end",
+        type=int,
+        default=170,
+        help="End task ID (default: 170).",
+    )
+    parser.add_argument(
+        "--no_use_plan",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--no_use_reflect",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--no_use_memory",
+        action='store_true'
+    )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="Run directory (output_folder/config_name) of an interrupted run to resume.",
+    )
+
+    args = parser.parse_args()
+    if args.mode != 'plan-reflect':
+        raise ValueError(f"Unsupported mode: {args.mode}")
+
+    tmp_time = datetime.datetime.now().strftime("%m%d_%H%M")
+    config_name = f'tasks_{args.task_start}_{args.task_end}_{args.mode}_{args.model}_noplan{args.no_use_plan}_noreflect{args.no_use_reflect}_nomemory{args.no_use_memory}_batch{args.batch_size}_{args.backend}_{tmp_time}'
+
+    config = load_yaml(args.config)
+    parent_dir = config['path']['image_folder']
+    output_dir = config['path']['output_folder']
+    output_dir, config_name = resolve_run_dir(args.resume, output_dir, config_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    log_file_path = f'./log/{config_name}.log' if not args.resume else f'./log/{config_name}_resume_{tmp_time}.log'
+    os.makedirs('./log', exist_ok=True)
+    setup_logging(log_file_path)
+    logger.info("Starting Batch Tasks Execution!")
+
+    # renew config
+    if args.no_use_memory:
+        config['agent'][args.mode]['memory'] = False
+    if args.no_use_reflect:
+        config['agent'][args.mode]['reflect'] = False
+    if args.no_use_plan:
+        config['agent'][args.mode]['plan'] = False
+
+    task_json = config['tasks']['tasks_file']
+    with open(task_json, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    task_range = [item for item in data if args.task_start <= item.get('task_id', 0) <= args.task_end]
+    logger.info(f"Processing {len(task_range)} tasks ({args.task_start}-{args.task_end}) in lockstep batches of {args.batch_size} episodes on the {args.backend} backend")
+
+    manifest = RunManifest(os.path.join(output_dir, config_name))
+    manifest.mark_run(config_name, vars(args))
+    pending_tasks = manifest.pending(task_range)
+    previous_results = manifest.finished_results(task_range)
+    if args.resume:
+        logger.info(f"Resuming {config_name}: {len(task_range) - len(pending_tasks)} tasks already finished, "
+                    f"{len(manifest.in_flight())} in-flight tasks re-queued, {len(pending_tasks)} tasks to run")
+
+    scorer = IncrementalScorer(data, queries=[item['query'] for item in task_range])
+    result_stream = ResultStream(os.path.join(output_dir, config_name, 'results.jsonl'))
+    for result in previous_results:
+        if result.get('trajectory') and os.path.exists(os.path.join(result['trajectory'], 'trajectory.json')):
+            scorer.add_trajectory(result['task'], result['trajectory'])
+
+    total_start_time = time.time()
+    new_results, batcher = run_all(args, config, pending_tasks, output_dir, parent_dir, config_name, manifest, scorer, result_stream)
+    results = previous_results + new_results
+    total_time = time.time() - total_start_time
+
+    completed_tasks = sum(1 for result in results if result['success'])
+    failed_tasks = sum(1 for result in results if 'error' in result)
+    for result in results:
+        if result['success']:
+            logger.info(f"[SUCCESS] Task {result['task_id']} completed successfully in {result['time']:.2f}s")
+        elif 'error' in result:
+            logger.error(f"[FAILED] Task {result['task_id']} failed: {result['error']}")
+        else:
+            logger.info(f"[FAILED] Task {result['task_id']} completed with failure.")
+
+    logger.info("=" * 80)
+    logger.info("BATCH EXECUTION SUMMARY")
+    logger.info("=" * 80)
+    logger.info(f"Total tasks: {len(task_range)}")
+    logger.info(f"Completed successfully: {completed_tasks}")
+    logger.info(f"Failed: {failed_tasks}")
+    logger.info(f"Success rate: {completed_tasks/len(task_range)*100:.1f}%")
+    logger.info(f"Total execution time: {total_time:.2f}s")
+    logger.info(f"Average time per task: {total_time/len(task_range):.2f}s")
+    logger.info(f"Batches: {batcher.rounds}, requests: {batcher.requests}, "
+                f"mean batch size: {batcher.requests / batcher.rounds if batcher.rounds else 0:.1f}")
+    logger.info("=" * 80)
+
+    summary_file = os.path.join(output_dir, config_name, 'execution_summary.json')
+    os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+
+    summary_data = {
+        'config_name': config_name,
+        'mode': args.mode,
+        'model': args.model,
+        'batch_size': args.batch_size,
+        'backend': args.backend,
+        'max_batch': args.max_batch,
+        'batches': batcher.rounds,
+        'requests': batcher.requests,
+        'task_range': f"{args.task_start}-{args.task_end}",
+        'total_tasks': len(task_range),
+        'completed_tasks': completed_tasks,
+        'failed_tasks': failed_tasks,
+        'success_rate': completed_tasks/len(task_range)*100,
+        'total_execution_time': total_time,
+        'average_time_per_task': total_time/len(task_range),
+        'aborted': False,
+        'metrics': scorer.metrics(),
+        'results': results
+    }
+
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary_data, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"Execution summary saved to: {summary_file}")
+    logger.info("Batch execution completed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,11 +19,13 @@ import logging
 import colorlog
 import argparse
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, CancelledError
 from pathlib import Path
 from dotenv import load_dotenv
 import yaml
 from src.agent.thread_safe_agent_factory import ThreadSafeAgentFactory, ThreadSafeGraphDataSet, ThreadSafeTaskExecutor
+from src.test.run_manifest import RunManifest, resolve_run_dir
+from src.test.scoring import IncrementalScorer, ResultStream, stream_task_result, should_abort, format_metrics
 
 load_dotenv()
 
@@ -136,6 +138,23 @@ def main():
         "--use_glm",
         action='store_true'
     )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="Run directory (output_folder/config_name) of an interrupted run to resume.",
+    )
+    parser.add_argument(
+        "--abort_sr_below",
+        type=float,
+        default=None,
+        help="Stop submitting tasks once the live SR drops below this value (e.g. 0.05).",
+    )
+    parser.add_argument(
+        "--abort_min_tasks",
+        type=int,
+        default=20,
+        help="Number of scored tasks before --abort_sr_below is checked (default: 20).",
+    )
     
     
     args = parser.parse_args()
@@ -145,9 +164,10 @@ def main():
     config = load_yaml(args.config)
     parent_dir = config['path']['image_folder']
     output_dir = config['path']['output_folder']
+    output_dir, config_name = resolve_run_dir(args.resume, output_dir, config_name)
     os.makedirs(output_dir, exist_ok=True)
 
-    log_file_path = f'./log/{config_name}.log'
+    log_file_path = f'./log/{config_name}.log' if not args.resume else f'./log/{config_name}_resume_{tmp_time}.log'
     os.makedirs('./log', exist_ok=True)
     setup_logging(log_file_path)
     logger = logging.getLogger(__name__)
@@ -167,7 +187,9 @@ def main():
 
     agent_factory = ThreadSafeAgentFactory(config['agent'])
     graph_factory = ThreadSafeGraphDataSet(config['graph'])
-    task_executor = ThreadSafeTaskExecutor(agent_factory, graph_factory, config)
+    manifest = RunManifest(os.path.join(output_dir, config_name))
+    manifest.mark_run(config_name, vars(args))
+    task_executor = ThreadSafeTaskExecutor(agent_factory, graph_factory, config, manifest=manifest)
 
     task_json = config['tasks']['tasks_file']
     with open(task_json, 'r', encoding='utf-8') as f:
@@ -175,14 +197,27 @@ def main():
     task_range = [item for item in data if args.task_start <= item.get('task_id', 0) <= args.task_end]
     logger.info(f"Processing {len(task_range)} tasks ({args.task_start}-{args.task_end}) with {args.max_workers} threads")
 
-    results = []
-    completed_tasks = 0
+    # tasks finished by an earlier session of this run are skipped, in-flight ones run again
+    pending_tasks = manifest.pending(task_range)
+    results = manifest.finished_results(task_range)
+    if args.resume:
+        logger.info(f"Resuming {config_name}: {len(task_range) - len(pending_tasks)} tasks already finished, "
+                    f"{len(manifest.in_flight())} in-flight tasks re-queued, {len(pending_tasks)} tasks to run")
+    completed_tasks = sum(1 for result in results if result.get('success'))
     failed_tasks = 0
+
+    # per-task records and live SR/CR/AC, written as each task finishes
+    scorer = IncrementalScorer(data, queries=[item['query'] for item in task_range])
+    result_stream = ResultStream(os.path.join(output_dir, config_name, 'results.jsonl'))
+    for result in results:
+        if result.get('trajectory') and os.path.exists(os.path.join(result['trajectory'], 'trajectory.json')):
+            scorer.add_trajectory(result['task'], result['trajectory'])
+    aborted = False
     total_start_time = time.time()
 
     with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
         future_to_task = {}
-        for task_item in task_range:
+        for task_item in pending_tasks:
             future = executor.submit(
                 task_executor.execute_task,
                 task_item,
@@ -199,6 +234,12 @@ def main():
             try:
                 result = future.result()
                 results.append(result)
+                metrics = stream_task_result(result, scorer, result_stream)
+                logger.info(f"[LIVE] {format_metrics(metrics)}")
+                if not aborted and should_abort(metrics, args.abort_sr_below, args.abort_min_tasks):
+                    aborted = True
+                    logger.warning(f"[ABORT] SR {metrics['SR']:.2%} < {args.abort_sr_below:.2%} after {metrics['scored_tasks']} tasks, cancelling queued tasks")
+                    executor.shutdown(wait=False, cancel_futures=True)
                 
                 if result['success']:
                     completed_tasks += 1
@@ -210,16 +251,24 @@ def main():
                     failed_tasks += 1
                     logger.error(f"[FAILED] Task {result['task_id']} failed: {result.get('error', 'Unknown error')}")
                 
+            except CancelledError:
+                continue
             except Exception as e:
                 failed_tasks += 1
                 logger.error(f"[FAILED] Task {task_item.get('task_id', 'unknown')} failed with exception: {str(e)}")
-                results.append({
+                error_result = {
                     'task_id': task_item.get('task_id', 'unknown'),
                     'task': task_item.get('query', 'unknown'),
                     'success': False,
                     'error': str(e),
                     'thread_id': 'unknown'
-                })
+                }
+                results.append(error_result)
+                metrics = stream_task_result(error_result, scorer, result_stream)
+                if not aborted and should_abort(metrics, args.abort_sr_below, args.abort_min_tasks):
+                    aborted = True
+                    logger.warning(f"[ABORT] SR {metrics['SR']:.2%} < {args.abort_sr_below:.2%} after {metrics['scored_tasks']} tasks, cancelling queued tasks")
+                    executor.shutdown(wait=False, cancel_futures=True)
 
     total_time = time.time() - total_start_time
     logger.info("=" * 80)
@@ -249,6 +298,8 @@ def main():
         'success_rate': completed_tasks/len(task_range)*100,
         'total_execution_time': total_time,
         'average_time_per_task': total_time/len(task_range),
+        'aborted': aborted,
+        'metrics': scorer.metrics(),
         'results': results
     }
     
@@ -13,7 +13,6 @@
 # limitations under the License.
 
 from openai import OpenAI
-from zai import ZhipuAiClient  # pip install zai-sdk
 import os
 import base64
 import json
@@ -23,6 +22,12 @@ from pathlib import Path
 import logging
 from openai import OpenAI
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
+from src.agent.history import HistoryWindow
+from src.agent.prompt_layout import PrefixTracker, user_content
 
 
 PROMPT = """
@@ -91,87 +96,25 @@ You are provided with function signatures within <tools></tools> XML tags:
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
+@cached_response(max_tokens=2048, model='gpt-4o')
 def get_gpt_response(messages, temperature=0.1, top_k=5, top_p=0.9):
+    client = get_client(api_key="", base_url="")
+    return chat_completion(client, 'gpt-4o', messages, endpoint='gpt-4o', temperature=temperature, max_tokens=2048)
 
-    client = OpenAI(api_key="", base_url="")
-    retries = 0
-    retry_delay = 2 
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model='gpt-4o',
-                messages=messages,
-                temperature=temperature,
-                max_tokens=2048,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
-
+@cached_response(max_tokens=2048, model='glm-4.5V')
 def get_glm_response(messages, temperature=0.1, top_k=5, top_p=0.9):
- 
+    from zai import ZhipuAiClient  # pip install zai-sdk; imported here so other backends do not need it
     client = ZhipuAiClient(api_key="")
-    retries = 0
-    retry_delay = 2  
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model="glm-4.5V",
-                messages=messages,
-                temperature=temperature,
-                max_tokens=2048,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    return chat_completion(client, "glm-4.5V", messages, endpoint='glm-4.5V', temperature=temperature, max_tokens=2048)
 
 
+@cached_response(max_tokens=2048, model='qwen-vl-max-latest')
 def get_qwen_response(messages, temperature=0.1, top_k=5, top_p=0.9):
-
-    client = OpenAI(api_key="",base_url="")
-    retries = 0
-    retry_delay = 2  
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model="qwen-vl-max-latest",
-                messages=messages,
-                temperature=temperature,
-                max_tokens=2048,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    client = get_client(api_key="", base_url="")
+    return chat_completion(client, "qwen-vl-max-latest", messages, endpoint='qwen-vl-max-latest', temperature=temperature, max_tokens=2048)
 
 def get_ocr_response(action_str, action_thought, img_width, img_height, image_path):
-    client = OpenAI(api_key='', base_url='')
-    retries = 0
-    retry_delay = 2  
+    client = get_client(api_key='', base_url='')
     image_base64 = encode_image_to_base64(image_path)
     messages = [
         {
@@ -183,25 +126,7 @@ def get_ocr_response(action_str, action_thought, img_width, img_height, image_pa
         }
     ]
     print(OCR_PROMPT.format(action_str=action_str, action_thought=action_thought, width=img_width, height=img_height))
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model='qwen2.5-vl-7b-instruct',
-                messages=messages,
-                temperature=0.0,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    return chat_completion(client, 'qwen2.5-vl-7b-instruct', messages, endpoint='qwen2.5-vl-7b-instruct', temperature=0.0, max_tokens=1024)
 
 response_map = {
     'gpt': get_gpt_response,
@@ -210,16 +135,7 @@ response_map = {
 }
 
 def encode_image_to_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-        ext = Path(image_path).suffix.lower()
-        if ext in [".jpg", ".jpeg"]:
-            mime_type = "image/jpeg"
-        elif ext == ".png":
-            mime_type = "image/png"
-        else:
-            mime_type = "image/jpeg"
-        return f"data:{mime_type};base64,{encoded_string}"
+    return encode_image(image_path).data_url
 
 
 def parse_mobile_response(response):
@@ -249,10 +165,15 @@ class APIAgent:
         self.model = model
         self.get_response = response_map[self.model]
         self.history = [] 
+        self.image_preprocess = ImagePreprocess.from_config((agent_config or {}).get('image_preprocess'))
+        self.history_window = HistoryWindow.from_config(agent_config)
+        self.prefix_tracker = PrefixTracker()
         
     def set_task(self, task):
         self.task = task  
         self.history = []  
+        self.history_window.reset()
+        self.prefix_tracker.reset()
         
     def parse_user_input(self, parsed, img_width, img_height, image_path):
         """解析用户输入的格式 action_type[param] 或 ANSWER[TEXT]"""
@@ -312,6 +233,7 @@ class APIAgent:
             return {'action_type': 'wait', 'reason': 'Error in parsing user input, defaulting to wait.'}
 
 
+    @staticmethod
     def scale_image(image_path, scale=0.25):
         """将图片缩放到指定比例，返回PIL Image对象"""
         try:
@@ -327,21 +249,17 @@ class APIAgent:
     def agent_step(self, image_path):
         """调用大模型获取操作建议"""
         try:
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            image_base64 = encode_image_to_base64(image_path)
+            image = encode_image(image_path, self.image_preprocess)
+            # grounding (get_ocr_response) always sees the original screenshot
+            img_width, img_height = image.original_width, image.original_height
+            image_base64 = image.data_url
         except Exception as e:
             logger.error(f"Error when reading or encoding image: {str(e)}")
             
         try:
-            history_content = ''
-            if self.history!= []:
-                for i, step in enumerate(self.history, 1):  
-                    history_content += f"Step {i}: Thought: {step['thought']}; Action: {step['action']}\n"
-                    
-
-            if history_content:
-                history_content = history_content.rstrip('\n')
+            history_content = '\n'.join(self.history_window.lines(
+                [f"Thought: {step['thought']}; Action: {step['action']}" for step in self.history]
+            ))
 
             prompt = PROMPT.format(
                 instruction=self.task,
@@ -352,13 +270,12 @@ class APIAgent:
             messages = [
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "image_url", "image_url": {"url": image_base64}},
-                        {"type": "text", "text": prompt},
-                    ],
+                    # instruction and history ahead of the screenshot keep the prefix stable across steps
+                    "content": user_content(prompt, image_base64),
                 }
             ]
             logger.info(f"Current image path: {image_path}")
+            self.prefix_tracker.observe(messages)
             response = self.get_response(messages=messages)
             logger.info(f"Raw Response:\n{response}")
             parsed = parse_mobile_response(response)
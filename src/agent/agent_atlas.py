@@ -21,40 +21,25 @@ from PIL import Image
 import logging
 from openai import OpenAI
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
+from src.agent.history import HistoryWindow
+from src.agent.prompt_layout import PrefixTracker, user_content
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
 def extract_numbers(s):
     """提取字符串中的所有连续数字串"""
     return re.findall(r'\d+', s)
 
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1, top_k=5, top_p=0.9):
-  
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2 
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 def position_to_direction(x1, y1, x2, y2):
     """
@@ -95,13 +80,18 @@ class AtlasAgent:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.system_prompt = agent_config['system_prompt']
         self.task = None
         self.history = []  
+        self.history_window = HistoryWindow.from_config(agent_config)
+        self.prefix_tracker = PrefixTracker()
         
     def set_task(self, task):
         self.task = task  
         self.history = []  
+        self.history_window.reset()
+        self.prefix_tracker.reset()
         
     def parse_user_input(self, input_str, img_width, img_height):
         """解析用户输入的格式"""
@@ -172,6 +162,7 @@ class AtlasAgent:
             return {'action_type': 'wait'}
 
 
+    @staticmethod
     def scale_image(image_path, scale=0.25):
         """将图片缩放到指定比例，返回PIL Image对象"""
         try:
@@ -187,35 +178,31 @@ class AtlasAgent:
     def agent_step(self, image_path):
         """调用大模型获取操作建议"""
         try:
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+            image = encode_image(image_path, self.image_preprocess)
+            img_width, img_height = image.width, image.height
             
             user_prompt = f"Current task instruction: {self.task}\n"
             if self.history!= []:
-                history = ''.join([f'Step {si+1}: {content}; 'for si, content in enumerate(self.history)])
+                history = ''.join(f'{line}; ' for line in self.history_window.lines(self.history))
                 user_prompt += f'\nAction History: {history}.\n'
             msg = [
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": self.system_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_string}"}},
-                        {"type": "text", "text": user_prompt},
-                    ],
+                    # task and history ahead of the screenshot keep the prefix stable across steps
+                    "content": user_content([self.system_prompt, user_prompt], image.data_url),
                 }
             ]
             
             # logger.info(f"Vanilla Agent Prompt:\n {msg}")
             logger.info(f"Current image path: {image_path}")
+            self.prefix_tracker.observe(msg)
             response = get_response(model=self.model,messages=msg,api_key=self.api_key, base_url=self.base_url)
             logger.info(f"Raw Response:\n {response}")
 
             action, action_thought = self.parse_extract_response(response)
 
             self.history.append(f'action:{action}, action_thought:{action_thought}')  
-            action = self.parse_user_input(action, img_width, img_height)
+            action = self.parse_user_input(action, image.original_width, image.original_height)
             logger.info(f"Parsed action: {action}")
             return action, action_thought
 
@@ -21,37 +21,19 @@ from PIL import Image
 import logging
 from openai import OpenAI
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1, top_k=5, top_p=0.9):
-
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2 
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 
 class AgentBase(ABC):
@@ -21,35 +21,20 @@ from PIL import Image
 import logging
 from openai import OpenAI
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
+from src.agent.history import HistoryWindow
+from src.agent.prompt_layout import PrefixTracker, user_content
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1, top_k=5, top_p=0.9):
-
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2 
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 
 
@@ -83,13 +68,18 @@ class Qwen3Agent:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.system_prompt = agent_config['system_prompt']
         self.task = None
         self.history = []  
+        self.history_window = HistoryWindow.from_config(agent_config)
+        self.prefix_tracker = PrefixTracker()
         
     def set_task(self, task):
         self.task = task  
         self.history = [] 
+        self.history_window.reset()
+        self.prefix_tracker.reset()
         
     def parse_user_input(self, input_str, img_width, img_height):
         # {"name": <function-name>, "arguments": <args-json-object>
@@ -153,6 +143,7 @@ class Qwen3Agent:
             return None
 
 
+    @staticmethod
     def scale_image(image_path, scale=0.25):
         """将图片缩放到指定比例，返回PIL Image对象"""
         try:
@@ -168,17 +159,15 @@ class Qwen3Agent:
     def agent_step(self, image_path):
         """调用大模型获取操作建议"""
         try:
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+            image = encode_image(image_path, self.image_preprocess)
+            img_width, img_height = image.width, image.height
         except Exception as e:
             logger.error(f"Error when reading or encoding image: {str(e)}")
             
         try:
             user_prompt = f"The user query: {self.task}.\n"
             if self.history!= []:
-                history = ''.join([f'Step {si+1}: {content}\n'for si, content in enumerate(self.history)])
+                history = ''.join(f'{line}\n' for line in self.history_window.lines(self.history))
                 print(history)
                 user_prompt += f'\nTask progress (You have done the following operation on the current device): {history}.\n'
                 user_prompt += '\nAttention! You must open app with action open[app] directly, do not click the app icon to open it. You can open the specified app(in Chinese name) at any page.'
@@ -193,22 +182,20 @@ class Qwen3Agent:
                 },
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": user_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_string}"}}
-                    ],
+                    "content": user_content(user_prompt, image.data_url),
                 }
             ]
            
             # logger.info(f"Vanilla Agent Prompt:\n {msg}")
             logger.info(f"Current image path: {image_path}")
+            self.prefix_tracker.observe(msg)
             response = get_response(model=self.model,messages=msg,api_key=self.api_key, base_url=self.base_url)
             logger.info(f"Raw Response:\n {response}")
 
             action, action_description, thought = self.parse_extract_response(response)
 
             self.history.append(f'Thought:{thought} Action:{action_description}') 
-            action = self.parse_user_input(action, img_width, img_height)  
+            action = self.parse_user_input(action, image.original_width, image.original_height)  
             logger.info(f"Parsed action: {action}")
             return action, f'Thought:{thought} Action:{action_description}'
 
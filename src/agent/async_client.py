@@ -0,0 +1,107 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Async counterpart of the agents' `get_response`, used by the asyncio runner.
+
+All requests go through one RequestLimiter: a global cap on in-flight
+requests plus optional per-endpoint (base_url) concurrency and rate limits.
+"""
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from src.agent.client_pool import get_async_client
+from src.agent.transport import acall_with_retries
+from src.response_cache import cached_response
+
+logger = logging.getLogger(__name__)
+
+_limiter = None
+
+
+class RequestLimiter:
+    """Bounds in-flight VLM requests globally and per endpoint."""
+
+    def __init__(self, max_in_flight=64, endpoint_concurrency=None, endpoint_rps=None):
+        """
+        :param max_in_flight: maximum number of requests in flight across all endpoints
+        :param endpoint_concurrency: maximum number of requests in flight per base_url (None: unbounded)
+        :param endpoint_rps: maximum number of requests started per second per base_url (None: unbounded)
+        """
+        self.max_in_flight = max_in_flight
+        self.endpoint_concurrency = endpoint_concurrency
+        self.endpoint_rps = endpoint_rps
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._endpoint_semaphores = {}
+        self._endpoint_next_start = {}
+
+    async def _throttle(self, endpoint):
+        if not self.endpoint_rps:
+            return
+        now = time.monotonic()
+        start = max(now, self._endpoint_next_start.get(endpoint, now))
+        self._endpoint_next_start[endpoint] = start + 1.0 / self.endpoint_rps
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @asynccontextmanager
+    async def slot(self, endpoint):
+        # wait on the endpoint first, so a throttled endpoint does not hold global slots
+        semaphore = None
+        if self.endpoint_concurrency:
+            semaphore = self._endpoint_semaphores.setdefault(endpoint, asyncio.Semaphore(self.endpoint_concurrency))
+            await semaphore.acquire()
+        try:
+            await self._throttle(endpoint)
+            async with self._global:
+                yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+
+def set_request_limiter(limiter):
+    """Install the limiter shared by every `aget_response` call of this process."""
+    global _limiter
+    _limiter = limiter
+
+
+def get_request_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = RequestLimiter()
+    return _limiter
+
+
+@cached_response()
+async def aget_response(model, messages, api_key, base_url, temperature=0.1, max_tokens=1024):
+    """Async get_response with the same retry policy as the synchronous agents (src/agent/transport.py)."""
+    client = get_async_client(api_key, base_url)
+    limiter = get_request_limiter()
+
+    async def request(timeout):
+        # a retry waits for a new slot, the backoff does not hold one
+        async with limiter.slot(base_url):
+            completion = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+            )
+        return completion.choices[0].message.content.strip()
+
+    return await acall_with_retries(request, endpoint=base_url)
@@ -0,0 +1,281 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lockstep batch inference for offline model sweeps.
+
+A LockstepBatcher is installed as the transport's request handler
+(transport.set_request_handler), so every agent keeps calling its
+get_response as usual. Each call is parked until every running episode is
+waiting on the model (or no new request arrived for `max_wait` seconds);
+the parked requests then go to a batch backend as one batch and every
+caller gets its own answer back. With N episodes stepping in lockstep, each
+agent phase (reflect, plan, execute, memory) becomes one batch of N requests.
+
+Batch backends take a list of BatchRequest and return one text (or None) per
+request, in order:
+
+- server:       the requests sent concurrently to their OpenAI-compatible endpoints
+- openai-batch: one OpenAI Batch API job per batch (JSONL input file, polled until done)
+- vllm:         a local vLLM engine (`LLM.chat`), loaded on first use
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from src.agent.transport import send_chat_completion
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_DONE = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchRequest(namedtuple('BatchRequest', ['custom_id', 'client', 'model', 'messages', 'endpoint', 'policy', 'params'])):
+    """
+    :param custom_id: id of the request inside its batch
+    :param client: the OpenAI-compatible client the agent would have used
+    :param policy: the agent's RetryPolicy, honoured by the backends that send the requests themselves
+    :param params: the remaining chat completion arguments (temperature, max_tokens, ...)
+    """
+
+    __slots__ = ()
+
+
+class ServerBatchBackend:
+    """Sends a batch concurrently to the requests' own endpoints (continuous batching on the server)."""
+
+    def __init__(self, max_workers=64):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-request')
+
+    def run(self, requests):
+        futures = [
+            self._pool.submit(send_chat_completion, request.client, request.model, request.messages,
+                              endpoint=request.endpoint, policy=request.policy, **request.params)
+            for request in requests
+        ]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+class OpenAIBatchFileBackend:
+    """
+    Submits every batch as one OpenAI Batch API job: the requests are written to a JSONL file
+    in `work_dir`, uploaded and polled until the job is done; input and output files are kept.
+    """
+
+    def __init__(self, work_dir, poll_interval=30.0, completion_window='24h', client=None):
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.client = client
+        self.rounds = 0
+        os.makedirs(work_dir, exist_ok=True)
+
+    def _write_input(self, path, requests):
+        with open(path, 'w', encoding='utf-8') as f:
+            for request in requests:
+                body = dict(request.params, model=request.model, messages=request.messages)
+                f.write(json.dumps({'custom_id': request.custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body},
+                                   ensure_ascii=False) + '\n')
+
+    def _run_job(self, client, requests, name):
+        input_path = os.path.join(self.work_dir, f'{name}_input.jsonl')
+        self._write_input(input_path, requests)
+        with open(input_path, 'rb') as f:
+            input_file = client.files.create(file=f, purpose='batch')
+        batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=self.completion_window)
+        logger.info(f"提交批处理任务 {batch.id}: {len(requests)} 个请求")
+        while batch.status not in BATCH_DONE:
+            time.sleep(self.poll_interval)
+            batch = client.batches.retrieve(batch.id)
+        if batch.status != 'completed' or not batch.output_file_id:
+            logger.error(f"Batch {batch.id} ended with status {batch.status}")
+            return {}
+        output = client.files.content(batch.output_file_id).text
+        with open(os.path.join(self.work_dir, f'{name}_output.jsonl'), 'w', encoding='utf-8') as f:
+            f.write(output)
+        answers = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if response.get('status_code') != 200:
+                logger.error(f"Batch request {record.get('custom_id')} failed: {record.get('error') or response.get('body')}")
+                continue
+            answers[record['custom_id']] = response['body']['choices'][0]['message']['content'].strip()
+        return answers
+
+    def run(self, requests):
+        self.rounds += 1
+        # one job per endpoint: a batch file goes to exactly one provider
+        groups = {}
+        for request in requests:
+            groups.setdefault(request.endpoint, []).append(request)
+        answers = {}
+        for index, group in enumerate(groups.values()):
+            client = self.client or group[0].client
+            answers.update(self._run_job(client, group, f'round_{self.rounds:05d}_{index}'))
+        return [answers.get(request.custom_id) for request in requests]
+
+    def close(self):
+        pass
+
+
+class VLLMEngineBackend:
+    """Runs batches on a local vLLM engine, created on first use with `engine_args`."""
+
+    def __init__(self, model, **engine_args):
+        self.model = model
+        self.engine_args = engine_args
+        self._llm = None
+
+    def _engine(self):
+        if self._llm is None:
+            from vllm import LLM
+            self._llm = LLM(model=self.model, **self.engine_args)
+            logger.info(f"Loaded vLLM engine {self.model}")
+        return self._llm
+
+    def run(self, requests):
+        from vllm import SamplingParams
+        answers = [None] * len(requests)
+        # one chat call per distinct sampling setting
+        groups = {}
+        for index, request in enumerate(requests):
+            key = (request.params.get('temperature', 0.0), request.params.get('max_tokens', 1024))
+            groups.setdefault(key, []).append(index)
+        for (temperature, max_tokens), indices in groups.items():
+            outputs = self._engine().chat([requests[i].messages for i in indices],
+                                          SamplingParams(temperature=temperature, max_tokens=max_tokens), use_tqdm=False)
+            for i, output in zip(indices, outputs):
+                answers[i] = output.outputs[0].text.strip()
+        return answers
+
+    def close(self):
+        pass
+
+
+BATCH_BACKENDS = ('server', 'openai-batch', 'vllm')
+
+
+def create_batch_backend(name, work_dir=None, engine_model=None, max_workers=64, poll_interval=30.0):
+    if name == 'server':
+        return ServerBatchBackend(max_workers=max_workers)
+    if name == 'openai-batch':
+        return OpenAIBatchFileBackend(work_dir or './batch_jobs', poll_interval=poll_interval)
+    if name == 'vllm':
+        if not engine_model:
+            raise ValueError("The vllm batch backend needs an engine model path")
+        return VLLMEngineBackend(engine_model)
+    raise ValueError(f"Unsupported batch backend: {name}")
+
+
+class _Pending:
+    __slots__ = ('request', 'answer', 'done')
+
+    def __init__(self, request):
+        self.request = request
+        self.answer = None
+        self.done = threading.Event()
+
+
+class LockstepBatcher:
+    """
+    Transport request handler that collects the requests of all running episodes into batches.
+    :param max_batch: most requests per batch (None: no limit)
+    :param max_wait: seconds without a new request after which a partial batch is sent anyway
+    """
+
+    def __init__(self, backend, max_batch=None, max_wait=0.05):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending = []
+        self._last_request = 0.0
+        self._closed = False
+        self.episodes = 0
+        self.rounds = 0
+        self.requests = 0
+
+    def episode_started(self):
+        with self._cond:
+            self.episodes += 1
+
+    def episode_finished(self):
+        with self._cond:
+            self.episodes -= 1
+            self._cond.notify_all()
+
+    def __call__(self, client, model, messages, endpoint=None, policy=None, **kwargs):
+        kwargs.pop('timeout', None)
+        pending = _Pending(BatchRequest(None, client, model, messages, endpoint, policy, kwargs))
+        with self._cond:
+            self._pending.append(pending)
+            self._last_request = time.monotonic()
+            self._cond.notify_all()
+        pending.done.wait()
+        return pending.answer
+
+    def _ready(self):
+        if not self._pending:
+            return False
+        if len(self._pending) >= max(self.episodes, 1) or self._closed:
+            return True
+        if self.max_batch and len(self._pending) >= self.max_batch:
+            return True
+        return time.monotonic() - self._last_request >= self.max_wait
+
+    def run_round(self):
+        """Wait for the next batch and answer it; False once closed with nothing left to send."""
+        with self._cond:
+            while not self._ready():
+                if self._closed and not self._pending:
+                    return False
+                self._cond.wait(self.max_wait)
+            size = self.max_batch or len(self._pending)
+            batch, self._pending = self._pending[:size], self._pending[size:]
+        self.rounds += 1
+        self.requests += len(batch)
+        requests = [pending.request._replace(custom_id=f'{self.rounds}-{i}') for i, pending in enumerate(batch)]
+        start = time.time()
+        try:
+            answers = self.backend.run(requests)
+        except Exception as e:
+            logger.error(f"Batch {self.rounds} of {len(batch)} requests failed: {str(e)}")
+            answers = [None] * len(batch)
+        logger.info(f"批次 {self.rounds}: {len(batch)} 个请求, 用时 {time.time() - start:.2f}s")
+        for pending, answer in zip(batch, answers):
+            pending.answer = answer
+            pending.done.set()
+        return True
+
+    def serve(self):
+        """Answer batches until close()."""
+        while self.run_round():
+            pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,74 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process-wide OpenAI clients keyed by (base_url, api_key).
+
+An OpenAI client owns an HTTP connection pool with keep-alive, so building one
+per request throws away the pooled connections and pays a new TCP/TLS handshake
+on every step. Every agent gets its client from here instead; clients are
+thread-safe and are shared by all agents and worker threads that talk to the
+same endpoint.
+"""
+
+import threading
+import logging
+from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(api_key, base_url):
+    """Return the shared synchronous client for (base_url, api_key)."""
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                logger.info(f"Creating pooled OpenAI client for {base_url}")
+                # transport.call_with_retries is the only retry layer (budget, backoff, fatal errors)
+                client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+                _clients[key] = client
+    return client
+
+
+def get_async_client(api_key, base_url):
+    """Return the shared AsyncOpenAI client for (base_url, api_key); use it from a single event loop."""
+    key = (base_url, api_key)
+    client = _async_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _async_clients.get(key)
+            if client is None:
+                logger.info(f"Creating pooled AsyncOpenAI client for {base_url}")
+                client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+                _async_clients[key] = client
+    return client
+
+
+def close_clients():
+    """Close the pooled synchronous clients and drop every cached client."""
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Error closing client: {str(e)}")
+        _clients.clear()
+        _async_clients.clear()
@@ -20,33 +20,22 @@ import time
 from PIL import Image
 import logging
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess, map_action_to_original
+from src.agent.history import HistoryWindow
+from src.agent.prompt_layout import PrefixTracker, user_content
+from src.agent.async_client import aget_response
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1):
     """Get response from LLM with retry mechanism"""
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2
-    
-    while retries <= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            return response
-        except Exception as e:
-            logger.warning(f"Request failed, retrying... Error: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    logger.error("Request failed after multiple retries.")
-    return None
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 def position_to_direction(x1, y1, x2, y2):
     """Convert position coordinates to direction"""
@@ -72,15 +61,23 @@ class ExecutorAgent:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.temperature = agent_config.get('temperature', 0.1)
         self.system_prompt = agent_config['system_prompt']
         self.task = None
         self.execution_history = []
+        # actions and memory notes are windowed separately under the same policy
+        self.history_window = HistoryWindow.from_config(agent_config)
+        self.memory_window = HistoryWindow(self.history_window.policy)
+        self.prefix_tracker = PrefixTracker()
         
     def set_task(self, task):
         """Set the current task"""
         self.task = task
         self.execution_history = []
+        self.history_window.reset()
+        self.memory_window.reset()
+        self.prefix_tracker.reset()
         
     def update_history(self, action, action_description, memory=None):
         """Update execution history"""
@@ -93,37 +90,69 @@ class ExecutorAgent:
     def execute_action(self, image_path, action_plan=None, reflection=None):
         """Execute the planned action based on current screen state"""
         try:
-            # Read and encode image
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+            messages, image = self._build_execution_messages(image_path, action_plan, reflection)
+            logger.info(f"Execution agent executing: {image_path}")
+            response = get_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
+            
+            return self._handle_execution_response(response, image)
+                
+        except Exception as e:
+            logger.error(f"Error in execution agent: {str(e)}")
+            return None, f"Execution error: {str(e)}"
+    
+    async def aexecute_action(self, image_path, action_plan=None, reflection=None):
+        """Async variant of execute_action"""
+        try:
+            messages, image = self._build_execution_messages(image_path, action_plan, reflection)
+            logger.info(f"Execution agent executing: {image_path}")
+            response = await aget_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
             
-            # Build execution history context
-            history_context = ""
-            history_memory = ""
-            if self.execution_history:
-                for i, step in enumerate(self.execution_history, 1): 
-                    history_context += f"Step {i}: Action: {step['action']}; Action description: {step['action_description']}\n"
-                    if step['memory']:
-                        history_memory += f"    ({i}). {step['memory']}\n"
-            if history_context:
-                history_context = history_context.rstrip('\n')
-            if history_memory:
-                history_memory = history_memory.rstrip('\n')
+            return self._handle_execution_response(response, image)
 
-            # Build execution prompt
-            execution_prompt = f"""You are an action-executing agent in a GUI intelligent system. You need to output actions that can be executed directly based on the action plan provided by the planning agent to accomplish the task instructions given by the user. Please strictly follow the format requirements and output a brief action description after each action.
+        except Exception as e:
+            logger.error(f"Error in execution agent: {str(e)}")
+            return None, f"Execution error: {str(e)}"
+    
+    def _build_execution_messages(self, image_path, action_plan=None, reflection=None):
+        """Build the execution request for the current screen; returns (messages, encoded image)"""
+        # Read and encode image
+        image = encode_image(image_path, self.image_preprocess)
+        img_width, img_height = image.width, image.height
+        
+        # Build execution history context
+        history_context = '\n'.join(self.history_window.lines(
+            [f"Action: {step['action']}; Action description: {step['action_description']}" for step in self.execution_history]
+        ))
+        history_memory = '\n'.join(self.memory_window.lines(
+            [step['memory'] for step in self.execution_history], fmt='    ({index}). {content}'
+        ))
+
+        # Build execution prompt: the task and the append-only history go ahead of the screenshot so
+        # consecutive steps share the prompt prefix; plan and reflection change every step and follow it
+        execution_prompt = f"""You are an action-executing agent in a GUI intelligent system. You need to output actions that can be executed directly based on the action plan provided by the planning agent to accomplish the task instructions given by the user. Please strictly follow the format requirements and output a brief action description after each action.
 
 ### Background Information 
 1. The user query: {self.task}
 2. Screen resolution: {img_width}x{img_height}
-3. Current action planning: {action_plan if action_plan else '[no plan available]'}
-4. Task progress: The executor has done the following operation on the current device
+3. Task progress: The executor has done the following operation on the current device
 {history_context if history_context else '[First step and no prior actions taken.]'}
-5. Last execution reflection: {reflection if reflection else '[no reflection available]'}
-6. Task history memory:
-{history_memory if history_memory else 'Empty, ignore it'}
+4. Task history memory:
+{history_memory if history_memory else 'Empty, ignore it'}"""
+
+        execution_step = f"""5. Current action planning: {action_plan if action_plan else '[no plan available]'}
+6. Last execution reflection: {reflection if reflection else '[no reflection available]'}
 
 Based on the above information, please analyze the current screen and output action that strictly adhere to the format and can be executed directly to complete the user task.
 ### Output Format
@@ -134,46 +163,36 @@ Based on the above information, please analyze the current screen and output act
 [briefly describe your action]
 </description>"""
 
-            messages = [
-                {
-                    "role": "system",
-                    "content": [
-                        {"type": "text", "text": self.system_prompt.format(width=img_width, height=img_height)}
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": execution_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_string}"}}
-                    ]
-                }
-            ]
-            
-            logger.info(f"Execution agent executing: {image_path}")
-            logger.info(f"Execution agent prompt:\n{self.system_prompt.format(width=img_width, height=img_height)}\n{execution_prompt}")
-            response = get_response(
-                model=self.model,
-                messages=messages,
-                api_key=self.api_key,
-                base_url=self.base_url,
-                temperature=self.temperature
-            )
-            
-            if response:
-                logger.info(f"Execution agent raw response: {response}")
-                action, action_description = self._parse_execution_response(response)
-                logger.info(f"Execution agent action: {action}, description: {action_description}")
-                parsed_action = self._parse_user_input(action)
-                logger.info(f"Parsed agent action: {parsed_action}")
-                return parsed_action, action_description
-            else:
-                return None, "Failed to execute action"
-                
-        except Exception as e:
-            logger.error(f"Error in execution agent: {str(e)}")
-            return None, f"Execution error: {str(e)}"
-    
+        messages = [
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": self.system_prompt.format(width=img_width, height=img_height)}
+                ]
+            },
+            {
+                "role": "user",
+                "content": user_content(execution_prompt, image.data_url, execution_step)
+            }
+        ]
+        self.prefix_tracker.observe(messages)
+
+        logger.info(f"Execution agent prompt:\n{self.system_prompt.format(width=img_width, height=img_height)}\n{execution_prompt}\n...[image]...\n{execution_step}")
+
+        return messages, image
+
+    def _handle_execution_response(self, response, image=None):
+        """Parse the raw execution response into an action, in original screenshot pixels"""
+        if response:
+            logger.info(f"Execution agent raw response: {response}")
+            action, action_description = self._parse_execution_response(response)
+            logger.info(f"Execution agent action: {action}, description: {action_description}")
+            parsed_action = map_action_to_original(self._parse_user_input(action), image)
+            logger.info(f"Parsed agent action: {parsed_action}")
+            return parsed_action, action_description
+        else:
+            return None, "Failed to execute action"
+
     def _parse_execution_response(self, response):
         """Parse the execution response to extract action and description"""
         try:
@@ -0,0 +1,208 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bounded step history for agent prompts.
+
+Every agent used to put its whole history into each prompt, so the prompt grew
+with every step (up to max_steps) and the prefill of an episode grew
+quadratically. A HistoryWindow renders the history instead:
+
+- the newest `window` steps verbatim, with their original step numbers
+- the older steps folded into one summary line (each step shortened to
+  `step_chars`, the line capped at `summary_chars`, oldest steps dropped first)
+- with `dedup`, runs of identical consecutive steps collapsed into one line
+- with `fold_every`, older steps are folded in blocks, so the summary line (and
+  with it the prompt prefix a prefix-caching server reuses) only changes every
+  `fold_every` steps instead of every step
+- with `token_budget`, the window shrinks (down to the newest step), then the
+  summary, until the rendered history fits
+
+The summary is built from the step texts themselves, no extra model call.
+Without a `history` block in the agent config the full history is rendered as
+before; the token estimate is reported either way.
+"""
+
+import re
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+STEP_FORMAT = 'Step {index}: {content}'
+MIN_SUMMARY_CHARS = 80
+CJK = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """Rough token count: one per CJK character, one per four other characters."""
+    if not text:
+        return 0
+    cjk = len(CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def shorten(text, limit):
+    text = ' '.join(str(text).split())
+    if limit and len(text) > limit:
+        return text[:max(limit - 3, 0)] + '...'
+    return text
+
+
+class HistoryPolicy(namedtuple('HistoryPolicy', ['window', 'summary_chars', 'step_chars', 'dedup', 'token_budget', 'fold_every'])):
+    """
+    :param window: newest steps rendered verbatim (None: all of them)
+    :param summary_chars: length cap of the summary line of the older steps
+    :param step_chars: length cap of one step inside the summary
+    :param dedup: collapse identical consecutive steps into one line with a repeat count
+    :param token_budget: estimated tokens the rendered history may use (None: no budget)
+    :param fold_every: steps folded into the summary at a time; between folds the history only grows
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from an agent config's `history` block; None/empty/enabled: false means the full history."""
+        if not config or not config.get('enabled', True):
+            return None
+        window = config.get('window')
+        token_budget = config.get('token_budget')
+        return cls(
+            window=int(window) if window is not None else None,
+            summary_chars=int(config.get('summary_chars', 600)),
+            step_chars=int(config.get('step_chars', 80)),
+            dedup=bool(config.get('dedup', True)),
+            token_budget=int(token_budget) if token_budget is not None else None,
+            fold_every=max(1, int(config.get('fold_every', 1))),
+        )
+
+
+def _span(first, last):
+    return str(first) if first == last else f'{first}-{last}'
+
+
+class HistoryWindow:
+    """Renders one agent's history under a HistoryPolicy and keeps the token counts of the episode."""
+
+    def __init__(self, policy=None):
+        self.policy = policy
+        self.stats = {}
+        self.reset()
+
+    @classmethod
+    def from_config(cls, agent_config):
+        return cls(HistoryPolicy.from_config((agent_config or {}).get('history')))
+
+    def reset(self):
+        """Start a new episode (call from set_task)."""
+        self.renders = 0
+        self.total_tokens = 0
+        self.full_tokens = 0
+        self.stats = {}
+
+    def _groups(self, entries):
+        """(first step, last step, content, count) runs; identical consecutive steps share a run with dedup."""
+        groups = []
+        for index, content in entries:
+            if self.policy and self.policy.dedup and groups and groups[-1][2] == content:
+                first, _, _, count = groups[-1]
+                groups[-1] = (first, index, content, count + 1)
+            else:
+                groups.append((index, index, content, 1))
+        return groups
+
+    def _summary(self, entries, limit):
+        parts = []
+        for _, _, content, count in self._groups(entries):
+            part = shorten(content, self.policy.step_chars)
+            parts.append(part if count == 1 else f'{part} (x{count})')
+        dropped = False
+        while len(parts) > 1 and len('; '.join(parts)) > limit:
+            parts.pop(0)
+            dropped = True
+        summary = '; '.join(parts)
+        if len(summary) > limit:
+            summary = shorten(summary, limit)
+        return f"[Summary of earlier steps] {'...; ' if dropped else ''}{summary}"
+
+    def _render(self, entries, window, fmt, limit):
+        split = len(entries) - window
+        if self.policy.dedup:
+            # never cut a run of repeats in two
+            while 0 < split < len(entries) and entries[split - 1][1] == entries[split][1]:
+                split -= 1
+        lines = []
+        if split > 0:
+            lines.append(fmt.format(index=_span(entries[0][0], entries[split - 1][0]), content=self._summary(entries[:split], limit)))
+        for first, last, content, count in self._groups(entries[split:]):
+            if count > 1:
+                content = f'{content} (repeated {count} times)'
+            lines.append(fmt.format(index=_span(first, last), content=content))
+        return lines, split
+
+    def lines(self, steps, fmt=STEP_FORMAT):
+        """
+        Prompt lines of `steps` (one text per step, empty ones are skipped but keep their number).
+        :param fmt: format of one line with {index} (step number or range) and {content}
+        """
+        entries = [(index, str(content)) for index, content in enumerate(steps, 1) if content]
+        full = [fmt.format(index=index, content=content) for index, content in entries]
+        full_tokens = estimate_tokens('\n'.join(full))
+        if self.policy is None:
+            lines, split, tokens = full, 0, full_tokens
+        else:
+            window = len(entries) if self.policy.window is None else min(self.policy.window, len(entries))
+            # fold whole blocks only: between folds the verbatim part grows from window to window + fold_every - 1
+            window = len(entries) - (len(entries) - window) // self.policy.fold_every * self.policy.fold_every
+            limit = self.policy.summary_chars
+            lines, split = self._render(entries, window, fmt, limit)
+            tokens = estimate_tokens('\n'.join(lines))
+            budget = self.policy.token_budget
+            while budget is not None and tokens > budget:
+                if window > 1:
+                    window -= 1
+                elif limit > MIN_SUMMARY_CHARS:
+                    limit = max(MIN_SUMMARY_CHARS, limit // 2)
+                else:
+                    break
+                lines, split = self._render(entries, window, fmt, limit)
+                tokens = estimate_tokens('\n'.join(lines))
+            if budget is not None and tokens > budget:
+                logger.warning(f"History of {len(entries)} steps still uses ~{tokens} tokens, over the budget of {budget}")
+        self.renders += 1
+        self.total_tokens += tokens
+        self.full_tokens += full_tokens
+        self.stats = {
+            'steps': len(entries),
+            'verbatim': len(entries) - split,
+            'summarized': split,
+            'lines': len(lines),
+            'tokens': tokens,
+            'full_tokens': full_tokens,
+            'budget': self.policy.token_budget if self.policy else None,
+        }
+        if entries:
+            logger.debug(f"历史窗口: {self.stats}")
+        return lines
+
+    def report(self):
+        """Token counts of the episode so far: rendered history vs. the full history it replaced."""
+        return {
+            'renders': self.renders,
+            'history_tokens': self.total_tokens,
+            'full_history_tokens': self.full_tokens,
+            'saved_tokens': self.full_tokens - self.total_tokens,
+            'last': dict(self.stats),
+        }
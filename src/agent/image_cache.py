@@ -0,0 +1,281 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process-wide cache of base64-encoded screenshots.
+
+The evaluation graph has ~2k distinct screenshots that are revisited across
+steps, tasks and agents, and in plan-reflect mode the planner, executor,
+reflector and memory agents all send the same screenshot within one step.
+`encode_image` reads and encodes a file once and serves later requests from a
+size-bounded LRU shared by every agent in the process.
+
+Agents may also ask for a preprocessed copy (`ImagePreprocess`, read from the
+`image_preprocess` block of an agent config): downscaled to a maximum side,
+aligned to the vision encoder's patch factor like qwen_agent.smart_resize,
+and re-encoded as JPEG/WebP. Coordinates the model returns for such an image
+are in resized pixel space and are mapped back with `map_action_to_original`.
+"""
+
+import io
+import os
+import math
+import base64
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+IMAGE_FACTOR = 28
+MIN_PIXELS = 4 * 28 * 28
+MAX_PIXELS = 16384 * 28 * 28
+MAX_RATIO = 200
+
+_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+}
+
+_PIL_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'jpg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+
+
+class EncodedImage(namedtuple('EncodedImage', ['width', 'height', 'mime', 'data', 'original_width', 'original_height'])):
+    """
+    Size, mime type and base64 payload of one screenshot as sent to the model.
+    width/height are the size of the (possibly resized) payload, original_width/
+    original_height the size of the file on disk.
+    """
+
+    __slots__ = ()
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime};base64,{self.data}"
+
+    @property
+    def resized(self):
+        return (self.width, self.height) != (self.original_width, self.original_height)
+
+    def to_original(self, x, y):
+        """Map a point in payload pixels back to original screenshot pixels."""
+        if not self.resized:
+            return x, y
+        return (
+            round(float(x) * self.original_width / self.width),
+            round(float(y) * self.original_height / self.height),
+        )
+
+
+class ImagePreprocess(namedtuple('ImagePreprocess', ['max_side', 'format', 'quality', 'factor', 'min_pixels', 'max_pixels'])):
+    """
+    How a screenshot is prepared before upload. Hashable, so it is part of the cache key.
+    :param max_side: longest side after downscaling (None: keep the size)
+    :param format: jpeg, webp, png or original (keep the file's own encoding when not resized)
+    :param quality: JPEG/WebP quality
+    :param factor: align both sides to a multiple of factor (None/0: no alignment)
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from an agent config's `image_preprocess` block; None/empty/enabled: false means no preprocessing."""
+        if not config or not config.get('enabled', True):
+            return None
+        return cls(
+            max_side=config.get('max_side'),
+            format=str(config.get('format', 'jpeg')).lower(),
+            quality=int(config.get('quality', 85)),
+            factor=config.get('factor'),
+            min_pixels=int(config.get('min_pixels', MIN_PIXELS)),
+            max_pixels=int(config.get('max_pixels', MAX_PIXELS)),
+        )
+
+    def target_size(self, width, height):
+        """Return the (width, height) the screenshot is resized to."""
+        if self.max_side and max(width, height) > self.max_side:
+            scale = self.max_side / max(width, height)
+            width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        if self.factor:
+            max_pixels = self.max_pixels
+            if self.max_side:
+                # alignment may round up, never let it grow past the requested bound
+                max_pixels = min(max_pixels, width * height)
+            height, width = smart_resize(height, width, self.factor, self.min_pixels, max_pixels)
+        return width, height
+
+
+def round_by_factor(number, factor):
+    return round(number / factor) * factor
+
+
+def ceil_by_factor(number, factor):
+    return math.ceil(number / factor) * factor
+
+
+def floor_by_factor(number, factor):
+    return math.floor(number / factor) * factor
+
+
+def smart_resize(height, width, factor=IMAGE_FACTOR, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
+    """
+    Same rule as qwen_agent.smart_resize in HammerEnv: both sides divisible by
+    factor, pixel count within [min_pixels, max_pixels], aspect ratio kept as
+    closely as possible. Returns (height, width).
+    """
+    if max(height, width) / min(height, width) > MAX_RATIO:
+        raise ValueError(
+            f"absolute aspect ratio must be smaller than {MAX_RATIO}, got {max(height, width) / min(height, width)}"
+        )
+    h_bar = max(factor, round_by_factor(height, factor))
+    w_bar = max(factor, round_by_factor(width, factor))
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = max(factor, floor_by_factor(height / beta, factor))
+        w_bar = max(factor, floor_by_factor(width / beta, factor))
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = ceil_by_factor(height * beta, factor)
+        w_bar = ceil_by_factor(width * beta, factor)
+    return h_bar, w_bar
+
+
+def map_action_to_original(action, image):
+    """Map the x/y of a parsed action from payload pixels back to original pixels, in place."""
+    if action and image is not None and image.resized and 'x' in action and 'y' in action:
+        action['x'], action['y'] = image.to_original(action['x'], action['y'])
+    return action
+
+
+def guess_mime_type(image_path):
+    return _MIME_TYPES.get(os.path.splitext(image_path)[1].lower(), 'image/jpeg')
+
+
+class ImageCache:
+    """Thread-safe LRU from image file to EncodedImage, bounded by total payload size."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_path, preprocess=None):
+        # mtime/size in the key so a rewritten screenshot is never served stale
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, preprocess)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # encode outside the lock; two threads racing on the same file just both encode it
+        entry = self._encode(image_path, preprocess)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self.total_bytes += len(entry.data)
+                self._evict(keep=1)
+        return entry
+
+    def _evict(self, keep=0):
+        # least recently used first; `keep` entries stay even over the bound
+        while self.total_bytes > self.max_bytes and len(self._entries) > keep:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted.data)
+
+    def resize(self, max_bytes):
+        """Change the bound, dropping least recently used entries until the cache fits."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _encode(self, image_path, preprocess=None):
+        with Image.open(image_path) as img:
+            width, height = img.size
+            if preprocess is not None:
+                target = preprocess.target_size(width, height)
+                pil_format, mime = _PIL_FORMATS.get(preprocess.format, (None, None))
+                if target != (width, height) or pil_format is not None:
+                    payload, mime = _reencode(img, target, pil_format, mime, preprocess.quality)
+                    data = base64.b64encode(payload).decode("utf-8")
+                    return EncodedImage(target[0], target[1], mime, data, width, height)
+        with open(image_path, "rb") as image_file:
+            data = base64.b64encode(image_file.read()).decode("utf-8")
+        return EncodedImage(width, height, guess_mime_type(image_path), data, width, height)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def _reencode(img, size, pil_format, mime, quality):
+    if pil_format is None:
+        # 'original' format but resized: keep the source container
+        pil_format = img.format or 'PNG'
+        mime = Image.MIME.get(pil_format, 'image/png')
+    if size != img.size:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    if pil_format in ('JPEG', 'WEBP'):
+        img.save(buffer, format=pil_format, quality=quality)
+    else:
+        img.save(buffer, format=pil_format)
+    return buffer.getvalue(), mime
+
+
+_image_cache = ImageCache()
+
+
+def set_image_cache_size(max_bytes):
+    """Resize the process-wide cache; least recently used entries over the new bound are dropped."""
+    logger.info(f"Image cache bound set to {max_bytes / 1024 / 1024:.0f} MB")
+    _image_cache.resize(max_bytes)
+
+
+def get_image_cache():
+    return _image_cache
+
+
+def encode_image(image_path, preprocess=None):
+    """Return the (cached) EncodedImage for `image_path`, preprocessed if `preprocess` is given."""
+    return _image_cache.get(image_path, preprocess)
@@ -20,33 +20,20 @@ import time
 from PIL import Image
 import logging
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
+from src.agent.async_client import aget_response
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1):
     """Get response from LLM with retry mechanism"""
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2
-    
-    while retries <= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            return response
-        except Exception as e:
-            logger.warning(f"Request failed, retrying... Error: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    logger.error("Request failed after multiple retries.")
-    return None
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 class MemoryAgent:
     """Memory Agent responsible for storing and recalling information"""
@@ -56,6 +43,7 @@ class MemoryAgent:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.temperature = agent_config.get('temperature', 0.1)
         self.task = None
         self.execution_history = []
@@ -77,59 +65,8 @@ class MemoryAgent:
     def get_memory(self, image_path, cur_planning = None, action = None, action_description = None):
         """Generate a plan for the next action based on current state"""
         try:
-            # Read and encode image
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-            
-            # Build history context 
-            # history_context = ""
-            # history_memory = ""
-            # if self.execution_history:
-            #     for i, step in enumerate(self.execution_history, 1):  # 完整历史轨迹
-            #         history_context += f"Step {i}: Action: {step['action']}; Action description: {step['action_description']}\n"
-            #         if step['memory']:
-            #             history_memory += f"{i}. {step['memory']}\n"
-            # if history_context:
-            #     history_context = history_context.rstrip('\n')
-            # if history_memory:
-            #     history_memory = history_memory.rstrip('\n')
-
-            if not cur_planning and action_description:
-                cur_planning = action_description
-            memory_prompt = f"""
-# Background
-1. The user query: {self.task}
-2. The current action plan: {cur_planning if cur_planning else '[no planning available]'}
-3. The current action: {action if action else '[unknown]'}
-
-# Instruction
-Memory: important information you want to remember for the future actions. The memory should be only contents on current screen that will be used in the future actions. It should satisfy that: you cannnot determine one or more future actions without this memory. If no memory is needed in current screen, output **None**.
-
-# Response Format
-<memory>
-[important information you want to remember for the future actions. If no memory is needed in current screen, output "None".]
-</memory>"""
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": [
-                        {"type": "text", "text": "You are a memory agent in a GUI intelligent system. Given the user's task, the current task planning, and the current screen, you need to remember important information for future operations."}
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": memory_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_string}"}}
-                    ]
-                }
-            ]
-            
+            messages = self._build_memory_messages(image_path, cur_planning, action, action_description)
             logger.info(f"Memorizing agent analyzing: {image_path}")
-            logger.info(f"Memorizing agent prompt:\nYou are a memory agent in a GUI intelligent system. Given the user's task, the current task planning, and the current screen, you need to remember important information for future operations.\n{memory_prompt}")
             response = get_response(
                 model=self.model,
                 messages=messages,
@@ -138,18 +75,97 @@ Memory: important information you want to remember for the future actions. The m
                 temperature=self.temperature
             )
             
-            if response:
-                logger.info(f"Memorizing agent raw response: {response}")
-                parsed_memory, error = self._parse_memorizing_response(response)
-                logger.info(f"Memorizing agent response: {parsed_memory}")
-                return parsed_memory, error
-            else:
-                return None, "Failed to generate memory"
+            return self._handle_memory_response(response)
                 
         except Exception as e:
             logger.error(f"Error in memory agent: {str(e)}")
             return None, f"Memorizing error: {str(e)}"
 
+    async def aget_memory(self, image_path, cur_planning = None, action = None, action_description = None):
+        """Async variant of get_memory"""
+        try:
+            messages = self._build_memory_messages(image_path, cur_planning, action, action_description)
+            logger.info(f"Memorizing agent analyzing: {image_path}")
+            response = await aget_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
+            
+            return self._handle_memory_response(response)
+
+        except Exception as e:
+            logger.error(f"Error in memory agent: {str(e)}")
+            return None, f"Memorizing error: {str(e)}"
+
+    def _build_memory_messages(self, image_path, cur_planning=None, action=None, action_description=None):
+        """Build the memory request for the current screen"""
+        # Read and encode image
+        image = encode_image(image_path, self.image_preprocess)
+        img_width, img_height = image.width, image.height
+        
+        # Build history context 
+        # history_context = ""
+        # history_memory = ""
+        # if self.execution_history:
+        #     for i, step in enumerate(self.execution_history, 1):  # 完整历史轨迹
+        #         history_context += f"Step {i}: Action: {step['action']}; Action description: {step['action_description']}\n"
+        #         if step['memory']:
+        #             history_memory += f"{i}. {step['memory']}\n"
+        # if history_context:
+        #     history_context = history_context.rstrip('\n')
+        # if history_memory:
+        #     history_memory = history_memory.rstrip('\n')
+
+        if not cur_planning and action_description:
+            cur_planning = action_description
+        # fixed instructions first, then the task: the part of the prompt that repeats at every step
+        memory_prompt = f"""
+# Instruction
+Memory: important information you want to remember for the future actions. The memory should be only contents on current screen that will be used in the future actions. It should satisfy that: you cannnot determine one or more future actions without this memory. If no memory is needed in current screen, output **None**.
+
+# Response Format
+<memory>
+[important information you want to remember for the future actions. If no memory is needed in current screen, output "None".]
+</memory>
+
+# Background
+1. The user query: {self.task}
+2. The current action plan: {cur_planning if cur_planning else '[no planning available]'}
+3. The current action: {action if action else '[unknown]'}"""
+
+        messages = [
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": "You are a memory agent in a GUI intelligent system. Given the user's task, the current task planning, and the current screen, you need to remember important information for future operations."}
+                ]
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": memory_prompt},
+                    {"type": "image_url", "image_url": {"url": image.data_url}}
+                ]
+            }
+        ]
+
+        logger.info(f"Memorizing agent prompt:\nYou are a memory agent in a GUI intelligent system. Given the user's task, the current task planning, and the current screen, you need to remember important information for future operations.\n{memory_prompt}")
+
+        return messages
+
+    def _handle_memory_response(self, response):
+        """Parse the raw memory response"""
+        if response:
+            logger.info(f"Memorizing agent raw response: {response}")
+            parsed_memory, error = self._parse_memorizing_response(response)
+            logger.info(f"Memorizing agent response: {parsed_memory}")
+            return parsed_memory, error
+        else:
+            return None, "Failed to generate memory"
+
     def _parse_memorizing_response(self, response):
         """Parse the memorizing response into structured components"""
         try:
@@ -21,34 +21,16 @@ import time
 from PIL import Image
 import logging
 import re
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
-
+@cached_response(max_tokens=2048, model='glm-4.5V')
 def get_response(messages, temperature=0.1, top_k=5, top_p=0.9):
     client = ZhipuAiClient(api_key="")
-    retries = 0
-    retry_delay = 2  
-    while retries<= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model="glm-4.5V",
-                messages=messages,
-                temperature=temperature,
-                max_tokens=2048,
-            ).choices[0].message.content.strip()
-            break
-        except Exception as e:
-            print(f"请求失败，重试中... 错误信息: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    if retries > MAX_RETRIES:
-        print("请求多次失败，终止操作。")
-        return None
-
-    return response
+    return chat_completion(client, "glm-4.5V", messages, endpoint='glm-4.5V', temperature=temperature, max_tokens=2048)
 
 class MemoryAgentGLM:
     """Memory Agent responsible for storing and recalling information"""
@@ -58,6 +40,7 @@ class MemoryAgentGLM:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.temperature = agent_config.get('temperature', 0.1)
         self.task = None
         self.execution_history = []
@@ -80,10 +63,8 @@ class MemoryAgentGLM:
         """Generate a plan for the next action based on current state"""
         try:
             # Read and encode image
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+            image = encode_image(image_path, self.image_preprocess)
+            img_width, img_height = image.width, image.height
             
             # Build history context 
             # history_context = ""
@@ -100,20 +81,21 @@ class MemoryAgentGLM:
 
             if not cur_planning and action_description:
                 cur_planning = action_description
+            # fixed instructions first, then the task: the part of the prompt that repeats at every step
             memory_prompt = f"""
 # Role: 
 You are a GUI Agent, and your primary task is to respond accurately to user requests or questions. In addition to directly answering the user's queries, you can also use tools or perform GUI operations directly until you fulfill the user's request or provide a correct answer. You should carefully read and understand the images and questions provided by the user, and engage in thinking and reflection when appropriate. 
 
-# Background
-1. The user query: {self.task}
-2. The current action plan: {cur_planning if cur_planning else '[no planning available]'}
-3. The current action: {action if action else '[unknown]'}
-
 # Output Format
 Memory: important information you want to remember for the future actions. The memory should be only contents on current screen that will be used in the future actions. It should satisfy that: you cannnot determine one or more future actions without this memory. If no memory is needed in current screen, output **None**.
 
 Your answer should look like:
 Memory: ...
+
+# Background
+1. The user query: {self.task}
+2. The current action plan: {cur_planning if cur_planning else '[no planning available]'}
+3. The current action: {action if action else '[unknown]'}
 """
 
             messages = [
@@ -127,7 +109,7 @@ Memory: ...
                     "role": "user",
                     "content": [
                         {"type": "text", "text": memory_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_string}"}}
+                        {"type": "image_url", "image_url": {"url": image.data_url}}
                     ]
                 }
             ]
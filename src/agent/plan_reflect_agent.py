@@ -17,7 +17,9 @@ import os
 import base64
 import json
 import time
+import asyncio
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from PIL import Image
 import logging
 from src.agent.planner_agent import PlannerAgent
@@ -28,6 +30,12 @@ from src.agent.memory_agent_api import MemoryAgentGLM
 
 logger = logging.getLogger(__name__)
 
+# sequential: reflect, then plan with the reflection
+# parallel: plan without the reflection, next to the reflector
+# speculative: plan without the reflection next to the reflector, and plan again with it
+#              unless the reflection found no planning issue
+PLAN_REFLECT_MODES = ('sequential', 'parallel', 'speculative')
+
 class PlanReflectAgent:
     """Integrated Agent that combines Planning, Execution, and Reflection in a three-step process"""
     
@@ -38,6 +46,11 @@ class PlanReflectAgent:
         self.use_reflect = agent_config.get('reflect', True)
         self.use_memory = agent_config.get('memory', False)
         self.glm = agent_config.get('glm', False)
+        # overlap the memory call of step t with step t+1 (its result is only read by step t+1's planner and executor)
+        self.pipeline_memory = agent_config.get('pipeline_memory', False) and self.use_memory
+        self.plan_reflect_mode = agent_config.get('plan_reflect_mode', 'sequential')
+        if self.plan_reflect_mode not in PLAN_REFLECT_MODES:
+            raise ValueError(f"Unsupported plan_reflect_mode: {self.plan_reflect_mode}, expected one of {PLAN_REFLECT_MODES}")
         print(f"PlanReflectAgent initialized with plan: {self.use_plan} and {type(self.use_plan)}, reflect: {self.use_reflect} and {type(self.use_reflect)}, memory: {self.use_memory} and {type(self.use_memory)}")
         # Initialize the three specialized agents
         if self.use_plan:
@@ -58,6 +71,9 @@ class PlanReflectAgent:
         
         # Thread safety
         self._lock = threading.Lock()
+        # background calls of the pipelined modes; the memory call still running from the previous step
+        self._pool = None
+        self._pending = None
         
     def set_task(self, task):
         """Set the current task for all agents"""
@@ -69,109 +85,288 @@ class PlanReflectAgent:
         if self.use_memory:
             self.memory.set_task(task)
         self.executor.set_task(task)
+        if self._pending is not None:
+            # memory of the previous task's last step is not needed any more
+            self._pending[0].cancel()
+            self._pending = None
         self.current_step = 0
         self.step_history = []
         
     def agent_step(self, image_path):
-        """Execute one complete step: Plan -> Execute -> Reflect (thread-safe)"""
+        """Execute one complete step: Reflect -> Plan -> Execute -> Memory (thread-safe)"""
         with self._lock:
             try:
-                self.current_step += 1  
                 thread_id = threading.current_thread().ident
-                logger.info(f"Thread {thread_id}: === Starting Step {self.current_step} ===")
-                step_info = {
-                    'step_number': self.current_step,
-                    'screenshot': image_path}
-                
-                # Step 0: Reflecting on previous action result (if any)
-                if self.use_reflect and self.current_step > 1:
+                step_info = self._begin_step(image_path, thread_id)
+                reflected = self._should_reflect()
+                concurrent = self._plan_next_to_reflection()
+
+                # Step 0: Reflecting on previous action result (if any), next to the previous step's memory call
+                reflection_future = None
+                if reflected:
                     logger.info(f"Thread {thread_id}: Reflecting...")
-                    pre_image_path = self.step_history[-1]['screenshot']
-                    if self.use_plan:
-                        inter_planning = self.step_history[-1]['planning']
-                    else:
-                        inter_planning = 'No action plan'
-                    inter_executed_action = self.step_history[-1]['execution']['action']
-                    inter_action_description = self.step_history[-1]['execution']['description']
-                    reflection_result, reflection_error = self.reflector.reflect_on_action(
-                        image_path,
-                        pre_image_path,
-                        inter_planning,
-                        inter_executed_action,
-                        inter_action_description,
+                    reflection_future = self._start(
+                        self.reflector.reflect_on_action, image_path, *self._reflection_inputs(),
+                        background=concurrent or self._pending is not None
                     )
-                    
-                    if reflection_error:
-                        logger.warning(f"Thread {thread_id}: Reflection failed: {reflection_error}")
-                        reflection_result = None
-                    else:
-                        step_info['planning_reflection'] = reflection_result.get('planning_reflection', 'No planning reflection')
-                        step_info['execution_reflection'] = reflection_result.get('execution_reflection', 'No execution reflection')
+                self._complete_pending(thread_id)
+                planning_future = self._start(self.planner.plan_next_action, image_path, None, background=True) if concurrent else None
 
+                reflection_result = None
+                if reflection_future is not None:
+                    reflection_result, reflection_error = reflection_future.result()
+                    reflection_result = self._record_reflection(step_info, reflection_result, reflection_error, thread_id)
 
                 # Step 1: Planning
+                planning_result = None
                 if self.use_plan:
-                    print(self.use_plan)
                     logger.info(f"Thread {thread_id}: Step 1: Planning...")
-                    if self.use_reflect and self.current_step > 1:
-                        planning_reflection = reflection_result.get('planning_reflection', None) if reflection_result else None
-                    planning_result, planning_error = self.planner.plan_next_action(image_path, planning_reflection if self.use_reflect and self.current_step > 1 else None) 
-
-                    if planning_error:
-                        logger.error(f"Thread {thread_id}: Planning failed: {planning_error}")
-                        planning_result = None
+                    if planning_future is not None and self._keep_early_plan(reflection_result, thread_id):
+                        planning_result, planning_error = planning_future.result()
                     else:
-                        step_info['planning'] = planning_result.get('action_plan', 'No action plan')
-                
+                        if planning_future is not None and not planning_future.cancel():
+                            # already running: let it finish so the planner never serves two calls at once
+                            planning_future.result()
+                        planning_result, planning_error = self.planner.plan_next_action(
+                            image_path, self._planning_reflection(reflection_result)
+                        )
+                    planning_result = self._record_planning(step_info, planning_result, planning_error, thread_id)
 
                 # Step 2: Execution
                 logger.info(f"Thread {thread_id}: Step 2: Executing...")
-                if self.use_reflect and self.current_step > 1:
-                    execution_reflection = reflection_result.get('execution_reflection', None) if reflection_result else None
-                if self.use_plan:
-                    planning_context = planning_result.get('action_plan', None) if planning_result else None
                 executed_action, action_description = self.executor.execute_action(
-                    image_path, 
-                    action_plan = planning_context if self.use_plan else None,
-                    reflection = execution_reflection if self.use_reflect and self.current_step > 1 else None
+                    image_path, **self._execution_inputs(planning_result, reflection_result)
                 )
-                
                 if not executed_action:
                     logger.error(f"Thread {thread_id}: Execution failed")
                     return None, None, "Execution failed"
-                else:
-                    step_info['execution'] = {
-                        'action': executed_action,
-                        'description': action_description
-                    }
-                    
-                if self.use_memory:
-                    planning_context = planning_result.get('action_plan', None) if self.use_plan and planning_result else None
-                    memory_content, memory_error = self.memory.get_memory(image_path, planning_context, action=executed_action, action_description=action_description)
-                    if memory_error:
-                        logger.error(f"Thread {thread_id}: Memory generation failed: {memory_error}")
-                        memory_content = None
-                    else:
-                        step_info['memory'] = memory_content
-                
-                self.step_history.append(step_info)
+                step_info['execution'] = {
+                    'action': executed_action,
+                    'description': action_description
+                }
                 
-                # Update agent histories
-                memory = memory_content if self.use_memory and memory_content else None
-                if self.use_plan:
-                    self.planner.update_history(planning_result=planning_result, action=executed_action, action_description=action_description, memory=memory)
-                self.executor.update_history(action=executed_action, action_description=action_description, memory=memory)
-                if self.use_reflect and self.current_step > 1:
-                    self.reflector.update_history(reflection_result,action=executed_action, action_description=action_description, memory=memory)
-                
-                logger.info(f"Thread {thread_id}: Step {self.current_step} Completed.")
-                logger.info(f"Thread {thread_id}: Step Information: {json.dumps(step_info, ensure_ascii=False, indent=4)}")
+                step = (step_info, planning_result, reflection_result, reflected, executed_action, action_description)
+                memory_content = None
+                if self.use_memory:
+                    memory_future = self._start(
+                        self.memory.get_memory, image_path, self._memory_planning(planning_result),
+                        action=executed_action, action_description=action_description, background=self.pipeline_memory
+                    )
+                    if self.pipeline_memory:
+                        # finished by the next step (or flush) before anything reads it
+                        self._finish_step(step_info, thread_id)
+                        self._pending = (memory_future,) + step
+                        return executed_action, action_description, None
+                    memory_content, memory_error = memory_future.result()
+                    memory_content = self._record_memory(step_info, memory_content, memory_error, thread_id)
                 
+                self._finish_step(step_info, thread_id)
+                self._update_histories(*step[1:], memory_content)
                 return executed_action, action_description, None
                 
             except Exception as e:
                 logger.error(f"Thread {thread_id}: Error in PlanReflectAgent step: {str(e)}")
                 return None, None, f"Agent step error: {str(e)}"
+
+    async def aagent_step(self, image_path):
+        """
+        Async agent_step for the asyncio runner: same phases and same step_history,
+        but every VLM call is awaited. One episode owns one agent, so no lock is taken.
+        """
+        try:
+            thread_id = threading.current_thread().ident
+            step_info = self._begin_step(image_path, thread_id)
+            reflected = self._should_reflect()
+            concurrent = self._plan_next_to_reflection()
+
+            reflection_task = None
+            if reflected:
+                logger.info(f"Thread {thread_id}: Reflecting...")
+                reflection_task = asyncio.ensure_future(self.reflector.areflect_on_action(image_path, *self._reflection_inputs()))
+            await self._acomplete_pending(thread_id)
+            planning_task = asyncio.ensure_future(self.planner.aplan_next_action(image_path, None)) if concurrent else None
+
+            reflection_result = None
+            if reflection_task is not None:
+                reflection_result, reflection_error = await reflection_task
+                reflection_result = self._record_reflection(step_info, reflection_result, reflection_error, thread_id)
+
+            planning_result = None
+            if self.use_plan:
+                logger.info(f"Thread {thread_id}: Step 1: Planning...")
+                if planning_task is not None and self._keep_early_plan(reflection_result, thread_id):
+                    planning_result, planning_error = await planning_task
+                else:
+                    if planning_task is not None:
+                        planning_task.cancel()
+                    planning_result, planning_error = await self.planner.aplan_next_action(
+                        image_path, self._planning_reflection(reflection_result)
+                    )
+                planning_result = self._record_planning(step_info, planning_result, planning_error, thread_id)
+
+            logger.info(f"Thread {thread_id}: Step 2: Executing...")
+            executed_action, action_description = await self.executor.aexecute_action(
+                image_path, **self._execution_inputs(planning_result, reflection_result)
+            )
+            if not executed_action:
+                logger.error(f"Thread {thread_id}: Execution failed")
+                return None, None, "Execution failed"
+            step_info['execution'] = {
+                'action': executed_action,
+                'description': action_description
+            }
+
+            step = (step_info, planning_result, reflection_result, reflected, executed_action, action_description)
+            memory_content = None
+            if self.use_memory:
+                memory_args = (image_path, self._memory_planning(planning_result))
+                memory_kwargs = {'action': executed_action, 'action_description': action_description}
+                if hasattr(self.memory, 'aget_memory'):
+                    memory_call = self.memory.aget_memory(*memory_args, **memory_kwargs)
+                else:
+                    # MemoryAgentGLM only has a blocking client
+                    memory_call = asyncio.to_thread(self.memory.get_memory, *memory_args, **memory_kwargs)
+                if self.pipeline_memory:
+                    self._finish_step(step_info, thread_id)
+                    self._pending = (asyncio.ensure_future(memory_call),) + step
+                    return executed_action, action_description, None
+                memory_content, memory_error = await memory_call
+                memory_content = self._record_memory(step_info, memory_content, memory_error, thread_id)
+
+            self._finish_step(step_info, thread_id)
+            self._update_histories(*step[1:], memory_content)
+            return executed_action, action_description, None
+
+        except Exception as e:
+            logger.error(f"Thread {thread_id}: Error in PlanReflectAgent step: {str(e)}")
+            return None, None, f"Agent step error: {str(e)}"
+
+    def flush(self):
+        """Wait for the memory call of the last step (pipeline_memory) so step_history is complete."""
+        with self._lock:
+            self._complete_pending(threading.current_thread().ident)
+
+    async def aflush(self):
+        await self._acomplete_pending(threading.current_thread().ident)
+
+    def close(self):
+        self.flush()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _start(self, fn, *args, background=False, **kwargs):
+        """Run fn on the agent's pool (background) or right away; either way return a Future."""
+        if background:
+            if self._pool is None:
+                # at most the previous memory call, the reflection and an early plan run at once
+                self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='plan-reflect')
+            return self._pool.submit(fn, *args, **kwargs)
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+    def _complete_pending(self, thread_id):
+        if self._pending is None:
+            return
+        memory_future, step_info, *step = self._pending
+        self._pending = None
+        memory_content, memory_error = memory_future.result()
+        memory_content = self._record_memory(step_info, memory_content, memory_error, thread_id)
+        self._update_histories(*step, memory_content)
+
+    async def _acomplete_pending(self, thread_id):
+        if self._pending is None:
+            return
+        memory_task, step_info, *step = self._pending
+        self._pending = None
+        memory_content, memory_error = await memory_task
+        memory_content = self._record_memory(step_info, memory_content, memory_error, thread_id)
+        self._update_histories(*step, memory_content)
+
+    def _plan_next_to_reflection(self):
+        return self.use_plan and self._should_reflect() and self.plan_reflect_mode != 'sequential'
+
+    def _keep_early_plan(self, reflection_result, thread_id):
+        """Whether the plan made without the reflection is used (parallel always, speculative if nothing to fix)."""
+        if self.plan_reflect_mode == 'parallel':
+            return True
+        planning_reflection = self._planning_reflection(reflection_result)
+        if not planning_reflection or planning_reflection.lower().startswith('no issues'):
+            return True
+        logger.info(f"Thread {thread_id}: Planning reflection has suggestions, planning again with it")
+        return False
+
+    def _begin_step(self, image_path, thread_id):
+        self.current_step += 1
+        logger.info(f"Thread {thread_id}: === Starting Step {self.current_step} ===")
+        return {
+            'step_number': self.current_step,
+            'screenshot': image_path}
+
+    def _should_reflect(self):
+        return self.use_reflect and self.current_step > 1
+
+    def _reflection_inputs(self):
+        """(pre_image_path, action_plan, action, action_description) of the previous step"""
+        previous = self.step_history[-1]
+        inter_planning = previous['planning'] if self.use_plan else 'No action plan'
+        return previous['screenshot'], inter_planning, previous['execution']['action'], previous['execution']['description']
+
+    def _record_reflection(self, step_info, reflection_result, reflection_error, thread_id):
+        if reflection_error:
+            logger.warning(f"Thread {thread_id}: Reflection failed: {reflection_error}")
+            return None
+        step_info['planning_reflection'] = reflection_result.get('planning_reflection', 'No planning reflection')
+        step_info['execution_reflection'] = reflection_result.get('execution_reflection', 'No execution reflection')
+        return reflection_result
+
+    def _planning_reflection(self, reflection_result):
+        if not self._should_reflect() or not reflection_result:
+            return None
+        return reflection_result.get('planning_reflection', None)
+
+    def _record_planning(self, step_info, planning_result, planning_error, thread_id):
+        if planning_error:
+            logger.error(f"Thread {thread_id}: Planning failed: {planning_error}")
+            return None
+        step_info['planning'] = planning_result.get('action_plan', 'No action plan')
+        return planning_result
+
+    def _execution_inputs(self, planning_result, reflection_result):
+        execution_reflection = None
+        if self._should_reflect() and reflection_result:
+            execution_reflection = reflection_result.get('execution_reflection', None)
+        return {
+            'action_plan': self._memory_planning(planning_result),
+            'reflection': execution_reflection
+        }
+
+    def _memory_planning(self, planning_result):
+        if not self.use_plan or not planning_result:
+            return None
+        return planning_result.get('action_plan', None)
+
+    def _record_memory(self, step_info, memory_content, memory_error, thread_id):
+        if memory_error:
+            logger.error(f"Thread {thread_id}: Memory generation failed: {memory_error}")
+            return None
+        step_info['memory'] = memory_content
+        return memory_content
+
+    def _finish_step(self, step_info, thread_id):
+        self.step_history.append(step_info)
+        logger.info(f"Thread {thread_id}: Step {step_info['step_number']} Completed.")
+        logger.info(f"Thread {thread_id}: Step Information: {json.dumps(step_info, ensure_ascii=False, indent=4)}")
+
+    def _update_histories(self, planning_result, reflection_result, reflected, executed_action, action_description, memory_content):
+        """Update agent histories with a finished step; `reflected`: whether the step ran the reflector"""
+        memory = memory_content if self.use_memory and memory_content else None
+        if self.use_plan:
+            self.planner.update_history(planning_result=planning_result, action=executed_action, action_description=action_description, memory=memory)
+        self.executor.update_history(action=executed_action, action_description=action_description, memory=memory)
+        if reflected:
+            self.reflector.update_history(reflection_result,action=executed_action, action_description=action_description, memory=memory)
     
     def _build_planning_context(self, planning_result):
         """Build context string from planning result"""
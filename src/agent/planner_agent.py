@@ -20,33 +20,22 @@ import time
 from PIL import Image
 import logging
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
+from src.agent.history import HistoryWindow
+from src.agent.prompt_layout import PrefixTracker, user_content
+from src.agent.async_client import aget_response
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1):
     """Get response from LLM with retry mechanism"""
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2
-    
-    while retries <= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            return response
-        except Exception as e:
-            logger.warning(f"Request failed, retrying... Error: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    logger.error("Request failed after multiple retries.")
-    return None
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 class PlannerAgent:
     """Planning Agent responsible for generating action plans based on current state and task progress"""
@@ -56,14 +45,22 @@ class PlannerAgent:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.temperature = agent_config.get('temperature', 0.1)
         self.task = None
         self.execution_history = []
+        # actions and memory notes are windowed separately under the same policy
+        self.history_window = HistoryWindow.from_config(agent_config)
+        self.memory_window = HistoryWindow(self.history_window.policy)
+        self.prefix_tracker = PrefixTracker()
         
     def set_task(self, task):
         """Set the current task"""
         self.task = task
         self.execution_history = []
+        self.history_window.reset()
+        self.memory_window.reset()
+        self.prefix_tracker.reset()
         
     def update_history(self, planning_result, action, action_description, memory=None):
         """Update execution history"""
@@ -77,34 +74,65 @@ class PlannerAgent:
     def plan_next_action(self, image_path, reflection_content = None):
         """Generate a plan for the next action based on current state"""
         try:
-            # Read and encode image
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
-            with open(image_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-            
-            # Build history context 
-            history_context = ""
-            history_memory = ""
-            if self.execution_history:
-                for i, step in enumerate(self.execution_history, 1): 
-                    history_context += f"Step {i}: Action: {step['action']}; Action description: {step['action_description']}\n"
-                    if step['memory']:
-                        history_memory += f"    ({i}). {step['memory']}\n"
-            if history_context:
-                history_context = history_context.rstrip('\n')
-            if history_memory:
-                history_memory = history_memory.rstrip('\n')
-            
-            planning_prompt = f"""You are a task-planning agent in a GUI intelligent system. Your task is to formulate the next action plan based on the given user task by analyzing the historical trajectory, the current screenshot, and possible task history memory, while referring to the reflection suggestions from the previous step. Please ensure that you output only one action plan and strictly adhere to the format requirements.
+            messages = self._build_planning_messages(image_path, reflection_content)
+            logger.info(f"Planning agent analyzing: {image_path}")
+            response = get_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
+            return self._handle_planning_response(response)
+                
+        except Exception as e:
+            logger.error(f"Error in planning agent: {str(e)}")
+            return None, f"Planning error: {str(e)}"
+
+    async def aplan_next_action(self, image_path, reflection_content = None):
+        """Async variant of plan_next_action"""
+        try:
+            messages = self._build_planning_messages(image_path, reflection_content)
+            logger.info(f"Planning agent analyzing: {image_path}")
+            response = await aget_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
+            return self._handle_planning_response(response)
+
+        except Exception as e:
+            logger.error(f"Error in planning agent: {str(e)}")
+            return None, f"Planning error: {str(e)}"
+
+    def _build_planning_messages(self, image_path, reflection_content=None):
+        """Build the planning request for the current screen"""
+        # Read and encode image
+        image = encode_image(image_path, self.image_preprocess)
+        img_width, img_height = image.width, image.height
+        
+        # Build history context 
+        history_context = '\n'.join(self.history_window.lines(
+            [f"Action: {step['action']}; Action description: {step['action_description']}" for step in self.execution_history]
+        ))
+        history_memory = '\n'.join(self.memory_window.lines(
+            [step['memory'] for step in self.execution_history], fmt='    ({index}). {content}'
+        ))
+        
+        # the task and the append-only history go ahead of the screenshot so consecutive steps share the
+        # prompt prefix; the reflection changes every step and follows the screenshot
+        planning_prompt = f"""You are a task-planning agent in a GUI intelligent system. Your task is to formulate the next action plan based on the given user task by analyzing the historical trajectory, the current screenshot, and possible task history memory, while referring to the reflection suggestions from the previous step. Please ensure that you output only one action plan and strictly adhere to the format requirements.
 
 ### Background Information 
 1. The user query: {self.task}
-2. Last step reflection: {reflection_content if reflection_content else '[no reflection available]'}
-3. Task progress: The executor has done the following operation on the current device
+2. Task progress: The executor has done the following operation on the current device
 {history_context if history_context else '[First step and no prior actions taken.]'}
-4. Task history memory:
-{history_memory if history_memory else 'Empty, ignore it'}
+3. Task history memory:
+{history_memory if history_memory else 'Empty, ignore it'}"""
+
+        planning_step = f"""4. Last step reflection: {reflection_content if reflection_content else '[no reflection available]'}
 
 ### Instructions
 1. Based on the above information, please analyze the current screen and formulate the next action plan to complete the user task.
@@ -119,42 +147,31 @@ class PlannerAgent:
 [Use one sentence to describe the next action to be performed, including the key text information required to carry out this step.]
 </action_plan>"""
 
-            messages = [
-                {
-                    "role": "system",
-                    "content": [
-                        {"type": "text", "text": "You are an expert mobile GUI automation planner. Analyze screenshots and create strategic action plans."}
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": planning_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{encoded_string}"}}
-                    ]
-                }
-            ]
-            
-            logger.info(f"Planning agent analyzing: {image_path}")
-            response = get_response(
-                model=self.model,
-                messages=messages,
-                api_key=self.api_key,
-                base_url=self.base_url,
-                temperature=self.temperature
-            )
-            
-            if response:
-                logger.info(f"Planning agent raw response: {response}")
-                parsed_planning, error = self._parse_planning_response(response)
-                logger.info(f"Planning agent response: {parsed_planning}")
-                return parsed_planning, error
-            else:
-                return None, "Failed to generate plan"
-                
-        except Exception as e:
-            logger.error(f"Error in planning agent: {str(e)}")
-            return None, f"Planning error: {str(e)}"
+        messages = [
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": "You are an expert mobile GUI automation planner. Analyze screenshots and create strategic action plans."}
+                ]
+            },
+            {
+                "role": "user",
+                "content": user_content(planning_prompt, image.data_url, planning_step)
+            }
+        ]
+        self.prefix_tracker.observe(messages)
+        
+        return messages
+
+    def _handle_planning_response(self, response):
+        """Parse the raw planning response"""
+        if response:
+            logger.info(f"Planning agent raw response: {response}")
+            parsed_planning, error = self._parse_planning_response(response)
+            logger.info(f"Planning agent response: {parsed_planning}")
+            return parsed_planning, error
+        else:
+            return None, "Failed to generate plan"
     
     def _parse_planning_response(self, response):
         """Parse the planning response into structured components"""
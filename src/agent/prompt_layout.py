@@ -0,0 +1,98 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prompt layout that keeps the request prefix byte-stable from step to step.
+
+Servers with automatic prefix caching (vLLM, SGLang) skip the prefill of the
+longest prefix a request shares with an earlier one. Agent requests are laid
+out for that:
+
+    system prompt -> task and fixed instructions -> append-only history
+    -> screenshot -> per-step text (plan, reflection, response format)
+
+The text before the first image is the cacheable segment (`user_content`'s
+`prefix`); per-step text goes into the `suffix` after the screenshot. Step t+1
+then resends step t's cacheable segment unchanged plus the new history line.
+PrefixTracker measures how much of each request's cacheable segment the
+agent's previous request already sent.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _text_parts(texts):
+    if isinstance(texts, str):
+        texts = [texts]
+    return [{"type": "text", "text": text} for text in texts or [] if text]
+
+
+def user_content(prefix, image_url, suffix=None):
+    """
+    Content of a user message: cacheable text, then the screenshot, then the per-step text.
+    :param prefix: text (or list of text parts) that only grows from step to step
+    :param suffix: text (or list of text parts) that changes every step
+    """
+    return _text_parts(prefix) + [{"type": "image_url", "image_url": {"url": image_url}}] + _text_parts(suffix)
+
+
+def cacheable_prefix(messages):
+    """Text of `messages` up to the first image, with role markers: the part that can repeat across steps."""
+    parts = []
+    for message in messages:
+        parts.append(f"<|{message['role']}|>")
+        content = message['content']
+        if isinstance(content, str):
+            parts.append(content)
+            continue
+        for part in content:
+            if part.get('type', 'text') != 'text':
+                return ''.join(parts)
+            parts.append(part.get('text', ''))
+    return ''.join(parts)
+
+
+class PrefixTracker:
+    """Counts how much of each request's cacheable prefix repeats the previous request of the same agent."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Start a new episode (call from set_task)."""
+        self.previous = None
+        self.requests = 0
+        self.prefix_chars = 0
+        self.reused_chars = 0
+
+    def observe(self, messages):
+        prefix = cacheable_prefix(messages)
+        reused = len(os.path.commonprefix([prefix, self.previous])) if self.previous is not None else 0
+        self.previous = prefix
+        self.requests += 1
+        self.prefix_chars += len(prefix)
+        self.reused_chars += reused
+        logger.debug(f"Prompt prefix: {len(prefix)} chars, {reused} reused from the previous step")
+        return reused
+
+    def report(self):
+        return {
+            'requests': self.requests,
+            'prefix_chars': self.prefix_chars,
+            'reused_chars': self.reused_chars,
+            'reuse_ratio': self.reused_chars / self.prefix_chars if self.prefix_chars else 0.0,
+        }
@@ -20,33 +20,20 @@ import time
 from PIL import Image
 import logging
 import re
+from src.agent.client_pool import get_client
+from src.agent.transport import chat_completion
+from src.response_cache import cached_response
+from src.agent.image_cache import encode_image, ImagePreprocess
+from src.agent.async_client import aget_response
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 5
 
+@cached_response(max_tokens=1024)
 def get_response(model, messages, api_key, base_url, temperature=0.1):
     """Get response from LLM with retry mechanism"""
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    retries = 0
-    retry_delay = 2
-    
-    while retries <= MAX_RETRIES:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-            ).choices[0].message.content.strip()
-            return response
-        except Exception as e:
-            logger.warning(f"Request failed, retrying... Error: {str(e)}")
-            retries += 1
-            time.sleep(retry_delay)
-    
-    logger.error("Request failed after multiple retries.")
-    return None
+    client = get_client(api_key=api_key, base_url=base_url)
+    return chat_completion(client, model, messages, endpoint=base_url, temperature=temperature, max_tokens=1024)
 
 class ReflectorAgent:
     """Reflection Agent responsible for analyzing action results and providing feedback"""
@@ -56,6 +43,7 @@ class ReflectorAgent:
         self.model = agent_config['model']
         self.api_key = agent_config['api_key']
         self.base_url = agent_config['base_url']
+        self.image_preprocess = ImagePreprocess.from_config(agent_config.get('image_preprocess'))
         self.temperature = agent_config.get('temperature', 0.1)
         self.task = None
         self.reflection_history = []
@@ -77,31 +65,64 @@ class ReflectorAgent:
     def reflect_on_action(self, current_image_path, pre_image_path, action_plan, action, action_description):
         """Reflect on the executed action and its results"""
         try:
-            # Read and encode current image
-            with open(current_image_path, "rb") as image_file:
-                cur_encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-            # Read and encode previous image if available
-            with Image.open(pre_image_path) as img:
-                pre_img_width, pre_img_height = img.size
-            with open(pre_image_path, "rb") as image_file:
-                pre_encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+            messages = self._build_reflection_messages(current_image_path, pre_image_path, action_plan, action, action_description)
+            logger.info(f"Reflection agent analyzing: {pre_image_path} and {current_image_path}")
+            response = get_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
+            
+            return self._handle_reflection_response(response)
+                
+        except Exception as e:
+            logger.error(f"Error in reflection agent: {str(e)}")
+            return None, f"Reflection error: {str(e)}"
+    
+    async def areflect_on_action(self, current_image_path, pre_image_path, action_plan, action, action_description):
+        """Async variant of reflect_on_action"""
+        try:
+            messages = self._build_reflection_messages(current_image_path, pre_image_path, action_plan, action, action_description)
+            logger.info(f"Reflection agent analyzing: {pre_image_path} and {current_image_path}")
+            response = await aget_response(
+                model=self.model,
+                messages=messages,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                temperature=self.temperature
+            )
             
-            # Build reflection history context 
-            # history_context = ""
-            # if self.execution_history:
-            #     history_context = "Previous execution history:\n"
-            #     for i, step in enumerate(self.execution_history, 1):
-            #         history_context += f"Step {i}: {step['action_description']}\n"
-            #         if step['result']:
-            #             history_context += f"Result: {step['result']}\n"
-            # if self.reflection_history:
-            #     history_context += "Previous reflection history:\n"
-            #     for i, reflection in enumerate(self.reflection_history, 1):
-            #         history_context += f"Step {i} Reflection: {reflection.get('success_evaluation', 'N/A')}\n"
-            #         history_context += f"Progress: {reflection.get('progress_assessment', 'N/A')}\n"
-           
-            # Build reflection prompt
-            reflection_prompt_before = f"""You are a reflective agent in a GUI intelligent system. Given the user query, the previous step's task plan and action, as well as the screenshots before and after the actions, you need to analyze whether any errors occurred in this step from three aspects: task objective, task planning, and task execution. If errors are found, you need to provide improvement suggestions for both the task planning and task execution.  Please ensure that your output strictly adheres to the format requirements.
+            return self._handle_reflection_response(response)
+
+        except Exception as e:
+            logger.error(f"Error in reflection agent: {str(e)}")
+            return None, f"Reflection error: {str(e)}"
+    
+    def _build_reflection_messages(self, current_image_path, pre_image_path, action_plan, action, action_description):
+        """Build the reflection request from the screens before and after the action"""
+        # Read and encode current and previous images
+        cur_image = encode_image(current_image_path, self.image_preprocess)
+        pre_image = encode_image(pre_image_path, self.image_preprocess)
+        pre_img_width, pre_img_height = pre_image.width, pre_image.height
+        
+        # Build reflection history context 
+        # history_context = ""
+        # if self.execution_history:
+        #     history_context = "Previous execution history:\n"
+        #     for i, step in enumerate(self.execution_history, 1):
+        #         history_context += f"Step {i}: {step['action_description']}\n"
+        #         if step['result']:
+        #             history_context += f"Result: {step['result']}\n"
+        # if self.reflection_history:
+        #     history_context += "Previous reflection history:\n"
+        #     for i, reflection in enumerate(self.reflection_history, 1):
+        #         history_context += f"Step {i} Reflection: {reflection.get('success_evaluation', 'N/A')}\n"
+        #         history_context += f"Progress: {reflection.get('progress_assessment', 'N/A')}\n"
+       
+        # Build reflection prompt
+        reflection_prompt_before = f"""You are a reflective agent in a GUI intelligent system. Given the user query, the previous step's task plan and action, as well as the screenshots before and after the actions, you need to analyze whether any errors occurred in this step from three aspects: task objective, task planning, and task execution. If errors are found, you need to provide improvement suggestions for both the task planning and task execution.  Please ensure that your output strictly adheres to the format requirements.
 
 ### Background
 The user query: {self.task}
@@ -110,7 +131,7 @@ Action execution: {action} - {action_description}
 Previous Screen resolution: {pre_img_width}x{pre_img_height}
 The changes between the two screenshots should correspond to the given plan and action. Otherwise, it indicates an error and you should analyze the cause and propose solutions in reflection. The previous screen and current screen are as follows:"""
 
-            reflection_prompt_after = f"""
+        reflection_prompt_after = f"""
 ### Response Format
 <reasoning>
 [Provide a brief analysis of the action result, including any errors found and their possible causes (max 100 words)]
@@ -122,46 +143,38 @@ The changes between the two screenshots should correspond to the given plan and
 [If execution errors were found, provide improvement suggestions for the task execution (max 50 words). If no errors, state "No issues found in execution."]
 </execution_reflection>"""
 
-            messages = [
-                {
-                    "role": "system",
-                    "content": [
-                        {"type": "text", "text": "You are an expert mobile GUI automation analyst. Analyze action results and reflect separately on task planning and task execution."}
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": reflection_prompt_before},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{pre_encoded_string}"}},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{cur_encoded_string}"}},
-                        {"type": "text", "text": reflection_prompt_after}
-                    ]
-                }
-            ]
-            
-            logger.info(f"Reflection agent analyzing: {pre_image_path} and {current_image_path}")
-            logger.info(f"Reflection agent prompt:\nYou are an expert mobile GUI automation analyst. Analyze action results and provide constructive feedback for improvement.\n{reflection_prompt_before}...[images]...{reflection_prompt_after}")
-            response = get_response(
-                model=self.model,
-                messages=messages,
-                api_key=self.api_key,
-                base_url=self.base_url,
-                temperature=self.temperature
-            )
-            
-            if response:
-                logger.info(f"Reflection agent raw response: {response}")
-                parsed_reflection, error = self._parse_reflection_response(response)
-                logger.info(f"Reflection agent response: {parsed_reflection}")
-                return parsed_reflection, error
-            else:
-                return None, "Failed to generate reflection"
-                
-        except Exception as e:
-            logger.error(f"Error in reflection agent: {str(e)}")
-            return None, f"Reflection error: {str(e)}"
-    
+        messages = [
+            {
+                "role": "system",
+                "content": [
+                    {"type": "text", "text": "You are an expert mobile GUI automation analyst. Analyze action results and reflect separately on task planning and task execution."}
+                ]
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": reflection_prompt_before},
+                    {"type": "image_url", "image_url": {"url": pre_image.data_url}},
+                    {"type": "image_url", "image_url": {"url": cur_image.data_url}},
+                    {"type": "text", "text": reflection_prompt_after}
+                ]
+            }
+        ]
+
+        logger.info(f"Reflection agent prompt:\nYou are an expert mobile GUI automation analyst. Analyze action results and provide constructive feedback for improvement.\n{reflection_prompt_before}...[images]...{reflection_prompt_after}")
+
+        return messages
+
+    def _handle_reflection_response(self, response):
+        """Parse the raw reflection response"""
+        if response:
+            logger.info(f"Reflection agent raw response: {response}")
+            parsed_reflection, error = self._parse_reflection_response(response)
+            logger.info(f"Reflection agent response: {parsed_reflection}")
+            return parsed_reflection, error
+        else:
+            return None, "Failed to generate reflection"
+
     def _parse_reflection_response(self, response):
         """Parse the reflection response into structured components"""
         try:
@@ -0,0 +1,98 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Registry of agent backends, resolved lazily.
+
+Entry points used to import every agent module up front, so each evaluation
+process paid for backends it never ran (and their SDKs, e.g. zai for the GLM
+API agent). Backends are registered here as "module:Class" strings and only
+the selected one is imported.
+"""
+
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# --model of run_colorbench.py, matched by substring in this order (first match wins)
+MODEL_BACKENDS = [
+    ('scripted-milestone', 'src.agent.scripted_agent:MilestoneAgent'),
+    ('scripted-random', 'src.agent.scripted_agent:RandomWalkAgent'),
+    ('qwen3', 'src.agent.agent_qwen3:Qwen3Agent'),
+    ('qwen', 'src.agent.agent:VanillaAgent'),
+    ('owl', 'src.agent.agent:VanillaAgent'),
+    ('atlas', 'src.agent.agent_atlas:AtlasAgent'),
+    ('tars_dpo', 'src.agent.agent_tars_dpo:TarsDPOAgent'),
+    ('tars', 'src.agent.agent_tars:TarsAgent'),
+    ('api', 'src.agent.agent_api:APIAgent'),
+]
+
+# agent modes of the multi-agent runners, matched exactly
+MODE_BACKENDS = {
+    'plan-reflect': 'src.agent.plan_reflect_agent:PlanReflectAgent',
+    'scripted-milestone': 'src.agent.scripted_agent:MilestoneAgent',
+    'scripted-random': 'src.agent.scripted_agent:RandomWalkAgent',
+}
+
+_classes = {}
+_lock = threading.Lock()
+
+
+def register_model(pattern, target, first=False):
+    """Register a backend for --model values containing `pattern`; `first` puts it ahead of the built-in ones."""
+    if first:
+        MODEL_BACKENDS.insert(0, (pattern, target))
+    else:
+        MODEL_BACKENDS.append((pattern, target))
+
+
+def load_backend(target):
+    """Import "module:Class" once and return the class."""
+    cls = _classes.get(target)
+    if cls is None:
+        with _lock:
+            cls = _classes.get(target)
+            if cls is None:
+                module_name, class_name = target.split(':')
+                cls = getattr(importlib.import_module(module_name), class_name)
+                _classes[target] = cls
+                logger.info(f"Loaded agent backend {target}")
+    return cls
+
+
+def model_backend(model):
+    """"module:Class" of the agent for a --model value."""
+    for pattern, target in MODEL_BACKENDS:
+        if pattern in model:
+            return target
+    # use your own agent: register_model('my_model', 'my.module:MyAgent')
+    raise ValueError(f"Unsupported agent model: {model}")
+
+
+def create_agent(model, agent_config, api=None):
+    """Instantiate the agent selected by --model; the API agent takes the --api model name next to the config."""
+    target = model_backend(model)
+    cls = load_backend(target)
+    if target.endswith(':APIAgent'):
+        return cls(model=api, agent_config=agent_config)
+    return cls(agent_config)
+
+
+def create_mode_agent(mode, agent_configs):
+    """Instantiate the agent of a multi-agent mode from agent_configs[mode]."""
+    if mode not in MODE_BACKENDS:
+        raise ValueError(f"Unsupported mode: {mode}")
+    return load_backend(MODE_BACKENDS[mode])(agent_configs[mode])
@@ -0,0 +1,225 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Scripted policy agents that act on the graph without a model.
+
+They plug into the runners like any agent backend (run_colorbench.py
+--model scripted-milestone, run_colorbench_multi_agent.py --mode
+scripted-random), so the harness itself (graph stepping, trajectories,
+scoring, threading) can be benchmarked and regression-tested without a VLM
+endpoint or the screenshot folder. The current node is the file name of the
+image path the runner passes to agent_step.
+
+- MilestoneAgent replays a shortest path through the task's milestones in
+  tasks.json: at every step it takes the outgoing edge whose target is
+  closest to the next milestone page, pressing home when the milestone is
+  only reachable from the home page, and completes after the last milestone.
+- RandomWalkAgent follows a random outgoing edge (seeded per task) for up to
+  `max_walk` steps and completes at a dead end.
+
+Config keys (all optional): graph_file, tasks_file, root_node (default: the
+node with the most `open` edges), seed, max_walk.
+"""
+
+import os
+import json
+import random
+import logging
+import threading
+from collections import deque
+
+from src.test.graph_index import load_compiled_graph
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRAPH_FILE = './data/graph.json'
+DEFAULT_TASKS_FILE = './data/tasks.json'
+
+_tasks_cache = {}
+_routes_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_tasks(tasks_file):
+    """Map query -> task item of `tasks_file`, loaded once per process."""
+    key = os.path.abspath(tasks_file)
+    with _cache_lock:
+        tasks = _tasks_cache.get(key)
+        if tasks is None:
+            with open(tasks_file, 'r', encoding='utf-8') as f:
+                tasks = {item['query']: item for item in json.load(f)}
+            _tasks_cache[key] = tasks
+    return tasks
+
+
+class GraphRoutes:
+    """Reverse edges of a graph and shortest-path distances to target node sets, shared by every agent of a process."""
+
+    def __init__(self, graph_data):
+        self.graph_data = graph_data
+        self.reverse = {}
+        open_edges = {}
+        for source in graph_data:
+            for target, actions in graph_data[source].items():
+                if not actions:
+                    continue
+                self.reverse.setdefault(target, []).append(source)
+                if any(action.get('action_type') == 'open' for action in actions):
+                    open_edges[source] = open_edges.get(source, 0) + 1
+        self.home_page = max(open_edges, key=open_edges.get) if open_edges else None
+        self._distances = {}
+        self._lock = threading.Lock()
+
+    def distances(self, targets):
+        """Steps from every node that can reach `targets` to the nearest of them (BFS over the reverse edges)."""
+        key = frozenset(targets)
+        distances = self._distances.get(key)
+        if distances is None:
+            distances = {node: 0 for node in key}
+            queue = deque(key)
+            while queue:
+                node = queue.popleft()
+                for source in self.reverse.get(node, ()):
+                    if source not in distances:
+                        distances[source] = distances[node] + 1
+                        queue.append(source)
+            with self._lock:
+                distances = self._distances.setdefault(key, distances)
+        return distances
+
+
+def load_routes(graph_file):
+    key = os.path.abspath(graph_file)
+    with _cache_lock:
+        routes = _routes_cache.get(key)
+        if routes is None:
+            routes = GraphRoutes(load_compiled_graph(graph_file).graph_data)
+            _routes_cache[key] = routes
+    return routes
+
+
+def edge_action(action):
+    """Agent action that Graph_DataSet.step matches against the recorded edge `action`."""
+    action_type = action.get('action_type', '').lower()
+    if action_type == 'open':
+        return {'action_type': 'open', 'app': action.get('app', '')}
+    if action_type in ('click', 'long_press'):
+        # the graph matches a recorded bbox before the recorded point
+        if action.get('bbox'):
+            x1, y1, x2, y2 = [int(v) for v in action['bbox']]
+            return {'action_type': action_type, 'x': (x1 + x2) // 2, 'y': (y1 + y2) // 2}
+        return {'action_type': action_type, 'x': action['x'], 'y': action['y']}
+    if action_type == 'swipe':
+        return {'action_type': 'swipe', 'direction': action.get('direction')}
+    if action_type == 'type':
+        return {'action_type': 'type', 'text': action.get('text', '')}
+    return {'action_type': action_type}
+
+
+def pick_action(actions):
+    """First recorded action of an edge, preferring anything over wait (wait matches every wait edge of the node)."""
+    for action in actions:
+        if action.get('action_type') != 'wait':
+            return edge_action(action)
+    return edge_action(actions[0])
+
+
+class ScriptedAgent:
+    def __init__(self, agent_config):
+        self.agent_config = agent_config
+        self.graph_file = agent_config.get('graph_file', DEFAULT_GRAPH_FILE)
+        self.routes = load_routes(self.graph_file)
+        self.home_page = agent_config.get('root_node') or self.routes.home_page
+        self.seed = agent_config.get('seed', 42)
+        self.task = None
+        self.history = []
+
+    def set_task(self, task):
+        self.task = task
+        self.history = []
+
+    def _record(self, action, action_description):
+        self.history.append(f'action:{action}, action_description:{action_description}')
+        return action, action_description
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MilestoneAgent(ScriptedAgent):
+    def __init__(self, agent_config):
+        super().__init__(agent_config)
+        self.tasks = load_tasks(agent_config.get('tasks_file', DEFAULT_TASKS_FILE))
+        self.milestones = []
+        self.answer = None
+        self.progress = 0
+
+    def set_task(self, task):
+        super().set_task(task)
+        item = self.tasks.get(task)
+        if item is None:
+            logger.warning(f"任务不在任务文件中，无法回放: {task}")
+        milestones = item['milestone'] if item else []
+        self.milestones = [set(milestone['page_node']) for milestone in milestones if milestone.get('page_node')]
+        answers = [text for milestone in milestones for text in milestone.get('answer', [])]
+        self.answer = ', '.join(answers) if answers else None
+        self.progress = 0
+
+    def agent_step(self, image_path):
+        node = os.path.basename(image_path)
+        while self.progress < len(self.milestones) and node in self.milestones[self.progress]:
+            self.progress += 1
+        if self.progress == len(self.milestones):
+            action = {'action_type': 'complete', 'status': 'success'}
+            if self.answer:
+                action['text'] = self.answer
+            return self._record(action, 'All milestones reached')
+
+        distances = self.routes.distances(self.milestones[self.progress])
+        distance = distances.get(node)
+        home_distance = distances.get(self.home_page)
+        if node != self.home_page and home_distance is not None and (distance is None or home_distance + 1 < distance):
+            return self._record({'action_type': 'system_button', 'button': 'home'},
+                                f'Go home towards milestone {self.progress + 1}')
+        if distance is None:
+            logger.warning(f"Milestone {self.progress + 1} is unreachable from {node}")
+            return self._record({'action_type': 'complete', 'status': 'failure'},
+                                f'Milestone {self.progress + 1} is unreachable')
+
+        for target, actions in self.routes.graph_data[node].items():
+            if actions and distances.get(target) == distance - 1:
+                return self._record(pick_action(actions), f'Move to {target} ({distance - 1} steps to milestone {self.progress + 1})')
+
+
+class RandomWalkAgent(ScriptedAgent):
+    def __init__(self, agent_config):
+        super().__init__(agent_config)
+        self.max_walk = agent_config.get('max_walk', 20)
+        self.rng = random.Random(self.seed)
+
+    def set_task(self, task):
+        super().set_task(task)
+        self.rng.seed(f'{self.seed}_{task}')
+
+    def agent_step(self, image_path):
+        node = os.path.basename(image_path)
+        edges = [(target, actions) for target, actions in self.routes.graph_data[node].items() if actions] if node in self.routes.graph_data else []
+        if not edges or len(self.history) >= self.max_walk:
+            return self._record({'action_type': 'complete', 'status': 'success'}, f'Random walk stopped at {node}')
+        target, actions = edges[self.rng.randrange(len(edges))]
+        return self._record(pick_action(actions), f'Random move to {target}')
@@ -14,13 +14,9 @@
 
 import threading
 import logging
-from src.agent.planner_agent import PlannerAgent
-from src.agent.executor_agent import ExecutorAgent
-from src.agent.reflector_agent import ReflectorAgent
-from src.agent.plan_reflect_agent import PlanReflectAgent
-from src.agent.agent import VanillaAgent
-from src.agent.memory_agent import MemoryAgent
+from src.agent.registry import create_mode_agent
 from src.test.graph_tools_ma import Graph_DataSet
+from src.test.graph_index import load_compiled_graph
 
 logger = logging.getLogger(__name__)
 
@@ -53,10 +49,7 @@ class ThreadSafeAgentFactory:
         if agent_key not in self._local.agents:
             logger.info(f"Creating new agent instance for thread {thread_id}, mode: {mode}")
             
-            if mode == 'plan-reflect':
-                agent = PlanReflectAgent(self.agent_configs['plan-reflect'])
-            else:
-                raise ValueError(f"Unsupported mode: {mode}")
+            agent = create_mode_agent(mode, self.agent_configs)
             
             self._local.agents[agent_key] = agent
         
@@ -65,11 +58,14 @@ class ThreadSafeAgentFactory:
     def clear_thread_agents(self):
         """清理当前线程的智能体实例"""
         if hasattr(self._local, 'agents'):
+            for agent in self._local.agents.values():
+                if hasattr(agent, 'close'):
+                    agent.close()
             self._local.agents.clear()
             logger.info(f"Cleared agents for thread {threading.current_thread().ident}")
 
 class ThreadSafeGraphDataSet:
-    """线程安全的图数据集类"""
+    """线程安全的图数据集类：图只加载一次并在线程间只读共享，每个线程只持有自己的轨迹状态"""
     
     def __init__(self, graph_config):
         """
@@ -78,6 +74,8 @@ class ThreadSafeGraphDataSet:
         """
         self.graph_config = graph_config
         self._local = threading.local()
+        self.shared_graph = load_compiled_graph(graph_config['graph_file'])
+        logger.info(f"Loaded shared graph with {len(self.shared_graph)} nodes")
     
     def get_graph_dataset(self):
         """
@@ -88,8 +86,8 @@ class ThreadSafeGraphDataSet:
         thread_id = threading.current_thread().ident
         
         if not hasattr(self._local, 'graph_dataset'):
-            logger.info(f"Creating new Graph_DataSet instance for thread {thread_id}")
-            self._local.graph_dataset = Graph_DataSet(self.graph_config)
+            logger.info(f"Creating new Graph_DataSet episode state for thread {thread_id}")
+            self._local.graph_dataset = Graph_DataSet(self.graph_config, compiled_graph=self.shared_graph)
         
         return self._local.graph_dataset
     
@@ -102,16 +100,18 @@ class ThreadSafeGraphDataSet:
 class ThreadSafeTaskExecutor:
     """线程安全的任务执行器"""
     
-    def __init__(self, agent_factory, graph_factory, config):
+    def __init__(self, agent_factory, graph_factory, config, manifest=None):
         """
         初始化任务执行器
         :param agent_factory: 智能体工厂
         :param graph_factory: 图数据集工厂
         :param config: 配置
+        :param manifest: 运行清单 RunManifest（可选，用于断点续跑）
         """
         self.agent_factory = agent_factory
         self.graph_factory = graph_factory
         self.config = config
+        self.manifest = manifest
         self.lock = threading.Lock()
     
     def execute_task(self, task_item, mode, model_name, output_dir, parent_dir, config_name):
@@ -131,6 +131,8 @@ class ThreadSafeTaskExecutor:
         
         try:
             logger.info(f"Thread {thread_id}: Starting task {task_id}: {task}")
+            if self.manifest is not None:
+                self.manifest.mark_started(task_item)
             
             agent = self.agent_factory.get_agent(mode, model_name)
             graph_dataset = self.graph_factory.get_graph_dataset()
@@ -190,9 +192,13 @@ class ThreadSafeTaskExecutor:
             
             use_time = time.time() - start_time
             logger.info(f"Thread {thread_id}: Task {task_id} finished. Steps: {current_step}, Time: {use_time:.2f}s")
+            if mode == 'plan-reflect':
+                # the last step's memory may still be running in pipeline_memory mode
+                agent.flush()
+                graph_dataset.fill_step_info(agent.step_history)
             
             # Save trajectory
-            graph_dataset.save_trajectory(
+            trajectory_dir = graph_dataset.save_trajectory(
                 output_dir, 
                 use_time, 
                 save_image=True, 
@@ -201,14 +207,19 @@ class ThreadSafeTaskExecutor:
                 task_id=task_id
             )
             
-            return {
+            result = {
                 'task_id': task_id,
                 'task': task,
                 'success': complete and current_step < max_step,
                 'steps': current_step,
                 'time': use_time,
-                'thread_id': thread_id
+                'thread_id': thread_id,
+                'trajectory': trajectory_dir
             }
+            # only recorded once the trajectory is on disk, so a resumed run never skips a half-saved task
+            if self.manifest is not None:
+                self.manifest.mark_finished(task_item, trajectory=trajectory_dir, result=result)
+            return result
             
         except Exception as e:
             logger.error(f"Thread {thread_id}: Task {task_id} failed with error: {str(e)}")
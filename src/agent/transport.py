@@ -0,0 +1,263 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+One retry layer for every model request.
+
+The agents used to retry with a fixed `time.sleep(2)`, so threads that failed
+together retried together and hit the gateway in waves. Here a failed request
+is classified first:
+
+- rate_limit (429): retried after a full-jitter exponential backoff, never
+  sooner than the server's Retry-After
+- server (5xx), timeout, connection and unknown errors: retried after a
+  full-jitter exponential backoff
+- fatal (400/401/403/404/422, ...): not retried, the request cannot succeed
+
+Every request carries a timeout, and every endpoint has a retry budget: each
+request deposits `ratio` tokens, each retry withdraws one. When an endpoint is
+down the budget runs dry and requests fail fast instead of multiplying the load.
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = 'rate_limit'
+SERVER = 'server'
+TIMEOUT = 'timeout'
+CONNECTION = 'connection'
+FATAL = 'fatal'
+UNKNOWN = 'unknown'
+
+FATAL_STATUS = {400, 401, 403, 404, 405, 413, 422}
+
+
+class RetryPolicy(namedtuple('RetryPolicy', ['max_retries', 'base_delay', 'max_delay', 'timeout', 'budget_ratio', 'budget_reserve'])):
+    """
+    :param max_retries: retries after the first attempt
+    :param base_delay: backoff of the first retry in seconds (rate limits start at twice this)
+    :param max_delay: upper bound of one backoff
+    :param timeout: per-request timeout in seconds passed to the client (None: client default)
+    :param budget_ratio: retry tokens an endpoint earns per request (None: no budget)
+    :param budget_reserve: retry tokens an endpoint starts with, and the most it can hold
+    """
+
+    __slots__ = ()
+
+    def backoff(self, attempt, kind, retry_after=None):
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        base = self.base_delay * (2 if kind == RATE_LIMIT else 1)
+        delay = random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+DEFAULT_POLICY = RetryPolicy(max_retries=5, base_delay=1.0, max_delay=30.0, timeout=120.0, budget_ratio=0.2, budget_reserve=20)
+
+
+class RetryBudget:
+    """Token bucket of retries for one endpoint."""
+
+    def __init__(self, ratio, reserve):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.tokens + self.ratio, self.reserve)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_policy = DEFAULT_POLICY
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def set_retry_policy(policy):
+    """Install the policy used by every request of this process; resets the retry budgets."""
+    global _policy
+    _policy = policy
+    with _budgets_lock:
+        _budgets.clear()
+
+
+def get_retry_policy():
+    return _policy
+
+
+def get_retry_budget(endpoint, policy):
+    if policy.budget_ratio is None:
+        return None
+    budget = _budgets.get(endpoint)
+    if budget is None:
+        with _budgets_lock:
+            budget = _budgets.setdefault(endpoint, RetryBudget(policy.budget_ratio, policy.budget_reserve))
+    return budget
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error):
+    """Error class of a failed request (works for openai, zai, httpx and requests errors)."""
+    status = _status_code(error)
+    if status == 429:
+        return RATE_LIMIT
+    if status is not None and status >= 500:
+        return SERVER
+    if status in FATAL_STATUS:
+        return FATAL
+    name = type(error).__name__
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or 'Timeout' in name:
+        return TIMEOUT
+    if isinstance(error, ConnectionError) or 'Connection' in name or 'Connect' in name:
+        return CONNECTION
+    if 'RateLimit' in name:
+        return RATE_LIMIT
+    return UNKNOWN
+
+
+def retry_after(error):
+    """Seconds from the Retry-After header of a failed request, if the server sent one."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _next_delay(error, attempt, policy, budget, endpoint):
+    """Delay before the next attempt, or None when the request should not be retried."""
+    kind = classify_error(error)
+    if kind == FATAL:
+        logger.error(f"请求失败且不可重试 ({endpoint}): {error}")
+        return None
+    if attempt >= policy.max_retries:
+        logger.error(f"Request to {endpoint} failed after {attempt + 1} attempts: {error}")
+        return None
+    if budget is not None and not budget.withdraw():
+        logger.error(f"Retry budget of {endpoint} exhausted, failing fast: {error}")
+        return None
+    delay = policy.backoff(attempt, kind, retry_after(error) if kind == RATE_LIMIT else None)
+    logger.warning(f"请求失败({kind})，{delay:.1f}s 后重试 {attempt + 1}/{policy.max_retries} ({endpoint}): {error}")
+    return delay
+
+
+def call_with_retries(request, endpoint=None, policy=None):
+    """
+    Run `request(timeout)` until it succeeds; return its result, or None once the error
+    is fatal, the retries or the endpoint's retry budget are used up.
+    """
+    policy = policy or get_retry_policy()
+    budget = get_retry_budget(endpoint, policy)
+    attempt = 0
+    while True:
+        try:
+            result = request(policy.timeout)
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, budget, endpoint)
+            if delay is None:
+                return None
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if budget is not None:
+            budget.deposit()
+        return result
+
+
+async def acall_with_retries(request, endpoint=None, policy=None):
+    """Async call_with_retries: `request(timeout)` returns an awaitable."""
+    policy = policy or get_retry_policy()
+    budget = get_retry_budget(endpoint, policy)
+    attempt = 0
+    while True:
+        try:
+            result = await request(policy.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            delay = _next_delay(e, attempt, policy, budget, endpoint)
+            if delay is None:
+                return None
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        if budget is not None:
+            budget.deposit()
+        return result
+
+
+_request_handler = None
+
+
+def set_request_handler(handler):
+    """
+    Route every chat_completion of this process through
+    `handler(client, model, messages, endpoint=None, policy=None, **kwargs)`, e.g. to collect
+    requests into batches (run_colorbench_batch.py); None sends them directly again.
+    """
+    global _request_handler
+    _request_handler = handler
+
+
+def get_request_handler():
+    return _request_handler
+
+
+def send_chat_completion(client, model, messages, endpoint=None, policy=None, **kwargs):
+    """Text of `client.chat.completions.create(...)` with retries, or None when it failed."""
+    def request(timeout):
+        if timeout is not None:
+            kwargs.setdefault('timeout', timeout)
+        return client.chat.completions.create(model=model, messages=messages, **kwargs).choices[0].message.content.strip()
+    return call_with_retries(request, endpoint=endpoint, policy=policy)
+
+
+def chat_completion(client, model, messages, endpoint=None, policy=None, **kwargs):
+    """send_chat_completion, or the installed request handler's answer."""
+    handler = _request_handler
+    if handler is not None:
+        return handler(client, model, messages, endpoint=endpoint, policy=policy, **kwargs)
+    return send_chat_completion(client, model, messages, endpoint=endpoint, policy=policy, **kwargs)
@@ -0,0 +1,180 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Contiguous storage for the description embeddings of graph construction.
+
+Every ScreenShot used to keep its own embedding array. Here all of them live as
+rows of one float32 matrix that grows by doubling; a ScreenShot only keeps its
+row number. Rows are written once and never move, so `get` can hand out views.
+
+`EmbeddingIndex` is the per-graph nearest-node index used by
+Graph.find_similar_node. A node's text similarity is the mean cosine between
+the new description and the node's screenshot descriptions, which equals the
+dot product of the new unit embedding with the mean of the node's unit
+embeddings. The index keeps those means in one matrix, so all nodes are scored
+by one matrix-vector product (backend 'exact'), or a hnswlib HNSW graph over
+the means returns the top candidates in sublinear time (backend 'hnsw', needs
+`pip install hnswlib`).
+"""
+
+import logging
+import threading
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_BACKENDS = ('exact', 'hnsw')
+
+
+class EmbeddingStore:
+    """Append-only, row-packed float32 matrix of embeddings."""
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.size = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def add(self, vector):
+        """Append one embedding and return its row."""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((self.capacity, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                raise ValueError(f"Embedding dimension {vector.shape[0]} does not match store dimension {self._matrix.shape[1]}")
+            elif self.size == self._matrix.shape[0]:
+                grown = np.empty((2 * self._matrix.shape[0], self._matrix.shape[1]), dtype=np.float32)
+                grown[:self.size] = self._matrix[:self.size]
+                self._matrix = grown
+            row = self.size
+            self._matrix[row] = vector
+            self.size += 1
+        return row
+
+    def get(self, row):
+        return self._matrix[row]
+
+    def take(self, rows):
+        """Embeddings of `rows` as one (len(rows), dim) matrix."""
+        return self._matrix[np.asarray(rows, dtype=np.int64)]
+
+    @property
+    def matrix(self):
+        return self._matrix[:self.size] if self._matrix is not None else np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        return self.size * self._matrix.shape[1] * self._matrix.itemsize if self._matrix is not None else 0
+
+
+def normalize_rows(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingIndex:
+    """
+    Mean unit description embedding per node, packed into one growable matrix.
+    Not thread-safe: a graph is built by one thread.
+    """
+
+    def __init__(self, backend='exact', candidates=32, ef=64, capacity=256):
+        """
+        :param backend: 'exact' (one matrix product over all nodes) or 'hnsw' (approximate top-k, needs hnswlib)
+        :param candidates: nodes returned by the hnsw backend per query
+        """
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unsupported index backend: {backend}, expected one of {INDEX_BACKENDS}")
+        if backend == 'hnsw' and hnswlib is None:
+            logger.warning("hnswlib is not installed, falling back to the exact embedding index")
+            backend = 'exact'
+        self.backend = backend
+        self.candidates = candidates
+        self.ef = ef
+        self.capacity = capacity
+        self.node_ids = []
+        self.positions = {}
+        self._sums = None
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        self._hnsw = None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def add(self, node_id, embeddings):
+        """Add the description embeddings of new screenshots of `node_id` (a new or an existing node)."""
+        unit = normalize_rows(embeddings)
+        if self._sums is None:
+            self._sums = np.zeros((self.capacity, unit.shape[1]), dtype=np.float32)
+        position = self.positions.get(node_id)
+        if position is None:
+            position = len(self.node_ids)
+            if position == self._sums.shape[0]:
+                self._grow()
+            self.positions[node_id] = position
+            self.node_ids.append(node_id)
+        self._sums[position] += unit.sum(axis=0)
+        self._counts[position] += unit.shape[0]
+        if self.backend == 'hnsw':
+            self._hnsw_update(position)
+
+    def _grow(self):
+        size = 2 * self._sums.shape[0]
+        sums = np.zeros((size, self._sums.shape[1]), dtype=np.float32)
+        sums[:len(self.node_ids)] = self._sums[:len(self.node_ids)]
+        counts = np.zeros(size, dtype=np.int64)
+        counts[:len(self.node_ids)] = self._counts[:len(self.node_ids)]
+        self._sums, self._counts = sums, counts
+        if self._hnsw is not None:
+            self._hnsw.resize_index(size)
+
+    def _hnsw_update(self, position):
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space='ip', dim=self._sums.shape[1])
+            self._hnsw.init_index(max_elements=self._sums.shape[0], ef_construction=200, M=16)
+            self._hnsw.set_ef(self.ef)
+        # re-adding an existing label replaces its vector
+        self._hnsw.add_items(self._means(np.array([position])), np.array([position]))
+
+    def _means(self, positions):
+        return self._sums[positions] / self._counts[positions][:, None]
+
+    def similarities(self, embedding):
+        """Return {node_id: mean cosine similarity} for every node (exact) or the top candidates (hnsw)."""
+        if not self.node_ids:
+            return {}
+        query = normalize_rows(embedding)[0]
+        positions = np.arange(len(self.node_ids))
+        if self.backend == 'hnsw' and len(self.node_ids) > self.candidates:
+            labels, _ = self._hnsw.knn_query(query, k=self.candidates)
+            positions = labels[0].astype(np.int64)
+        # candidates are re-scored exactly, hnsw only decides which nodes are looked at
+        scores = self._means(positions) @ query
+        return {self.node_ids[position]: float(score) for position, score in zip(positions, scores)}
+
+
+_embedding_store = EmbeddingStore()
+
+
+def get_embedding_store():
+    """Process-wide store shared by every graph under construction."""
+    return _embedding_store
@@ -18,7 +18,6 @@ import base64
 import requests
 import logging
 import json
-import copy
 import random
 import threading
 import multiprocessing
@@ -26,7 +25,6 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import shutil
 
 from PIL import Image
-from FlagEmbedding import BGEM3FlagModel, FlagModel
 logger = logging.getLogger(__name__)
 from pathlib import Path
 
@@ -35,17 +33,30 @@ from datetime import datetime
 
 
 from src.utils import LLMClient
+from src.agent.image_cache import encode_image
+from src.graph_construction.embedding_store import get_embedding_store, EmbeddingIndex
+from src.graph_construction.image_hash import dhash, hamming_distances
+from src.graph_construction.model_provider import get_embedding_model, get_vlm_client, embedding_model_path
 from dotenv import load_dotenv
 load_dotenv()
 
-model = FlagModel( "path/to/your/bge-m3-model", query_instruction_for_retrieval="为这个句子生成表示以用于检索相关文章：", use_fp16=True)   
-logger.info(f"Model loaded Successfully!")
-agent = LLMClient()
 use_threading = False
 
 nodes_save_path = './data/results/nodes/' 
 
+
+def embeddings_path(graph_path):
+    """Sidecar .npy next to a saved graph holding one description embedding per screenshot, in node order."""
+    stem = str(graph_path)
+    for ext in ('.gz', '.json'):
+        if stem.endswith(ext):
+            stem = stem[:-len(ext)]
+    return f'{stem}.embeddings.npy'
+
+
 class ScreenNode:
+    __slots__ = ('node_id', 'screenlists', 'ui_element_edge_list', 'next_node_id_list', 'app')
+
     def __init__(self, data=None, node_id=-1, app=None):
         self.node_id = node_id  # -1 means not set yet
         self.screenlists : list[ScreenShot] = []  
@@ -53,7 +64,9 @@ class ScreenNode:
         self.next_node_id_list : set[str] = set()  
 
         if data is not None:
-            screenshot = ScreenShot(data['screenshot'], app=app)
+            # page_description / page_embedding are set when construct_graph.py precomputed them
+            screenshot = ScreenShot(data['screenshot'], description=data.get('page_description'), app=app,
+                                    embedding=data.get('page_embedding'))
             self.screenlists.append(screenshot)
             uielement = UIElementEdge(data)
             self.ui_element_edge_list.append(uielement)
@@ -71,41 +84,17 @@ class ScreenNode:
         }
         return node_info
 
-    def calculate_similarity(self, new_node, threshold=0.8):
-
-        text_similarity = self._calculate_node_similarity_by_text(new_node)
-        logger.info(f"Average text similarity with node{self.node_id}: {text_similarity}")
-        if text_similarity > 0.9:
-            return 1.0
-        if text_similarity > threshold:
-            vlm_similarity = self._calculate_node_similarity_by_vlm(new_node)
-            logger.info(f"Average VLM similarity with node{self.node_id}: {vlm_similarity}")
-            return 0.5*text_similarity + 0.5 * vlm_similarity
-        else:
-            return 0.0  # low text similarity, no need to calculate vlm
+    def image_distances(self, screenshot):
+        """Perceptual hash distance between `screenshot` and each screenshot of this node."""
+        return hamming_distances(screenshot.image_hash, [screen.image_hash for screen in self.screenlists])
 
-    def _calculate_node_similarity_by_text(self, new_node):
-        if len(self.screenlists) == 0:
-            return 0.0
-
-        if not isinstance(new_node, ScreenNode):
-            raise TypeError("new_node must be an instance of ScreenNode")
-        if self.app != new_node.app:
-            return 0.0
-        
-        new_embedding = new_node.screenlists[0].description_embedding
-        similarity = 0.0
-        # randomly select five screenshots to compare
-        if len(self.screenlists) > 5:
-            selected_screens = random.sample(self.screenlists, 5)
-        else:
-            selected_screens = self.screenlists
-        for screen in selected_screens:
-            similarity += self._calculate_description_similarity(new_embedding, screen.description_embedding)  
-        similarity /= len(selected_screens)  
-        return similarity
-
-    def _calculate_node_similarity_by_vlm(self, new_node):
+    def _calculate_node_similarity_by_vlm(self, new_node, required=None):
+        """
+        Share of up to three screenshots the VLM judges to be the same page state as new_node.
+        The screenshots closest to new_node by perceptual hash are compared first. With
+        `required`, comparisons stop as soon as the share is known to end above it or
+        can no longer exceed it.
+        """
         if len(self.screenlists) == 0:
             return 0.0
 
@@ -120,10 +109,11 @@ class ScreenNode:
         b_path = new_node.screenlists[0].screenshot_path
         similarity = 0.0
         if len(self.screenlists) > 3:
-            selected_screenshots = random.sample(self.screenlists, 3)
+            closest = np.argsort(self.image_distances(new_node.screenlists[0]), kind='stable')[:3]
+            selected_screenshots = [self.screenlists[i] for i in closest]
         else:
             selected_screenshots = self.screenlists
-        for screenshot in selected_screenshots:
+        for i, screenshot in enumerate(selected_screenshots):
             a_img = screenshot.base64_image
             messages=[system_prompt, {
                 "role": "user",
@@ -134,7 +124,7 @@ class ScreenNode:
                 ]
             }]
             
-            description = agent.get_response_vlm(messages, temperature=0.0).replace("\n\n","\n")
+            description = get_vlm_client().get_response_vlm(messages, temperature=0.0).replace("\n\n","\n")
             logger.info(f'比较{b_path}和{screenshot.screenshot_path}的相似度解释\n {description}')
             # parse response
             try:
@@ -142,20 +132,18 @@ class ScreenNode:
                     answer = description.split('原因')[0].strip()
                     if '不是' not in answer and '否' not in answer and "不属于" not in answer and "不同" not in answer:
                         similarity += 1.0
-                elif '不是' not in answer and '否' not in answer and "不属于" not in answer and "不同" not in answer:
+                elif '不是' not in description and '否' not in description and "不属于" not in description and "不同" not in description:
                     similarity += 1.0
             except Exception as e:
                 logger.info(f"Error parsing VLM response\n: {e}")
+            if required is not None:
+                remaining = len(selected_screenshots) - i - 1
+                if similarity / len(selected_screenshots) > required or (similarity + remaining) / len(selected_screenshots) <= required:
+                    break
         
         similarity /= len(selected_screenshots)
         return similarity
 
-    def _calculate_description_similarity(self, a_embedding, b_embedding):
-        sim = np.dot(a_embedding, b_embedding.T) 
-        sim = sim / (np.linalg.norm(a_embedding) * np.linalg.norm(b_embedding))
-        return sim
-
-
     def set_nodeid(self, node_id, merge=False):
         if self.node_id == -1:
             self.node_id = node_id
@@ -170,16 +158,39 @@ class ScreenNode:
 
 
 class ScreenShot:
-    def __init__(self, image_path, description=None, app=None):
+    """
+    One screenshot of a node. The image is referenced by path and encoded on
+    demand through the shared, size-bounded image cache; the description
+    embedding is a row of the process-wide EmbeddingStore.
+    """
+
+    __slots__ = ('screenshot_path', 'app', 'description', 'embedding_row', '_image_hash')
+
+    def __init__(self, image_path, description=None, app=None, embedding=None):
         self.screenshot_path = image_path
         self.app = app
-        with open(image_path, "rb") as img_file:
-            self.base64_image = base64.b64encode(img_file.read()).decode('utf-8')
+        self._image_hash = None
         if description:
             self.description =  description
         else:
             self.description =  self._generate_description_zh(self.base64_image)
-        self.description_embedding = model.encode(self.description)
+        if embedding is None or not description:
+            embedding = get_embedding_model().encode(self.description)
+        self.embedding_row = get_embedding_store().add(embedding)
+
+    @property
+    def base64_image(self):
+        return encode_image(self.screenshot_path).data
+
+    @property
+    def description_embedding(self):
+        return get_embedding_store().get(self.embedding_row)
+
+    @property
+    def image_hash(self):
+        if self._image_hash is None:
+            self._image_hash = dhash(self.screenshot_path)
+        return self._image_hash
     
     def save_screenshot(self, save_path):
         new_name_list = self.screenshot_path.split('/')
@@ -188,26 +199,7 @@ class ScreenShot:
             shutil.copy2(self.screenshot_path, os.path.join(save_path, new_name))  
 
     def _generate_description_zh(self, img):
-        messages = [{
-            "role": "system",
-            "content": [
-                {"type": "text","text": "你是一个GUI AGENT，请用一句话定义所给的手机截图是什么页面。并概括性的描述页面格式、页面作用等关键信息。你需要忽略截图中因时间和更新导致的变化，最终形成简短的中文文字描述。\n"},
-            ]
-        }]
-
-        messages.append({
-            "role": "user",
-            "content": [
-                {"type": "text","text": f"\n所在应用: {self.app}\n"},
-                {"type": "image_url","image_url": {"url": f"data:image/png;base64,{img}"}},
-                {"type": "text","text": "\n\n回答："},
-            ]
-        })
-
-        agent = LLMClient()
-        response = agent.get_response_vlm(messages)
-        logger.info(f"生成中文的页面描述: {response}")
-        return response
+        return generate_description_zh(img, self.app)
     
     def get_screenshot_info(self):
         return {
@@ -216,9 +208,75 @@ class ScreenShot:
         }
 
     def __repr__(self):
-        return f"ScreenShot({self.screenshot_id})"
+        return f"ScreenShot({self.screenshot_path})"
+
+
+def generate_description_zh(img, app=None):
+    """One-sentence Chinese description of a screenshot (base64) by the VLM."""
+    messages = [{
+        "role": "system",
+        "content": [
+            {"type": "text","text": "你是一个GUI AGENT，请用一句话定义所给的手机截图是什么页面。并概括性的描述页面格式、页面作用等关键信息。你需要忽略截图中因时间和更新导致的变化，最终形成简短的中文文字描述。\n"},
+        ]
+    }]
+
+    messages.append({
+        "role": "user",
+        "content": [
+            {"type": "text","text": f"\n所在应用: {app}\n"},
+            {"type": "image_url","image_url": {"url": f"data:image/png;base64,{img}"}},
+            {"type": "text","text": "\n\n回答："},
+        ]
+    })
+
+    response = get_vlm_client().get_response_vlm(messages)
+    logger.info(f"生成中文的页面描述: {response}")
+    return response
+
+
+def _describe_image_file(image_path, app=None):
+    # encode inside the worker so pending tasks do not hold every image in memory
+    return generate_description_zh(encode_image(image_path).data, app)
+
+
+def precompute_descriptions(image_paths, app=None, max_workers=8, batch_size=256):
+    """
+    Describe screenshots concurrently (at most max_workers VLM requests in flight) and
+    embed all descriptions with batched model.encode calls.
+    Returns {image_path: (description, embedding)}; screenshots whose description
+    failed are left out and described inline by ScreenShot later.
+    """
+    image_paths = list(dict.fromkeys(image_paths))
+    descriptions = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_describe_image_file, path, app): path
+            for path in image_paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                description = future.result()
+            except Exception as e:
+                logger.error(f"生成 {path} 的页面描述失败: {e}")
+                continue
+            if description:
+                descriptions[path] = description
+    logger.info(f"预生成页面描述 {len(descriptions)}/{len(image_paths)} 张截图")
+
+    paths = list(descriptions)
+    result = {}
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        embeddings = get_embedding_model().encode([descriptions[path] for path in batch], batch_size=batch_size)
+        for path, embedding in zip(batch, embeddings):
+            result[path] = (descriptions[path], embedding)
+    logger.info(f"批量编码页面描述完成, batch_size={batch_size}")
+    return result
 
 class UIElementEdge:
+    __slots__ = ('source_node', 'target_node', 'action_type', 'action_parameter', 'action_box')
+
     def __init__(self, data=None):
         self.source_node = -1  
         self.target_node = -1  
@@ -282,29 +340,58 @@ class UIElementEdge:
         self.target_node = node_id
 
     def __repr__(self):
-        return f"UINode({self.ui_id}, {self.content})"
+        return f"UIElementEdge({self.source_node} -> {self.target_node}, {self.action_type}, {self.action_parameter})"
 
 
 class Graph:
-    def __init__(self, max_nodes=1000, app=None):
+    def __init__(self, max_nodes=1000, app=None, index_backend='exact', vlm_top_k=3, phash_reject=None):
+        """
+        vlm_top_k: candidates that may be sent to the VLM per insert
+        phash_reject: skip candidates whose closest screenshot is more than this many dHash bits away and rank
+            the rest by that distance (None: no hashing, rank by text similarity)
+        """
         self.nodes = {}
         self.next_id = 0  
         self.home_id = 0  # default home node id 0
         self.app = app
+        self.vlm_top_k = vlm_top_k
+        self.phash_reject = phash_reject
+        self.index_backend = index_backend
+        self.embedding_index = EmbeddingIndex(backend=index_backend)
+        self.tasks = []  # trajectory ids already built into the graph
+        # node_id -> screenshots it had before the current delta, for every node touched since reset_delta()
+        self._delta_marks = {}
+        self._delta_tasks = []
+
+    def _touch(self, node_id):
+        if node_id not in self._delta_marks:
+            node = self.nodes.get(node_id)
+            self._delta_marks[node_id] = len(node.screenlists) if node is not None else 0
+
+    def add_task(self, task_id):
+        self.tasks.append(task_id)
+        self._delta_tasks.append(task_id)
+
+    def _index_screenshots(self, node_id, screenshots):
+        self.embedding_index.add(node_id, [screenshot.description_embedding for screenshot in screenshots])
 
     def add_node(self, tmpnode, new_trajectory, last_node, last_edge):
-        newnode = copy.deepcopy(tmpnode)  
+        # tmpnode is built fresh by update() and not used afterwards, so it is taken over as is
+        newnode = tmpnode
         newnode.set_nodeid(self.next_id)  
+        self._touch(newnode.node_id)
         save_dir = os.path.join(nodes_save_path, self.app, f'node{newnode.node_id}')  
         os.makedirs(save_dir, exist_ok=True)
         newnode.screenlists[0].save_screenshot(save_path = save_dir)
 
         self.nodes[self.next_id] = newnode 
+        self._index_screenshots(newnode.node_id, newnode.screenlists)
         self.add_home_edge(newnode.node_id)  
         self.next_id += 1
 
         if not new_trajectory:
             if last_node != -1:
+                self._touch(last_node)
                 self.nodes[last_node].ui_element_edge_list[last_edge].set_target_node(newnode.node_id)  
                 self.nodes[last_node].next_node_id_list.add(newnode.node_id)  
                 if self.nodes[last_node].ui_element_edge_list.count(self.nodes[last_node].ui_element_edge_list[last_edge]) > 1:
@@ -324,8 +411,10 @@ class Graph:
         node.screenlists[0].save_screenshot(save_path = save_dir)
 
         merge_target_node = self.nodes[merge_target_node_id]
+        self._touch(merge_target_node_id)
         if not new_trajectory:
             if last_node != -1:
+                self._touch(last_node)
                 self.nodes[last_node].ui_element_edge_list[last_edge].set_target_node(merge_target_node_id) 
                 self.nodes[last_node].next_node_id_list.add(merge_target_node_id) 
                 if self.nodes[last_node].ui_element_edge_list.count(self.nodes[last_node].ui_element_edge_list[last_edge]) > 1:
@@ -338,6 +427,7 @@ class Graph:
 
         for screenshot in node.screenlists:
             self.nodes[merge_target_node_id].screenlists.append(screenshot) 
+        self._index_screenshots(merge_target_node_id, node.screenlists)
         for uielement in node.ui_element_edge_list:
             uielement.set_source_node(merge_target_node_id)
             if uielement not in self.nodes[merge_target_node_id].ui_element_edge_list:
@@ -349,28 +439,55 @@ class Graph:
         
 
     def find_similar_node(self, new_node: ScreenNode, threshold=0.8):
-        all_similarity = {}
-        for node_id, node in self.nodes.items():
-            # if node_id == 0 or node_id == 1: 
-            #     continue
-            similarity = node.calculate_similarity(new_node, threshold)
-            logger.info(f"Average Total similarity with node{node.node_id}: {similarity}")
-            if similarity > threshold:
-                all_similarity[node_id] = similarity
-        if all_similarity:
-            max_similarity = max(all_similarity.values())
-            similar_node_ids = [node_id for node_id, sim in all_similarity.items() if sim == max_similarity]
-            if len(similar_node_ids) == 1:
-                return similar_node_ids[0]
-            else:
-                # randomly return one of the similar nodes
-                result = random.choice(similar_node_ids)
-                logger.warning(f"Multiple similar nodes found with ID {similar_node_ids} with similarity {max_similarity}, randomly returning {result}.")
-                return result
-        else:
+        """
+        Tiered search for the node new_node belongs to, cheapest tier first:
+        1. text similarity of all nodes from the embedding index; above 0.9 merges without the VLM
+        2. with `phash_reject` set, candidates whose closest screenshot is more than that many
+           dHash bits away are dropped and the rest are ranked by that distance (text similarity
+           breaks ties); without it no screenshot is hashed and they stay in text similarity order
+        3. the VLM checks the top `vlm_top_k` candidates in order; the first one above threshold wins
+        """
+        new_screenshot = new_node.screenlists[0]
+        text_similarities = self.embedding_index.similarities(new_screenshot.description_embedding)
+        candidates = sorted(
+            ((text_similarity, node_id) for node_id, text_similarity in text_similarities.items()
+             if text_similarity > threshold and self.nodes[node_id].app == new_node.app),
+            reverse=True
+        )
+        if not candidates:
             return -1
 
-                
+        certain_node_ids = [node_id for text_similarity, node_id in candidates if text_similarity > 0.9]
+        if certain_node_ids:
+            if len(certain_node_ids) == 1:
+                return certain_node_ids[0]
+            # randomly return one of the similar nodes
+            result = random.choice(certain_node_ids)
+            logger.warning(f"Multiple similar nodes found with ID {certain_node_ids} with similarity 1.0, randomly returning {result}.")
+            return result
+
+        if self.phash_reject is None:
+            ranked = [(None, -text_similarity, node_id) for text_similarity, node_id in candidates]
+        else:
+            ranked = []
+            for text_similarity, node_id in candidates:
+                distance = int(self.nodes[node_id].image_distances(new_screenshot).min())
+                if distance > self.phash_reject:
+                    logger.info(f"Skip node{node_id}: text similarity {text_similarity:.3f}, image hash distance {distance} > {self.phash_reject}")
+                    continue
+                ranked.append((distance, -text_similarity, node_id))
+            ranked.sort()
+
+        for distance, negative_text_similarity, node_id in ranked[:self.vlm_top_k]:
+            text_similarity = -negative_text_similarity
+            # 0.5 * text + 0.5 * vlm > threshold  <=>  vlm > 2 * threshold - text
+            vlm_similarity = self.nodes[node_id]._calculate_node_similarity_by_vlm(new_node, required=2 * threshold - text_similarity)
+            similarity = 0.5 * text_similarity + 0.5 * vlm_similarity
+            logger.info(f"Average Total similarity with node{node_id}: {similarity} (text {text_similarity:.3f}, vlm {vlm_similarity:.2f}, hash distance {distance})")
+            if similarity > threshold:
+                return node_id
+        return -1
+
     def update(self, data:dict, new_trajectory:bool, last_node:int, last_edge:int, threshold=0.8, step=None):
         """
         data:轨迹history的一个元素        
@@ -412,6 +529,7 @@ class Graph:
         back_edge.set_source_node(source_id)  
         back_edge.set_target_node(target_id)  
         if back_edge not in self.nodes[source_id].ui_element_edge_list:
+            self._touch(source_id)
             self.nodes[source_id].ui_element_edge_list.append(back_edge)  
             self.nodes[source_id].next_node_id_list.add(target_id)  
             return True
@@ -424,6 +542,7 @@ class Graph:
         home_edge.set_source_node(source_id)
         home_edge.set_target_node(self.home_id)
         if home_edge not in self.nodes[source_id].ui_element_edge_list:
+            self._touch(source_id)
             self.nodes[source_id].ui_element_edge_list.append(home_edge) 
             self.nodes[source_id].next_node_id_list.add(self.home_id)  
             return True 
@@ -433,18 +552,63 @@ class Graph:
         return self.nodes.get(page_id)
 
     def save_graph(self, save_path):
-        graph_data = {
+        graph_data = self.to_dict()
+        with open(save_path, 'w', encoding='utf-8') as f:
+            json.dump(graph_data, f, indent=4, ensure_ascii=False, default=str)
+        # stored embeddings let load_graph skip model.encode
+        rows = [screenshot.embedding_row for node in self.nodes.values() for screenshot in node.screenlists]
+        if rows:
+            np.save(embeddings_path(save_path), get_embedding_store().take(rows))
+
+    def to_dict(self):
+        return {
             'metadata': {
                 'created_at': datetime.now().isoformat(),
                 'num_nodes': len(self.nodes),
                 'app': self.app, 
-                'next_id': self.next_id
+                'next_id': self.next_id,
+                'tasks': self.tasks,
+                'embedding_model': embedding_model_path()
             },
             'nodes': {node_id: node.get_node_info() for node_id, node in self.nodes.items()}
         }
-        
+
+    def delta_dict(self):
+        """
+        Changes since the last reset_delta(): every touched node with only the screenshots
+        appended since (from index 'screenlists_start') and its full edge and successor lists.
+        """
+        nodes = {}
+        for node_id, start in sorted(self._delta_marks.items()):
+            node_info = self.nodes[node_id].get_node_info()
+            node_info['screenlists_start'] = start
+            node_info['screenlists'] = node_info['screenlists'][start:]
+            nodes[node_id] = node_info
+        return {
+            'metadata': {
+                'created_at': datetime.now().isoformat(),
+                'app': self.app,
+                'next_id': self.next_id,
+                'tasks': self._delta_tasks,
+                'embedding_model': embedding_model_path()
+            },
+            'nodes': nodes
+        }
+
+    def save_delta(self, save_path):
+        delta = self.delta_dict()
         with open(save_path, 'w', encoding='utf-8') as f:
-            json.dump(graph_data, f, indent=4, ensure_ascii=False, default=str)
+            json.dump(delta, f, indent=4, ensure_ascii=False, default=str)
+        rows = [screenshot.embedding_row
+                for node_id, start in sorted(self._delta_marks.items())
+                for screenshot in self.nodes[node_id].screenlists[start:]]
+        if rows:
+            np.save(embeddings_path(save_path), get_embedding_store().take(rows))
+        logger.info(f"Delta with {len(delta['nodes'])} nodes and {len(rows)} new screenshots saved to {save_path}")
+
+    def reset_delta(self):
+        self._delta_marks = {}
+        self._delta_tasks = []
         
     def load_graph(self, load_path):
         try:
@@ -456,19 +620,37 @@ class Graph:
                     graph_data = json.load(f)
             
             self.nodes = {}
+            self.embedding_index = EmbeddingIndex(backend=self.index_backend)
 
             # rebuild nodes
             metadata = graph_data.get('metadata', {})
             nodes = graph_data.get('nodes', {})
 
+            # stored embeddings, one row per screenshot in node order; descriptions are re-encoded without them
+            embeddings = None
+            if os.path.exists(embeddings_path(load_path)):
+                embeddings = np.load(embeddings_path(load_path), mmap_mode='r')
+                num_screenshots = sum(len(node_info.get('screenlists', [])) for node_info in nodes.values())
+                if len(embeddings) != num_screenshots:
+                    logger.warning(f"Stored embeddings ({len(embeddings)}) do not match {num_screenshots} screenshots, re-encoding descriptions")
+                    embeddings = None
+                elif metadata.get('embedding_model') != embedding_model_path():
+                    # same dimension across models, so mixing them would go unnoticed
+                    logger.warning(f"Stored embeddings come from {metadata.get('embedding_model') or 'an unrecorded model'}, "
+                                   f"not {embedding_model_path()}, re-encoding descriptions")
+                    embeddings = None
+            row = 0
+
             for node_id, node_info in nodes.items():
                 # rebuild ScreenNode
                 node = ScreenNode(node_id=int(node_id), app=node_info.get('app', None))
 
                 # rebuild screenshots list
                 for screenshot_info in node_info.get('screenlists', []):
-                    screenshot = ScreenShot(image_path = screenshot_info['screenshot_path'], description=screenshot_info.get('node_description', None))
+                    screenshot = ScreenShot(image_path = screenshot_info['screenshot_path'], description=screenshot_info.get('node_description', None),
+                                            app=node.app, embedding=embeddings[row] if embeddings is not None else None)
                     node.screenlists.append(screenshot)
+                    row += 1
                 
                 # rebuild UI element edges
                 for edge_info in node_info.get('ui_element_edge_list', []):
@@ -480,14 +662,18 @@ class Graph:
                 node.next_node_id_list = set(node_info.get('next_node_id_list', []))
 
                 self.nodes[int(node_id)] = node
+                if node.screenlists:
+                    self._index_screenshots(node.node_id, node.screenlists)
 
-                logger.info(f"Load node {node_id}!")
+                logger.debug(f"Load node {node_id}!")
             
             if metadata:
                 self.next_id = metadata.get('next_id', len(self.nodes))
                 self.app = metadata.get('app', len(self.nodes))
+                self.tasks = list(metadata.get('tasks', []))
             else:
                 self.next_id = len(self.nodes)
+            self.reset_delta()
             
             logger.info(f"Graph loaded from {load_path} with {len(self.nodes)} nodes.")
             
@@ -498,7 +684,7 @@ class Graph:
             raise
 
     def __repr__(self):
-        return f"Graph({len(self.nodes)} nodes, {len(self.edges)} edges)"
+        return f"Graph({len(self.nodes)} nodes, {sum(len(node.ui_element_edge_list) for node in self.nodes.values())} edges)"
         
 
 if __name__ == "__main__":
@@ -0,0 +1,244 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Merge per-app node graphs (Graph.save_graph output) into one global graph and
+flatten a node graph into the `{screenshot: {screenshot: [actions]}}` format
+that Graph_DataSet evaluates on.
+
+Node 0 of every per-app graph is the phone home screen the trajectories start
+from (Graph.home_id), so all of them become the one global home node 0 and
+every home edge keeps pointing at it. The other nodes are renumbered app by
+app in the given order.
+
+Flattening follows parse_json_to_cvs.py followed by matrix_to_json.py without
+the CSV round trip: every screenshot of a node gets the node's outgoing
+actions to every screenshot of the target node, system buttons, self loops
+and unresolved edges (-1) are dropped, and near-duplicate clicks are merged.
+
+merge_app_embeddings lays the app graphs' stored embeddings (one row per
+screenshot, see graph.embeddings_path) out in the merged node order, so the
+merged snapshot loads without re-encoding.
+
+apply_graph_delta replays a delta written by an incremental ingest
+(construct_graph.py --base_graph) onto an older snapshot.
+"""
+
+import os
+import logging
+from datetime import datetime
+import numpy as np
+from src.graph_construction.matrix_to_json import position_to_direction
+
+logger = logging.getLogger(__name__)
+
+HOME_NODE_ID = 0
+CLICK_MERGE_DISTANCE = 50
+
+
+def _global_ids(app_graphs, shared_home):
+    """Per app graph, the map local node id -> global node id; and the next free global id."""
+    mappings = []
+    next_id = 1 if shared_home else 0
+    for graph_data in app_graphs:
+        mapping = {}
+        for local_id in sorted(graph_data.get('nodes', {}), key=int):
+            if shared_home and int(local_id) == HOME_NODE_ID:
+                mapping[int(local_id)] = HOME_NODE_ID
+            else:
+                mapping[int(local_id)] = next_id
+                next_id += 1
+        mappings.append(mapping)
+    return mappings, next_id
+
+
+def merge_app_graphs(app_graphs, shared_home=True):
+    """
+    :param app_graphs: save_graph dicts ({'metadata': ..., 'nodes': {id: node_info}}), one per app
+    :param shared_home: merge node 0 of every app into global node 0
+    :return: one save_graph dict with global node ids
+    """
+    merged = {}
+    apps = []
+    tasks = []
+    embedding_models = set()
+    mappings, next_id = _global_ids(app_graphs, shared_home)
+    for graph_data, mapping in zip(app_graphs, mappings):
+        metadata = graph_data.get('metadata', {})
+        apps.append(metadata.get('app'))
+        tasks.extend(metadata.get('tasks', []))
+        embedding_models.add(metadata.get('embedding_model'))
+        local_nodes = graph_data.get('nodes', {})
+
+        def remap(node_id):
+            return mapping.get(int(node_id), -1)
+
+        for local_id, node_info in local_nodes.items():
+            global_id = mapping[int(local_id)]
+            edges = [
+                dict(edge, source_node=global_id, target_node=remap(edge['target_node']))
+                for edge in node_info.get('ui_element_edge_list', [])
+            ]
+            next_node_ids = [remap(node_id) for node_id in node_info.get('next_node_id_list', [])]
+            node = merged.get(global_id)
+            if node is None:
+                merged[global_id] = {
+                    'node_id': global_id,
+                    'app': node_info.get('app') if global_id != HOME_NODE_ID or not shared_home else None,
+                    'screenlists': list(node_info.get('screenlists', [])),
+                    'ui_element_edge_list': edges,
+                    'next_node_id_list': next_node_ids,
+                }
+                continue
+            # the shared home node: collect every app's screenshots and edges
+            node['screenlists'].extend(node_info.get('screenlists', []))
+            for edge in edges:
+                if edge not in node['ui_element_edge_list']:
+                    node['ui_element_edge_list'].append(edge)
+            node['next_node_id_list'] = list(dict.fromkeys(node['next_node_id_list'] + next_node_ids))
+
+    logger.info(f"Merged {len(app_graphs)} app graphs into {len(merged)} nodes")
+    return {
+        'metadata': {
+            'created_at': datetime.now().isoformat(),
+            'num_nodes': len(merged),
+            'app': None,
+            'apps': apps,
+            'next_id': next_id,
+            'tasks': tasks,
+            # None when the apps disagree, so the merged embeddings are never reused
+            'embedding_model': embedding_models.pop() if len(embedding_models) == 1 else None,
+        },
+        'nodes': {node_id: merged[node_id] for node_id in sorted(merged)},
+    }
+
+
+def merge_app_embeddings(app_graphs, app_embeddings, shared_home=True):
+    """
+    Stored embeddings of the graph merge_app_graphs(app_graphs) returns, one row per screenshot
+    in merged node order; None if an app graph has none.
+    :param app_embeddings: per app graph, its rows in the order of its 'nodes' (save_graph order)
+    """
+    if not app_graphs or any(embeddings is None for embeddings in app_embeddings):
+        return None
+    rows = {}
+    mappings, _ = _global_ids(app_graphs, shared_home)
+    for graph_data, mapping, embeddings in zip(app_graphs, mappings, app_embeddings):
+        start = 0
+        for local_id, node_info in graph_data.get('nodes', {}).items():
+            end = start + len(node_info.get('screenlists', []))
+            # the shared home node gets every app's screenshots in app order, as in merge_app_graphs
+            rows.setdefault(mapping[int(local_id)], []).append(embeddings[start:end])
+            start = end
+        if start != len(embeddings):
+            logger.warning(f"Stored embeddings ({len(embeddings)}) do not match {start} screenshots of app {graph_data.get('metadata', {}).get('app')}")
+            return None
+    return np.concatenate([block for node_id in sorted(rows) for block in rows[node_id]])
+
+
+def apply_graph_delta(graph_data, delta):
+    """
+    Apply a Graph.save_delta dict to a save_graph dict in place: touched nodes get the
+    screenshots from 'screenlists_start' on replaced and their edge and successor lists
+    replaced, new nodes are added.
+    """
+    nodes = graph_data.setdefault('nodes', {})
+    # node ids are ints in memory and strings once read back from JSON
+    keys = {str(node_id): node_id for node_id in nodes}
+    for node_id, node_info in delta.get('nodes', {}).items():
+        key = keys.get(str(node_id), node_id)
+        node_info = dict(node_info)
+        start = node_info.pop('screenlists_start', 0)
+        old = nodes.get(key)
+        if old is not None:
+            node_info['screenlists'] = old.get('screenlists', [])[:start] + node_info['screenlists']
+        nodes[key] = node_info
+    metadata = graph_data.setdefault('metadata', {})
+    metadata['next_id'] = delta.get('metadata', {}).get('next_id', metadata.get('next_id'))
+    metadata['num_nodes'] = len(nodes)
+    metadata['tasks'] = metadata.get('tasks', []) + delta.get('metadata', {}).get('tasks', [])
+    return graph_data
+
+
+def screenshot_name(screenshot_path):
+    """Name a screenshot has in the graph image folder (see ScreenShot.save_screenshot)."""
+    parts = screenshot_path.replace('\\', '/').split('/')
+    return f'{parts[-2]}_{parts[-1]}' if len(parts) > 1 else parts[-1]
+
+
+def flatten_action(edge):
+    """Evaluation action of one node edge, or None for edges that are not graph transitions."""
+    action_type = edge.get('action_type') or ''
+    parameter = edge.get('action_parameter') or {}
+    lowered = action_type.lower()
+    if lowered in ('click', 'long_press'):
+        return {'action_type': action_type, 'x': parameter['x'], 'y': parameter['y']}
+    if lowered == 'swipe':
+        (x1, y1), (x2, y2) = parameter['start'], parameter['lift']
+        return {'action_type': 'swipe', 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                'direction': position_to_direction(x1, y1, x2, y2) or 'unknown'}
+    if lowered in ('system_button', 'status', 'complete'):
+        return None
+    if lowered in ('input_text', 'input', 'type'):
+        return {'action_type': 'type', 'text': parameter.get('text', '')}
+    if lowered == 'open':
+        return {'action_type': 'open', 'app': parameter.get('app', parameter.get('text', ''))}
+    if lowered == 'answer':
+        return {'action_type': 'answer', 'text': parameter.get('text', '')}
+    return {'action_type': action_type}
+
+
+def _is_duplicate_click(actions, action):
+    if action['action_type'].lower() not in ('click', 'long_press'):
+        return action in actions
+    return any(
+        old['action_type'] == action['action_type']
+        and abs(old['x'] - action['x']) <= CLICK_MERGE_DISTANCE
+        and abs(old['y'] - action['y']) <= CLICK_MERGE_DISTANCE
+        for old in actions if 'x' in old and 'y' in old
+    )
+
+
+def flatten_graph(graph_data):
+    """Flatten a save_graph dict into `{screenshot: {screenshot: [actions]}}`."""
+    nodes = graph_data.get('nodes', {})
+    screenshots = {
+        int(node_id): [screenshot_name(shot['screenshot_path']) for shot in node_info.get('screenlists', [])]
+        for node_id, node_info in nodes.items()
+    }
+    flat = {name: {} for names in screenshots.values() for name in names}
+    for node_id, node_info in nodes.items():
+        node_id = int(node_id)
+        for edge in node_info.get('ui_element_edge_list', []):
+            target_id = int(edge['target_node'])
+            if target_id == -1 or target_id == node_id:
+                continue
+            action = flatten_action(edge)
+            if action is None:
+                continue
+            for source in screenshots.get(node_id, []):
+                for target in screenshots.get(target_id, []):
+                    if source == target:
+                        continue
+                    actions = flat[source].setdefault(target, [])
+                    if not _is_duplicate_click(actions, action):
+                        actions.append(dict(action))
+    logger.info(f"Flattened {len(nodes)} nodes into {len(flat)} screenshots, "
+                f"{sum(len(targets) for targets in flat.values())} edges")
+    return flat
+
+
+def default_flat_path(output_path):
+    stem, ext = os.path.splitext(str(output_path))
+    return f"{stem}_flat{ext or '.json'}"
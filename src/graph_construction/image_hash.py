@@ -0,0 +1,45 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Perceptual hashes of screenshots, the cheapest tier of page matching.
+
+A difference hash (dHash) shrinks the screenshot to a 9 x 8 grayscale
+thumbnail and keeps one bit per horizontal gradient sign, so screenshots of
+the same layout land a few bits apart while unrelated pages differ in about
+half of the 64 bits. It is too coarse to tell two states of one page apart,
+which is why it only ranks and rejects candidates and never merges on its own.
+"""
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+
+# popcount of every byte value; np.bitwise_count needs numpy 2
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def dhash(image_path):
+    """64-bit difference hash of an image file, as a Python int."""
+    with Image.open(image_path) as img:
+        pixels = np.asarray(img.convert('L').resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distances(image_hash, hashes):
+    """Hamming distance between one hash and each of `hashes`."""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(image_hash))
+    return _POPCOUNT[xor.view(np.uint8).reshape(-1, 8)].sum(axis=1)
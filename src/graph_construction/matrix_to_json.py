@@ -17,6 +17,7 @@ import ast
 import json
 import os
 from collections import defaultdict
+from src.test.graph_binary import write_binary_graph
 
 
 def check_matrix(adjacency_matrix:pd.DataFrame):
@@ -56,13 +57,14 @@ def position_to_direction(x1, y1, x2, y2):
             return "up"
         
 
-def csv_to_json(file_path, output_json_path=None):
+def csv_to_json(file_path, output_json_path=None, output_binary_path=None):
     """
     将邻接矩阵CSV文件转换为JSON格式，自动尝试多种编码解决读取问题
     
     参数:
         file_path: CSV文件路径
         output_json_path: 输出JSON文件路径，默认为与CSV同名的JSON文件
+        output_binary_path: 可选，同时输出内存映射的二进制图文件 (见 src/test/graph_binary.py)
     """
     try:
         encodings = [ 'UTF-8', 'GB2312', 'GBK']  # 'ANSI', 'ISO-8859-1'
@@ -95,6 +97,9 @@ def csv_to_json(file_path, output_json_path=None):
         with open(output_json_path, 'w', encoding='utf-8') as f:
             json.dump(json_data, f, ensure_ascii=False, indent=2)
         print(f"已成功将CSV转换为JSON格式并保存到 {output_json_path}")
+        if output_binary_path:
+            write_binary_graph(json_data, output_binary_path)
+            print(f"已同时保存二进制图文件到 {output_binary_path}")
         
         return json_data
         
@@ -196,5 +201,6 @@ def convert_to_json(df):
 if __name__ == "__main__":
     csv_file_path = ""
     output_json_path = ""
+    output_binary_path = None
     
-    json_data = csv_to_json(csv_file_path, output_json_path)
+    json_data = csv_to_json(csv_file_path, output_json_path, output_binary_path)
@@ -0,0 +1,90 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lazy, process-wide providers of the models graph construction uses.
+
+The embedding model (FlagEmbedding) and the VLM client used to be created when
+graph.py was imported, so even loading a saved graph paid the model load and
+needed the weights on disk. Here each one is created on first use, once per
+process, and shared by every Graph. Tests and tooling inject their own with
+set_embedding_model / set_vlm_client before first use.
+"""
+
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL_PATH = "path/to/your/bge-m3-model"
+QUERY_INSTRUCTION = "为这个句子生成表示以用于检索相关文章："
+
+_embedding_model = None
+_embedding_model_path = None
+_vlm_client = None
+_lock = threading.Lock()
+
+
+def configure_embedding_model(path):
+    """Set the FlagModel path loaded on first use (default: $EMBEDDING_MODEL_PATH)."""
+    global _embedding_model_path
+    with _lock:
+        if _embedding_model is not None and path != _embedding_model_path:
+            logger.warning(f"Embedding model already loaded from {_embedding_model_path}, {path} is ignored")
+            return
+        _embedding_model_path = path
+
+
+def embedding_model_path():
+    """Path of the embedding model this process uses (or will load on first use)."""
+    return _embedding_model_path or os.getenv('EMBEDDING_MODEL_PATH', DEFAULT_EMBEDDING_MODEL_PATH)
+
+
+def set_embedding_model(model):
+    """Inject an object with FlagModel's `encode`; None makes the next use load the model again."""
+    global _embedding_model
+    with _lock:
+        _embedding_model = model
+
+
+def get_embedding_model():
+    """Return the shared embedding model, loading it on first use."""
+    global _embedding_model, _embedding_model_path
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                from FlagEmbedding import FlagModel
+                _embedding_model_path = embedding_model_path()
+                _embedding_model = FlagModel(_embedding_model_path, query_instruction_for_retrieval=QUERY_INSTRUCTION, use_fp16=True)
+                logger.info(f"Model loaded Successfully from {_embedding_model_path}!")
+    return _embedding_model
+
+
+def set_vlm_client(client):
+    """Inject an object with LLMClient's `get_response_vlm`; None makes the next use create a new one."""
+    global _vlm_client
+    with _lock:
+        _vlm_client = client
+
+
+def get_vlm_client():
+    """Return the shared VLM client, creating it on first use."""
+    global _vlm_client
+    if _vlm_client is None:
+        with _lock:
+            if _vlm_client is None:
+                from src.utils import LLMClient
+                _vlm_client = LLMClient()
+    return _vlm_client
@@ -0,0 +1,212 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Persistent record/replay cache for VLM responses.
+
+Responses are stored in one SQLite file, content-addressed by a hash of
+(model, messages, temperature, max_tokens, extra request params); images are
+part of the messages, so the same prompt on a different screenshot is a
+different entry. Modes:
+
+- record:      serve hits from the cache, call the model on a miss and store the answer
+- replay:      serve hits only; a miss returns None without calling the model
+- passthrough: always call the model, never read or write the cache
+
+The cache is enabled by environment variables (so it covers evaluation and
+graph construction alike) or by `configure_response_cache`:
+
+    COLORBENCH_RESPONSE_CACHE=./cache/responses.sqlite
+    COLORBENCH_RESPONSE_CACHE_MODE=record
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import logging
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('record', 'replay', 'passthrough')
+
+
+def response_key(model, messages, temperature=None, max_tokens=None, **params):
+    """Content hash of one chat completion request."""
+    payload = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'params': params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store, safe to share between threads and processes."""
+
+    def __init__(self, path, mode='record'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported response cache mode: {mode}, expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, created REAL)'
+        )
+        self._connect().commit()
+        logger.info(f"Response cache {path} opened in {mode} mode")
+
+    def _connect(self):
+        # sqlite connections must not be shared across threads: one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, model, response):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)',
+            (key, model, response, time.time())
+        )
+        conn.commit()
+
+    def lookup(self, key):
+        """Return (hit, response) for key according to the cache mode."""
+        if self.mode == 'passthrough':
+            return False, None
+        response = self.get(key)
+        with self._stats_lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response is not None, response
+
+    def store(self, key, model, response):
+        if self.mode == 'record' and response is not None:
+            self.put(key, model, response)
+
+    def stats(self):
+        return {'mode': self.mode, 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def configure_response_cache(path, mode='record'):
+    """Install the process-wide response cache; path None disables it."""
+    global _cache, _cache_loaded
+    with _cache_lock:
+        _cache = ResponseCache(path, mode) if path else None
+        _cache_loaded = True
+    return _cache
+
+
+def get_response_cache():
+    """Return the process-wide cache, configured from the environment on first use."""
+    global _cache, _cache_loaded
+    if not _cache_loaded:
+        with _cache_lock:
+            if not _cache_loaded:
+                path = os.getenv('COLORBENCH_RESPONSE_CACHE')
+                mode = os.getenv('COLORBENCH_RESPONSE_CACHE_MODE', 'record')
+                _cache = ResponseCache(path, mode) if path else None
+                _cache_loaded = True
+    return _cache
+
+
+def cached_response(max_tokens=None, model=None):
+    """
+    Decorator putting the response cache under a `get_response`-style function.
+    model / messages / temperature / extra kwargs are read from the call; `model`
+    pins the model for helpers that hardcode it, and methods fall back to `self.model`.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def prepare(args, kwargs):
+            cache = get_response_cache()
+            if cache is None:
+                return None, None, None
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = bound.arguments
+            if params.get('stream'):
+                return None, None, None
+            request_model = model or params.get('model') or getattr(params.get('self'), 'model', None)
+            key = response_key(
+                request_model,
+                params['messages'],
+                temperature=params.get('temperature'),
+                max_tokens=params.get('max_tokens', max_tokens),
+                **params.get('kwargs', {})
+            )
+            return cache, key, request_model
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache, key, request_model = prepare(args, kwargs)
+                if cache is None:
+                    return await func(*args, **kwargs)
+                hit, response = cache.lookup(key)
+                if hit:
+                    return response
+                if cache.mode == 'replay':
+                    logger.error(f"Response cache miss in replay mode for model {request_model}")
+                    return None
+                response = await func(*args, **kwargs)
+                cache.store(key, request_model, response)
+                return response
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache, key, request_model = prepare(args, kwargs)
+            if cache is None:
+                return func(*args, **kwargs)
+            hit, response = cache.lookup(key)
+            if hit:
+                return response
+            if cache.mode == 'replay':
+                logger.error(f"Response cache miss in replay mode for model {request_model}")
+                return None
+            response = func(*args, **kwargs)
+            cache.store(key, request_model, response)
+            return response
+        return wrapper
+    return decorator
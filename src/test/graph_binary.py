@@ -0,0 +1,339 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact, memory-mapped binary format for `{source: {target: [actions]}}` graphs.
+
+    python -m src.test.graph_binary data/graph.json data/graph.cbg --check
+
+Layout (little endian):
+
+    b'CBGRAPH\\x01' | uint64 header length | JSON header | arrays, 64-byte aligned
+
+- node names are interned to integer ids (sources first, in file order, then
+  nodes that only appear as targets) and stored as one UTF-8 blob plus offsets;
+  `name_order` keeps the ids sorted by name for binary-search lookup
+- edges are CSR arrays: the edges of source i are edge_offsets[i]:edge_offsets[i+1],
+  the actions of edge e are action_offsets[e]:action_offsets[e+1]
+- action parameters are typed columns (x/y, bbox, x1/y1/x2/y2 and interned
+  strings); a per-action layout id restores the original keys and their order,
+  and values that do not fit a column are kept as JSON in `extra`
+
+`BinaryGraph` maps the file read-only and decodes a node only when it is
+accessed, so opening a graph costs the same for 2k or 2M nodes and the pages
+are shared by every process that maps the same file.
+"""
+
+import os
+import sys
+import json
+import mmap
+import bisect
+import struct
+import logging
+import argparse
+import threading
+from collections.abc import Mapping
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CBGRAPH\x01'
+ALIGNMENT = 64
+NONE = -1
+
+INT_KEYS = ('x', 'y')
+SWIPE_KEYS = ('x1', 'y1', 'x2', 'y2')
+STRING_KEYS = ('action_type', 'text', 'direction', 'app', 'reason')
+
+_INT32_MIN, _INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _is_int32(value):
+    return type(value) is int and _INT32_MIN <= value <= _INT32_MAX
+
+
+def is_binary_graph(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return string_id
+
+
+def _blob(strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded]) if encoded else []
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def write_binary_graph(graph_data, path):
+    """Convert a loaded `{source: {target: [actions]}}` dict to the binary format at `path`."""
+    names = _StringTable()
+    for source in graph_data:
+        names.intern(source)
+    num_sources = len(names.values)
+    for outgoing in graph_data.values():
+        for target in outgoing:
+            names.intern(target)
+
+    strings = _StringTable()
+    layouts = _StringTable()
+    edge_offsets = [0]
+    edge_target = []
+    action_offsets = [0]
+    columns = {key: [] for key in ('layout', 'xy', 'bbox', 'swipe', 'strings', 'extra')}
+
+    for outgoing in graph_data.values():
+        for target, actions in outgoing.items():
+            edge_target.append(names.ids[target])
+            for action in actions:
+                xy = [0, 0]
+                bbox = [0, 0, 0, 0]
+                swipe = [0, 0, 0, 0]
+                string_ids = [NONE] * len(STRING_KEYS)
+                extra = {}
+                layout = []
+                for key, value in action.items():
+                    typed = True
+                    if key in INT_KEYS and _is_int32(value):
+                        xy[INT_KEYS.index(key)] = value
+                    elif key in SWIPE_KEYS and _is_int32(value):
+                        swipe[SWIPE_KEYS.index(key)] = value
+                    elif key == 'bbox' and isinstance(value, list) and len(value) == 4 and all(_is_int32(v) for v in value):
+                        bbox = value
+                    elif key in STRING_KEYS and isinstance(value, str):
+                        string_ids[STRING_KEYS.index(key)] = strings.intern(value)
+                    else:
+                        typed = False
+                        extra[key] = value
+                    layout.append([key, typed])
+                columns['layout'].append(layouts.intern(json.dumps(layout, ensure_ascii=False)))
+                columns['xy'].append(xy)
+                columns['bbox'].append(bbox)
+                columns['swipe'].append(swipe)
+                columns['strings'].append(string_ids)
+                columns['extra'].append(strings.intern(json.dumps(extra, ensure_ascii=False)) if extra else NONE)
+            action_offsets.append(len(columns['layout']))
+        edge_offsets.append(len(edge_target))
+
+    name_offsets, name_blob = _blob(names.values)
+    string_offsets, string_blob = _blob(strings.values)
+    name_order = sorted(range(len(names.values)), key=lambda i: names.values[i].encode('utf-8'))
+    num_actions = len(columns['layout'])
+    arrays = {
+        'name_offsets': name_offsets,
+        'name_blob': name_blob,
+        'name_order': np.array(name_order, dtype=np.int32),
+        'edge_offsets': np.array(edge_offsets, dtype=np.int64),
+        'edge_target': np.array(edge_target, dtype=np.int32),
+        'action_offsets': np.array(action_offsets, dtype=np.int64),
+        'action_layout': np.array(columns['layout'], dtype=np.int32),
+        'action_xy': np.array(columns['xy'], dtype=np.int32).reshape(num_actions, 2),
+        'action_bbox': np.array(columns['bbox'], dtype=np.int32).reshape(num_actions, 4),
+        'action_swipe': np.array(columns['swipe'], dtype=np.int32).reshape(num_actions, 4),
+        'action_strings': np.array(columns['strings'], dtype=np.int32).reshape(num_actions, len(STRING_KEYS)),
+        'action_extra': np.array(columns['extra'], dtype=np.int32),
+        'string_offsets': string_offsets,
+        'string_blob': string_blob,
+    }
+
+    header = {
+        'version': 1,
+        'num_nodes': len(names.values),
+        'num_sources': num_sources,
+        'num_edges': len(edge_target),
+        'num_actions': num_actions,
+        'layouts': [json.loads(layout) for layout in layouts.values],
+        'arrays': {},
+    }
+    # array offsets depend on the header size, which depends on the offsets: reserve room and fix up
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = [array.dtype.str, list(array.shape), offset]
+        offset += _aligned(array.nbytes)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes) + 32 * len(arrays))
+    for name in arrays:
+        header['arrays'][name][2] += data_start
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    assert len(MAGIC) + 8 + len(header_bytes) <= data_start
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(header['arrays'][name][2])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote binary graph {path}: {header['num_sources']} sources, {header['num_nodes']} nodes, "
+                f"{header['num_edges']} edges, {num_actions} actions")
+    return path
+
+
+def _aligned(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class BinaryGraph(Mapping):
+    """
+    Read-only `{source: {target: [actions]}}` mapping over a memory-mapped binary
+    graph. Lookups decode just the requested node; decoded action dicts are fresh
+    copies, so callers may modify them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a binary graph file: {path}")
+            header_len, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if header.get('version') != 1:
+            raise ValueError(f"Unsupported binary graph version {header.get('version')} in {path}")
+        self.num_nodes = header['num_nodes']
+        self.num_sources = header['num_sources']
+        self.num_edges = header['num_edges']
+        self.layouts = [[(key, typed) for key, typed in layout] for layout in header['layouts']]
+        for name, (dtype, shape, offset) in header['arrays'].items():
+            count = int(np.prod(shape)) if shape else 1
+            array = np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=offset)
+            setattr(self, name, array.reshape(shape))
+        self._ids = {}
+        self._strings = {}
+        self._lock = threading.Lock()
+
+    def _name(self, node_id):
+        start, end = self.name_offsets[node_id], self.name_offsets[node_id + 1]
+        return self.name_blob[start:end].tobytes().decode('utf-8')
+
+    def _string(self, string_id):
+        value = self._strings.get(string_id)
+        if value is None:
+            start, end = self.string_offsets[string_id], self.string_offsets[string_id + 1]
+            value = self._strings[string_id] = self.string_blob[start:end].tobytes().decode('utf-8')
+        return value
+
+    def node_id(self, name):
+        """Interned id of a node name (sources and target-only nodes), or None."""
+        node_id = self._ids.get(name, False)
+        if node_id is not False:
+            return node_id
+        key = name.encode('utf-8')
+        order = self.name_order
+        pos = bisect.bisect_left(range(len(order)), key, key=lambda i: self._name(order[i]).encode('utf-8'))
+        node_id = None
+        if pos < len(order) and self._name(order[pos]) == name:
+            node_id = int(order[pos])
+        with self._lock:
+            self._ids[name] = node_id
+        return node_id
+
+    def node_name(self, node_id):
+        return self._name(node_id)
+
+    def successors(self, node_id):
+        """Target ids of the edges of source `node_id`, as a read-only array view."""
+        return self.edge_target[self.edge_offsets[node_id]:self.edge_offsets[node_id + 1]]
+
+    def _action(self, row):
+        layout = self.layouts[self.action_layout[row]]
+        extra_id = int(self.action_extra[row])
+        extra = json.loads(self._string(extra_id)) if extra_id != NONE else {}
+        action = {}
+        for key, typed in layout:
+            if not typed:
+                action[key] = extra[key]
+            elif key in INT_KEYS:
+                action[key] = int(self.action_xy[row, INT_KEYS.index(key)])
+            elif key in SWIPE_KEYS:
+                action[key] = int(self.action_swipe[row, SWIPE_KEYS.index(key)])
+            elif key == 'bbox':
+                action[key] = self.action_bbox[row].tolist()
+            else:
+                action[key] = self._string(int(self.action_strings[row, STRING_KEYS.index(key)]))
+        return action
+
+    def outgoing(self, node_id):
+        """Decode `{target: [actions]}` of source `node_id`."""
+        outgoing = {}
+        first, last = int(self.edge_offsets[node_id]), int(self.edge_offsets[node_id + 1])
+        for edge in range(first, last):
+            start, end = int(self.action_offsets[edge]), int(self.action_offsets[edge + 1])
+            target = self._name(int(self.edge_target[edge]))
+            outgoing.setdefault(target, []).extend(self._action(row) for row in range(start, end))
+        return outgoing
+
+    def __getitem__(self, name):
+        node_id = self.node_id(name)
+        if node_id is None or node_id >= self.num_sources:
+            raise KeyError(name)
+        return self.outgoing(node_id)
+
+    def __contains__(self, name):
+        node_id = self.node_id(name)
+        return node_id is not None and node_id < self.num_sources
+
+    def __iter__(self):
+        return (self._name(node_id) for node_id in range(self.num_sources))
+
+    def __len__(self):
+        return self.num_sources
+
+
+def load_graph_data(graph_file):
+    """Load a graph file in either format: a dict for JSON, a BinaryGraph for the binary format."""
+    if is_binary_graph(graph_file):
+        return BinaryGraph(graph_file)
+    with open(graph_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a graph JSON file to the memory-mapped binary format")
+    parser.add_argument("graph_json", help="Input graph JSON ({source: {target: [actions]}}).")
+    parser.add_argument("output", help="Output binary graph file (e.g. data/graph.cbg).")
+    parser.add_argument("--check", action='store_true', help="Reload the output and compare it with the input.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.graph_json, 'r', encoding='utf-8') as f:
+        graph_data = json.load(f)
+    write_binary_graph(graph_data, args.output)
+    if args.check:
+        binary = BinaryGraph(args.output)
+        mismatches = [source for source in graph_data if binary[source] != graph_data[source]]
+        if mismatches or list(binary) != list(graph_data):
+            logger.error(f"Round trip mismatch on {len(mismatches)} nodes, e.g. {mismatches[:3]}")
+            sys.exit(1)
+        logger.info(f"Round trip check passed for {len(binary)} nodes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compiled transition index for the evaluation graph.
+
+`Graph_DataSet.check_jump_condition` used to walk every outgoing edge and every
+action dict of the current node on each step. The graph never changes during an
+evaluation, so all of that work is done once here (and once per process, see
+`load_compiled_graph`): each node is compiled into
+per-action-type lookup structures and a step becomes a dict lookup plus, for
+click/long_press, one pass over pre-converted bbox intervals (vectorized for
+nodes with many clickable regions).
+
+The graph file may be JSON or the memory-mapped binary format of
+src.test.graph_binary; nodes are compiled on their first visit, so opening a
+large binary graph does not touch nodes no episode reaches.
+"""
+
+import os
+import math
+import logging
+import threading
+from collections import defaultdict
+import numpy as np
+from src.test.graph_binary import load_graph_data
+
+logger = logging.getLogger(__name__)
+
+POINTER_ACTIONS = ('click', 'long_press')
+CLICK_DISTANCE_THRESHOLD = 1080 * 0.14
+VECTORIZE_MIN_ROWS = 32
+
+_TEXT_SEPARATORS = ['，', '。', '/', ':', '*', '?', '"', '“', '”', '<', '>', '|']
+
+
+def normalize_text(text):
+    """Normalize `type` text the same way the ground truth has always been compared."""
+    text = text.lower().replace(' ', '')
+    for sep in _TEXT_SEPARATORS:
+        text = text.replace(sep, ',')
+    return text
+
+
+def match_type_text(gt_text, gt_tokens, vlm_raw_text):
+    """
+    Compare a pre-normalized ground truth text with the text typed by the agent.
+    gt tokens are searched in the raw agent text, agent tokens in the normalized
+    ground truth, and a containment check covers everything else.
+    """
+    if all(token in vlm_raw_text for token in gt_tokens):
+        return True
+    vlm_tokens = normalize_text(vlm_raw_text).split(',')
+    if all(token in gt_text for token in vlm_tokens):
+        return True
+    vlm_lower = vlm_raw_text.lower()
+    return vlm_lower in gt_text or gt_text in vlm_lower
+
+
+class PointerIndex:
+    """
+    Interval arrays for the click/long_press actions of one node.
+    Nodes with only a handful of actions are scanned as pre-converted tuples,
+    numpy only pays off once a node has dozens of clickable regions.
+    """
+
+    __slots__ = ('edge_ids', 'actions', 'rows', 'has_bbox', 'has_point', 'boxes', 'points')
+
+    def __init__(self, rows):
+        # rows: [(edge_id, action)], in edge order
+        self.edge_ids = [edge_id for edge_id, _ in rows]
+        self.actions = [action for _, action in rows]
+        self.rows = []
+        for action in self.actions:
+            if 'bbox' in action:
+                self.rows.append((True, *[int(v) for v in action['bbox']]))
+            elif 'x' in action and 'y' in action:
+                self.rows.append((False, float(action['x']), float(action['y']), 0, 0))
+            else:
+                self.rows.append(None)
+
+        self.has_bbox = self.has_point = self.boxes = self.points = None
+        if len(self.rows) >= VECTORIZE_MIN_ROWS:
+            self.has_bbox = np.array([row is not None and row[0] for row in self.rows], dtype=bool)
+            self.has_point = np.array([row is not None and not row[0] for row in self.rows], dtype=bool)
+            self.boxes = np.array([row[1:] if row and row[0] else (0, 0, 0, 0) for row in self.rows], dtype=np.int64)
+            self.points = np.array([row[1:3] if row and not row[0] else (0, 0) for row in self.rows], dtype=np.float64)
+
+    def match(self, x, y):
+        """Return [(row, distance)] of the actions hit by the point (x, y); distance is None for bbox hits."""
+        ix, iy = int(x), int(y)
+        if self.boxes is not None:
+            in_box = (
+                self.has_bbox
+                & (self.boxes[:, 0] <= ix) & (ix <= self.boxes[:, 2])
+                & (self.boxes[:, 1] <= iy) & (iy <= self.boxes[:, 3])
+            )
+            distance = np.hypot(self.points[:, 0] - float(x), self.points[:, 1] - float(y))
+            near = self.has_point & (distance < CLICK_DISTANCE_THRESHOLD)
+            return [(int(row), None if in_box[row] else float(distance[row])) for row in np.flatnonzero(in_box | near)]
+
+        hits = []
+        for i, row in enumerate(self.rows):
+            if row is None:
+                continue
+            if row[0]:
+                if row[1] <= ix <= row[3] and row[2] <= iy <= row[4]:
+                    hits.append((i, None))
+            else:
+                distance = math.hypot(row[1] - x, row[2] - y)
+                if distance < CLICK_DISTANCE_THRESHOLD:
+                    hits.append((i, distance))
+        return hits
+
+
+class NodeIndex:
+    """All outgoing transitions of one node, grouped by action type."""
+
+    __slots__ = ('targets', 'wait_targets', 'pointer', 'swipe', 'type', 'other')
+
+    def __init__(self, outgoing_edges):
+        self.targets = []
+        self.wait_targets = []
+        pointer_rows = {action_type: [] for action_type in POINTER_ACTIONS}
+        self.swipe = {}
+        self.type = []
+        self.other = {}
+
+        for edge_id, (target, actions) in enumerate(outgoing_edges.items()):
+            self.targets.append(target)
+            for action in actions:
+                action_type = action.get('action_type', '').lower()
+                if action_type == 'wait':
+                    self.wait_targets.append(target)
+                if action_type in POINTER_ACTIONS:
+                    pointer_rows[action_type].append((edge_id, action))
+                elif action_type == 'swipe':
+                    self.swipe.setdefault(action.get('direction'), []).append(edge_id)
+                elif action_type == 'type':
+                    if 'text' in action:
+                        gt_text = normalize_text(action['text'])
+                        self.type.append((edge_id, gt_text, tuple(gt_text.split(','))))
+                else:
+                    self.other.setdefault(action_type, []).append(edge_id)
+
+        self.pointer = {
+            action_type: PointerIndex(rows) for action_type, rows in pointer_rows.items() if rows
+        }
+        for key, edge_ids in self.swipe.items():
+            self.swipe[key] = _unique(edge_ids)
+        for key, edge_ids in self.other.items():
+            self.other[key] = _unique(edge_ids)
+
+    def match(self, parsed_input):
+        """
+        Return (targets, messages) of every outgoing edge that accepts the action,
+        in the same edge order as the graph file. One message per matched edge.
+        """
+        action_type = parsed_input['action_type']
+
+        if action_type in POINTER_ACTIONS:
+            index = self.pointer.get(action_type)
+            if index is None or 'x' not in parsed_input or 'y' not in parsed_input:
+                return [], []
+            targets, messages, seen = [], [], set()
+            for row, distance in index.match(parsed_input['x'], parsed_input['y']):
+                edge_id = index.edge_ids[row]
+                if edge_id in seen:
+                    continue
+                seen.add(edge_id)
+                action = index.actions[row]
+                targets.append(self.targets[edge_id])
+                if distance is None:
+                    messages.append(f"click match with {action} (in bbox: {action['bbox']})")
+                else:
+                    messages.append(f"click match with {action} (距离: {distance:.2f} < 阈值: {CLICK_DISTANCE_THRESHOLD:.2f})")
+            return targets, messages
+
+        if action_type == 'swipe':
+            direction = parsed_input.get('direction')
+            edge_ids = self.swipe.get(direction, []) if direction is not None else []
+            return [self.targets[i] for i in edge_ids], [f"滑动方向匹配: swipe {direction}"] * len(edge_ids)
+
+        if action_type == 'type':
+            if 'text' not in parsed_input:
+                return [], []
+            vlm_text = parsed_input['text']
+            targets, messages, seen = [], [], set()
+            for edge_id, gt_text, gt_tokens in self.type:
+                if edge_id in seen:
+                    continue
+                if match_type_text(gt_text, gt_tokens, vlm_text):
+                    seen.add(edge_id)
+                    targets.append(self.targets[edge_id])
+                    messages.append(f"Input text match: {vlm_text}")
+            return targets, messages
+
+        edge_ids = self.other.get(action_type, [])
+        return [self.targets[i] for i in edge_ids], [f"动作类型匹配: {action_type}"] * len(edge_ids)
+
+
+class CompiledGraph:
+    """
+    Read-only, pre-compiled view of a `{source: {target: [actions]}}` graph
+    (a dict or a BinaryGraph). A node's index never changes once compiled, so one
+    instance can be shared by every episode and every worker thread of a process.
+    """
+
+    def __init__(self, graph_data):
+        self.graph_data = graph_data
+        self.nodes = {}
+        self._app_entries = {}
+        logger.info(f"Transition index ready for {len(graph_data)} nodes")
+
+    def node(self, node_id):
+        """NodeIndex of node_id, compiled on first use; None for unknown nodes."""
+        node = self.nodes.get(node_id)
+        if node is None:
+            if node_id not in self.graph_data:
+                return None
+            # two threads may compile the same node, setdefault keeps the first one
+            node = self.nodes.setdefault(node_id, NodeIndex(self.graph_data[node_id]))
+        return node
+
+    def app_entries(self, root_node):
+        """Map app name -> entry screenshots reachable from the home page `root_node`."""
+        entries = self._app_entries.get(root_node)
+        if entries is None:
+            apps = defaultdict(list)
+            for screenshot, actions in self.graph_data[root_node].items():
+                app = actions[0].get('app', None)
+                apps[app].append(screenshot)
+            entries = dict(apps)
+            self._app_entries[root_node] = entries
+            logger.info(f"已识别的应用入口:\n {entries}")
+            logger.info(f"应用数量为: {len(entries)}")
+        return entries
+
+    def __contains__(self, node_id):
+        return node_id in self.graph_data
+
+    def __len__(self):
+        return len(self.graph_data)
+
+    def out_degree(self, node_id):
+        node = self.node(node_id)
+        return len(node.targets) if node else 0
+
+    def match(self, node_id, parsed_input):
+        """Return (targets, messages, wait_targets) for an action taken on node_id."""
+        node = self.node(node_id)
+        if node is None:
+            return [], [], []
+        targets, messages = node.match(parsed_input)
+        return targets, messages, node.wait_targets
+
+
+_graph_cache = {}
+_graph_cache_lock = threading.Lock()
+
+
+def load_compiled_graph(graph_file):
+    """Load `graph_file` (JSON or binary) once per process; later calls return the shared instance."""
+    key = os.path.abspath(graph_file)
+    with _graph_cache_lock:
+        graph = _graph_cache.get(key)
+        if graph is None:
+            graph = CompiledGraph(load_graph_data(graph_file))
+            _graph_cache[key] = graph
+    return graph
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
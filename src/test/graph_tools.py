@@ -20,8 +20,8 @@ from openai import OpenAI
 import base64
 import random
 import logging
-from collections import defaultdict
 from PIL import Image, ImageDraw
+from src.test.graph_index import load_compiled_graph
 
 logger = logging.getLogger(__name__)
 
@@ -88,35 +88,38 @@ def position_to_direction(x1, y1, x2, y2):
                      
 
 class Graph_DataSet:
-    def __init__(self, graph_config):
+    """
+    Per-episode environment state (trajectory, history stack, RNG) on top of a
+    read-only CompiledGraph that is loaded once per process and shared.
+    """
+    def __init__(self, graph_config, compiled_graph=None):
         self.graph_json_file = graph_config['graph_file']
-        if not self.graph_json_file:
-            logger.error("未提供图的JSON文件路径")
-            return
-        elif not os.path.exists(self.graph_json_file):
-            logger.error(f"图的JSON文件路径不存在: {self.graph_json_file}")
-            return
-        try:
-            with open(self.graph_json_file, 'r', encoding='utf-8') as f:
-                self.graph_data = json.load(f)
-                logger.info(f"成功加载图数据，节点数: {len(self.graph_data)}")
-        except json.JSONDecodeError as e:
-            logger.error(f"加载图数据时出错: {str(e)}")
-            self.graph_data = None
-
-        self.query = None 
-        self.trajectory = [] 
-        self.history_stack = []  
+        if compiled_graph is None:
+            if not self.graph_json_file:
+                logger.error("未提供图的JSON文件路径")
+                return
+            elif not os.path.exists(self.graph_json_file):
+                logger.error(f"图的JSON文件路径不存在: {self.graph_json_file}")
+                return
+            try:
+                compiled_graph = load_compiled_graph(self.graph_json_file)
+                logger.info(f"成功加载图数据，节点数: {len(compiled_graph)}")
+            except ValueError as e:  # JSONDecodeError or a malformed binary graph
+                logger.error(f"加载图数据时出错: {str(e)}")
+        self.compiled_graph = compiled_graph
+        self.graph_data = compiled_graph.graph_data if compiled_graph is not None else None
+
+        self.seed = graph_config.get('seed', 42)
+        self.rng = random.Random(self.seed)
+        self.query = None
+        self.trajectory = []
+        self.history_stack = []
         self.home_page = graph_config['root_node']
-        self.apps = defaultdict(list)
-        for screenshot, actions in self.graph_data[self.home_page].items():
-            app = actions[0].get('app', None)
-            self.apps[app].append(screenshot)
-        logger.info(f"已识别的应用入口:\n {self.apps}")
-        logger.info(f"应用数量为: {len(self.apps)}")
+        self.apps = compiled_graph.app_entries(self.home_page) if compiled_graph is not None else {}
 
     def set_task(self, query):
         self.query = query 
+        self.rng.seed(f'{self.seed}_{query}')
         self.trajectory = [{
             'id': 0,
             'screenshot': self.home_page, 
@@ -166,6 +169,8 @@ class Graph_DataSet:
             with open(output_json, 'w', encoding='utf-8') as f:
                 json.dump(self.trajectory, f, ensure_ascii=False, indent=2)
 
+        return output_dir
+
 
     def check_jump_condition(self, parsed_input):
         """检查用户输入是否符合跳转条件，返回(target_node, jump_message, answer_text)"""
@@ -204,99 +209,24 @@ class Graph_DataSet:
         if parsed_input['action_type'] == 'open':
             app = APP_MAP.get(parsed_input['app'], parsed_input['app'])
             try:
-                app_home = random.choice(self.apps[app])
+                app_home = self.rng.choice(self.apps.get(app, []))
                 return app_home, f"Successfully transform to {app}: {app_home}", answer_text
             except Exception as e:
                 logger.info(f"Wrong when open app {app}, abort the task!")
                 return current_node_id, f"Failed to transform to {app}: {e}. Stay still", f"Failed to transform to {app}"
 
-        outgoing_edges = self.graph_data.get(current_node_id, {})
-        logger.info(f"The number of outgoing edges: {len(outgoing_edges)}")
-        
-        if not outgoing_edges:
+        out_degree = self.compiled_graph.out_degree(current_node_id)
+        logger.info(f"The number of outgoing edges: {out_degree}")
+        if not out_degree:
             return current_node_id, f"Current node '{current_node_id}' has no outgoing edges", answer_text
-        
-        edges = []
-        messages = []
-        wait_edges = []
-        for edge, actions in outgoing_edges.items():
-            for action in actions:
-                if action.get('action_type', '').lower() == 'wait':
-                    wait_edges.append(edge)
-
-                action_type = parsed_input['action_type']
-                if action.get('action_type', '').lower() != action_type:
-                    continue
-                match = False
-                
-                # 1. click: check position or bbox
-                if action_type in ['click','long_press']:
-                    if 'bbox' in action and 'x' in parsed_input and 'y' in parsed_input:
-                        x1, y1, x2, y2 = action['bbox']
-                        if int(x1) <= int(parsed_input['x']) <= int(x2) and int(y1) <= int(parsed_input['y']) <= int(y2):
-                            match = True
-                            messages.append(f"click match with {action} (in bbox: {action['bbox']})")
-                    elif 'x' in action and 'y' in action and 'x' in parsed_input and 'y' in parsed_input:
-                        distance = euclidean_distance(
-                            parsed_input['x'], parsed_input['y'],
-                            action['x'], action['y']
-                        )
-                        threshold = 1080 * 0.14
-                        if distance < threshold:
-                            match = True
-                            messages.append(f"click match with {action} (距离: {distance:.2f} < 阈值: {threshold:.2f})")
-                        else:
-                            action['match'] = False
-                            logger.info(f"click not match with {action}  (距离: {distance:.2f} >= 阈值: {threshold:.2f})")
-                            pass
-
-                # 2. swipe: check direction
-                elif action_type == 'swipe':
-                    if action['direction'] == parsed_input['direction']:
-                        match = True
-                        messages.append(f"滑动方向匹配: swipe {action['direction']}")
-
-                # 3. input: check text content
-                elif action_type == 'type':
-                    if 'text' in action and 'text' in parsed_input:
-                        action['text'] = action['text'].lower().replace('，', ',').replace('。', ',').replace(' ', '').replace('/',',').replace(':',',').replace('*',',').replace('?',',').replace('"',',').replace('“',',').replace('”',',').replace('<',',').replace('>',',').replace('|',',').lower()  
-                        gt_text = action['text'].split(',') 
-                        vlm_text = parsed_input['text'].lower().replace('，', ',').replace('。', ',').replace(' ', '').replace('/',',').replace(':',',').replace('*',',').replace('?',',').replace('"',',').replace('“',',').replace('”',',').replace('<',',').replace('>',',').replace('|',',').lower()  
-                        vlm_text = vlm_text.split(',')  
-                        flag = True
-                        for text in gt_text:
-                            if text not in parsed_input['text']:
-                                flag = False
-                                break
-                        if not flag:
-                            flag = True
-                            for text in vlm_text:
-                                if text not in action['text']:
-                                    flag = False
-                                    break
-                        if flag:
-                            match = True
-                            messages.append(f"Input text match: {parsed_input['text']}")
-                        if parsed_input['text'].lower() in action['text'].lower() or action['text'].lower() in parsed_input['text'].lower():
-                            # 如果文字有包含关系
-                            match = True
-                            messages.append(f"Input text match: {parsed_input['text']}")
-                
-                # 4. others: only check action_type
-                else:
-                    match = True
-                    messages.append(f"动作类型匹配: {action_type}")
-                
-                if match:
-                    edges.append(edge)
-                    break
-        
+
+        edges, messages, wait_edges = self.compiled_graph.match(current_node_id, parsed_input)
         if edges:
-            n = random.randint(0, len(edges)-1)
+            n = self.rng.randint(0, len(edges)-1)
             return edges[n], f"跳转成功: {messages[n]}", answer_text
 
         if wait_edges:
-            n = random.randint(0, len(wait_edges)-1)
+            n = self.rng.randint(0, len(wait_edges)-1)
             return wait_edges[n], f"没有匹配的动作条件，自动选择wait", answer_text
 
         return current_node_id, f"没有找到匹配的动作条件: {parsed_input}，停留在原地", answer_text
@@ -313,8 +243,9 @@ class Graph_DataSet:
             return None, None
 
         # global graph_data
-        if self.graph_data is None:
-            return None, "未加载到JSON数据，无法进行跳转判断", answer_text
+        if self.compiled_graph is None:
+            logger.error("未加载到JSON数据，无法进行跳转判断")
+            return None, None
 
         self.trajectory[-1]['action'] = user_input 
         if action_description:
@@ -0,0 +1,162 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Append-only run manifest for resumable evaluations.
+
+Every run directory (output_folder/config_name) gets a `run_manifest.jsonl`
+with one JSON record per line:
+
+    {"event": "run", "config_name": ..., "args": {...}, "time": ...}
+    {"event": "start", "task_key": ..., "query": ..., "time": ...}
+    {"event": "finish", "task_key": ..., "trajectory": ..., "result": {...}, "time": ...}
+
+A task is finished once its `finish` record is written, which happens after
+its trajectory has been saved. On `--resume <run_dir>` finished tasks are
+skipped; tasks that were started but never finished (in flight when the run
+died) are queued again and overwrite their partial trajectory folder. A resume
+must use the original run's args except for RESUMABLE_ARGS (scheduling, task
+range, abort thresholds), so one score never mixes two agent configurations.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'run_manifest.jsonl'
+
+# CLI args that change how a run is scheduled, not what the agent does; they may differ on --resume
+RESUMABLE_ARGS = frozenset({
+    'resume', 'task_start', 'task_end', 'abort_sr_below', 'abort_min_tasks',
+    'max_workers', 'max_concurrency', 'max_inflight_requests', 'endpoint_concurrency', 'endpoint_rps',
+    'batch_size', 'backend', 'max_batch', 'max_wait', 'poll_interval',
+})
+
+
+def task_key(task_item):
+    """Stable identity of a task: its task_id, or the query for task files without ids."""
+    task_id = task_item.get('task_id')
+    return str(task_id) if task_id is not None else task_item['query']
+
+
+class RunManifest:
+    """Thread-safe reader/writer of one run's manifest."""
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.path = os.path.join(run_dir, MANIFEST_FILE)
+        self.finished = {}
+        self.started = {}
+        self.runs = []
+        self._lock = threading.Lock()
+        os.makedirs(run_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash can leave a torn last line; everything before it is intact
+                    logger.warning(f"Skipping unreadable manifest line {line_no} in {self.path}")
+                    continue
+                event = record.get('event')
+                if event == 'run':
+                    self.runs.append(record)
+                elif event == 'start':
+                    self.started[record['task_key']] = record
+                elif event == 'finish':
+                    self.finished[record['task_key']] = record
+        # terminate a torn last line so the next record starts on a fresh line
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+        logger.info(f"Loaded run manifest {self.path}: {len(self.finished)} finished, {len(self.in_flight())} in flight")
+
+    def _append(self, record):
+        record['time'] = time.time()
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def in_flight(self):
+        """Keys of tasks that were started but never finished."""
+        return [key for key in self.started if key not in self.finished]
+
+    def is_finished(self, task_item):
+        return task_key(task_item) in self.finished
+
+    def pending(self, task_items):
+        """Filter `task_items` down to the tasks that still have to run."""
+        return [item for item in task_items if not self.is_finished(item)]
+
+    def finished_results(self, task_items=None):
+        """Result dicts of finished tasks, optionally only those in `task_items`."""
+        keys = None if task_items is None else {task_key(item) for item in task_items}
+        return [
+            record['result'] for key, record in self.finished.items()
+            if record.get('result') is not None and (keys is None or key in keys)
+        ]
+
+    def mark_run(self, config_name, args=None):
+        """Record a (re)start of the run; raises ValueError if a resume changes the original run's agent args."""
+        args = args or {}
+        if self.runs:
+            original = self.runs[0].get('args', {})
+            changed = sorted(key for key in set(original) & set(args)
+                             if key not in RESUMABLE_ARGS and original[key] != args[key])
+            if changed:
+                differences = ', '.join(f"{key}: {original[key]!r} -> {args[key]!r}" for key in changed)
+                raise ValueError(f"Cannot resume {self.run_dir} with different args ({differences})")
+        record = {'event': 'run', 'config_name': config_name, 'args': args}
+        self.runs.append(record)
+        self._append(record)
+
+    def mark_started(self, task_item):
+        record = {'event': 'start', 'task_key': task_key(task_item), 'query': task_item.get('query')}
+        with self._lock:
+            self.started[record['task_key']] = record
+        self._append(record)
+
+    def mark_finished(self, task_item, trajectory=None, result=None):
+        record = {'event': 'finish', 'task_key': task_key(task_item), 'trajectory': trajectory, 'result': result}
+        self._append(record)
+        with self._lock:
+            self.finished[record['task_key']] = record
+
+
+def resolve_run_dir(resume_dir, output_dir, config_name):
+    """Return (output_dir, config_name) of the run to write to, reusing `resume_dir` when resuming."""
+    if not resume_dir:
+        return output_dir, config_name
+    resume_dir = os.path.normpath(resume_dir)
+    if not os.path.isdir(resume_dir):
+        raise FileNotFoundError(f"Run directory to resume does not exist: {resume_dir}")
+    return os.path.dirname(resume_dir), os.path.basename(resume_dir)
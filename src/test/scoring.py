@@ -0,0 +1,387 @@
+# Copyright 2025 OPPO
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Milestone scoring shared by the offline scripts (parse_result*.py) and the
+live scorer of the evaluation runners.
+
+Offline, `score_checkpoints` scores many checkpoint directories in parallel
+processes. Each worker flattens the task file once into a `TaskTable` and
+every trajectory is read once; overall, single-app, multi-app and per-ability
+metrics then come out of one vectorized pass over all milestones.
+
+Rule (unchanged from get_successful_tasks_by_rule): a milestone is reached if
+any of its page nodes appears in the trajectory. A task is successful when all
+its milestones are reached. SR is the share of successful tasks, CR the mean
+share of reached milestones per task, and AC the per-ability accuracy, where
+every reached milestone counts once for its ability and only the first missed
+milestone of a task counts against its ability.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARS = ['/', ':', '*', '?', '"', '<', '>', '|']
+
+TaskScore = namedtuple('TaskScore', ['reached', 'total', 'reached_abilities', 'first_missed_ability'])
+
+
+def safe_task_name(query):
+    """Folder name save_trajectory uses for a task query."""
+    for ch in _UNSAFE_CHARS:
+        query = query.replace(ch, '_')
+    return query
+
+
+def load_tasks(task_json):
+    with open(task_json, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_trajectory(task_folder):
+    with open(os.path.join(task_folder, 'trajectory.json'), 'r', encoding='utf-8') as ft:
+        trajectory = json.load(ft)
+    if isinstance(trajectory, dict):
+        trajectory = trajectory['trajectory']
+    return trajectory
+
+
+def load_trajectory_screenshots(task_folder):
+    """Screenshots visited in `task_folder/trajectory.json`, for both the list and the dict trajectory layout."""
+    return [item['screenshot'] for item in _load_trajectory(task_folder)]
+
+
+def find_task_folder(checkpoint_path, query):
+    """Trajectory folder of `query`; older single-agent runs only replaced '/'."""
+    for name in (safe_task_name(query), query.replace('/', '_')):
+        folder = os.path.join(checkpoint_path, name)
+        if os.path.exists(os.path.join(folder, 'trajectory.json')):
+            return folder
+    return None
+
+
+def score_task(milestones, screenshots):
+    """Score one trajectory (an iterable or set of screenshots) against a task's milestones."""
+    screenshots = screenshots if isinstance(screenshots, (set, frozenset)) else set(screenshots)
+    reached = 0
+    reached_abilities = []
+    first_missed_ability = None
+    for milestone in milestones:
+        ability = milestone['ability']
+        pagenodes = milestone.get('page_node')
+        if pagenodes is not None and any(node in screenshots for node in pagenodes):
+            reached += 1
+            reached_abilities.append(ability)
+        elif first_missed_ability is None:
+            first_missed_ability = ability
+    return TaskScore(reached, len(milestones), reached_abilities, first_missed_ability)
+
+
+class TaskTable:
+    """
+    Array-backed view of a task file for vectorized milestone matching.
+    Milestones are numbered task by task in file order; every (milestone, page node)
+    pair is one entry, so "milestone reached" is a bincount over matched entries.
+    """
+
+    def __init__(self, all_tasks):
+        # later duplicates of a query win, like the {query: milestone} dicts of parse_result
+        tasks = {item['query']: item for item in all_tasks}
+        self.queries = list(tasks)
+        self.index = {query: i for i, query in enumerate(self.queries)}
+        self.app_nums = np.array([item.get('app_num', 1) for item in tasks.values()], dtype=np.int32)
+
+        self.node_ids = {}
+        self.abilities = []
+        ability_ids = {}
+        milestone_task, milestone_ability, entry_milestone, entry_node = [], [], [], []
+        for task_idx, item in enumerate(tasks.values()):
+            for milestone in item['milestone']:
+                milestone_idx = len(milestone_task)
+                milestone_task.append(task_idx)
+                ability = milestone['ability']
+                if ability not in ability_ids:
+                    ability_ids[ability] = len(self.abilities)
+                    self.abilities.append(ability)
+                milestone_ability.append(ability_ids[ability])
+                for node in milestone.get('page_node') or []:
+                    entry_milestone.append(milestone_idx)
+                    entry_node.append(self.node_ids.setdefault(node, len(self.node_ids)))
+
+        self.milestone_task = np.array(milestone_task, dtype=np.int64)
+        self.milestone_ability = np.array(milestone_ability, dtype=np.int64)
+        self.entry_milestone = np.array(entry_milestone, dtype=np.int64)
+        self.entry_node = np.array(entry_node, dtype=np.int64)
+        self.milestone_counts = np.bincount(self.milestone_task, minlength=len(self.queries))
+
+    def __len__(self):
+        return len(self.queries)
+
+    def subsets(self):
+        """Boolean task masks of the reported task groups."""
+        return {
+            'overall': np.ones(len(self.queries), dtype=bool),
+            'single': self.app_nums == 1,
+            'multi': self.app_nums > 1,
+        }
+
+    def match(self, screenshots_by_task):
+        """
+        Match trajectories against all milestones at once.
+        :param screenshots_by_task: {task index: iterable of visited screenshots}
+        :return: (milestone reached mask, reached milestone count per task)
+        """
+        visited = np.zeros((len(self.queries), max(len(self.node_ids), 1)), dtype=bool)
+        for task_idx, screenshots in screenshots_by_task.items():
+            ids = [self.node_ids[shot] for shot in screenshots if shot in self.node_ids]
+            visited[task_idx, ids] = True
+        entry_hit = visited[self.milestone_task[self.entry_milestone], self.entry_node]
+        reached = np.bincount(self.entry_milestone, weights=entry_hit, minlength=len(self.milestone_task)) > 0
+        task_reached = np.bincount(self.milestone_task, weights=reached, minlength=len(self.queries)).astype(np.int64)
+        return reached, task_reached
+
+    def metrics(self, reached, task_reached, mask):
+        """SR/CR/AC over the tasks selected by `mask` (only scored tasks should be selected)."""
+        counts = self.milestone_counts[mask]
+        done = task_reached[mask] == counts
+        rates = np.divide(task_reached[mask], counts, out=np.zeros(len(counts)), where=counts > 0)
+
+        milestone_mask = mask[self.milestone_task]
+        ability_success = np.bincount(self.milestone_ability[reached & milestone_mask], minlength=len(self.abilities))
+        # only the first missed milestone of a task counts against its ability
+        missed = np.flatnonzero(~reached & milestone_mask)
+        _, first = np.unique(self.milestone_task[missed], return_index=True)
+        ability_total = ability_success + np.bincount(self.milestone_ability[missed[first]], minlength=len(self.abilities))
+
+        scored = int(mask.sum())
+        return {
+            'scored': scored,
+            'completed': int(done.sum()),
+            'CR': float(rates.mean()) if scored else 0.0,
+            'AC': {
+                self.abilities[i]: float(ability_success[i] / ability_total[i])
+                for i in np.flatnonzero(ability_total)
+            },
+        }
+
+
+def _trajectory_folders(checkpoint_path, queries):
+    """Map every query to its trajectory folder with one directory listing; missing ones map to None."""
+    try:
+        names = set(os.listdir(checkpoint_path))
+    except FileNotFoundError:
+        logger.error(f"Checkpoint directory does not exist: {checkpoint_path}")
+        names = set()
+    folders = {}
+    for query in queries:
+        folder = None
+        for name in (safe_task_name(query), query.replace('/', '_')):
+            if name in names:
+                folder = os.path.join(checkpoint_path, name)
+                break
+        folders[query] = folder
+    return folders
+
+
+def score_checkpoint(checkpoint_path, table):
+    """
+    Score one checkpoint directory (trajectories of either runner layout).
+    Returns a JSON-serializable dict with per-group metrics, per-task scores and
+    the tasks whose trajectory is missing (those are left out of every metric).
+    """
+    screenshots_by_task = {}
+    steps = {}
+    missing = []
+    for query, folder in _trajectory_folders(checkpoint_path, table.queries).items():
+        try:
+            trajectory = _load_trajectory(folder) if folder else None
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Cannot read trajectory of {query} in {checkpoint_path}: {e}")
+            trajectory = None
+        if trajectory is None:
+            missing.append(query)
+            continue
+        task_idx = table.index[query]
+        screenshots_by_task[task_idx] = [item['screenshot'] for item in trajectory]
+        steps[task_idx] = len(trajectory)
+
+    reached, task_reached = table.match(screenshots_by_task)
+    scored_mask = np.zeros(len(table), dtype=bool)
+    scored_mask[list(screenshots_by_task)] = True
+
+    result = {'checkpoint': checkpoint_path, 'missing': missing}
+    for group, group_mask in table.subsets().items():
+        metrics = table.metrics(reached, task_reached, scored_mask & group_mask)
+        metrics['total'] = int(group_mask.sum())
+        metrics['SR'] = metrics['completed'] / metrics['total'] if metrics['total'] else 0.0
+        result[group] = metrics
+    result['tasks'] = {
+        table.queries[task_idx]: {
+            'reached': int(task_reached[task_idx]),
+            'total': int(table.milestone_counts[task_idx]),
+            'steps': steps[task_idx],
+        }
+        for task_idx in sorted(screenshots_by_task)
+    }
+    return result
+
+
+_worker_table = None
+
+
+def _init_worker(all_tasks):
+    global _worker_table
+    _worker_table = TaskTable(all_tasks)
+
+
+def _score_in_worker(checkpoint_path):
+    return score_checkpoint(checkpoint_path, _worker_table)
+
+
+def score_checkpoints(checkpoint_paths, all_tasks, workers=None):
+    """
+    Score many checkpoint directories, in parallel processes when workers > 1.
+    Results come back in the order of `checkpoint_paths`.
+    """
+    checkpoint_paths = list(checkpoint_paths)
+    if workers is None:
+        workers = min(len(checkpoint_paths), os.cpu_count() or 1)
+    if workers <= 1 or len(checkpoint_paths) <= 1:
+        table = TaskTable(all_tasks)
+        return [score_checkpoint(path, table) for path in checkpoint_paths]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(all_tasks,)) as executor:
+        return list(executor.map(_score_in_worker, checkpoint_paths))
+
+
+class IncrementalScorer:
+    """
+    Keeps SR, CR and per-ability AC up to date as trajectories arrive.
+    Thread-safe; `metrics()` can be read at any time.
+    """
+
+    def __init__(self, all_tasks, queries=None):
+        """
+        :param all_tasks: task list as in data/tasks.json
+        :param queries: only these queries belong to the run (default: all tasks)
+        """
+        self.tasks = {item['query']: item for item in all_tasks}
+        self.expected = len(queries) if queries is not None else len(self.tasks)
+        self.completed = set()
+        self.scored = {}
+        self.ability_total = defaultdict(int)
+        self.ability_success = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, query, screenshots):
+        """Score one finished task; returns its TaskScore (None for unknown queries)."""
+        task = self.tasks.get(query)
+        if task is None:
+            logger.warning(f"Task not found in task file, not scored: {query}")
+            return None
+        score = score_task(task['milestone'], screenshots)
+        with self._lock:
+            previous = self.scored.get(query)
+            if previous is not None:
+                # a re-run task replaces its earlier score
+                self._apply(previous, -1)
+                self.completed.discard(query)
+            self.scored[query] = score
+            self._apply(score, 1)
+            if score.reached == score.total:
+                self.completed.add(query)
+        return score
+
+    def add_trajectory(self, query, task_folder):
+        return self.add(query, load_trajectory_screenshots(task_folder))
+
+    def _apply(self, score, sign):
+        for ability in score.reached_abilities:
+            self.ability_success[ability] += sign
+            self.ability_total[ability] += sign
+        if score.first_missed_ability is not None:
+            self.ability_total[score.first_missed_ability] += sign
+
+    def metrics(self):
+        with self._lock:
+            scored = len(self.scored)
+            rates = [score.reached / score.total if score.total > 0 else 0 for score in self.scored.values()]
+            return {
+                'scored_tasks': scored,
+                'expected_tasks': self.expected,
+                'completed_tasks': len(self.completed),
+                # SR over scored tasks while running; equals SR over the run once everything is scored
+                'SR': len(self.completed) / scored if scored else 0.0,
+                'CR': sum(rates) / scored if scored else 0.0,
+                'AC': {
+                    ability: self.ability_success[ability] / total
+                    for ability, total in self.ability_total.items() if total > 0
+                },
+            }
+
+
+class ResultStream:
+    """Append-only JSONL stream of per-task records, flushed as each task finishes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+
+
+def stream_task_result(result, scorer, stream):
+    """
+    Score a runner result dict from its saved trajectory, append it to `stream`
+    together with the live metrics and return those metrics.
+    """
+    record = dict(result)
+    task_folder = result.get('trajectory')
+    score = None
+    if task_folder and os.path.exists(os.path.join(task_folder, 'trajectory.json')):
+        score = scorer.add_trajectory(result['task'], task_folder)
+    elif 'error' in result and result.get('task'):
+        # a task that raised reached no milestone; it still counts toward SR and scored_tasks
+        score = scorer.add(result['task'], [])
+    if score is not None:
+        record['milestones_reached'] = score.reached
+        record['milestones_total'] = score.total
+    metrics = scorer.metrics()
+    record['metrics'] = metrics
+    stream.write(record)
+    return metrics
+
+
+def should_abort(metrics, sr_below=None, min_tasks=20):
+    """True once at least `min_tasks` are scored and SR is below `sr_below`."""
+    return sr_below is not None and metrics['scored_tasks'] >= min_tasks and metrics['SR'] < sr_below
+
+
+def format_metrics(metrics):
+    ac = ', '.join(f"{ability}: {rate:.2%}" for ability, rate in sorted(metrics['AC'].items()))
+    return (f"{metrics['scored_tasks']}/{metrics['expected_tasks']} scored, "
+            f"SR: {metrics['SR']:.2%}, CR: {metrics['CR']:.2%}, AC: {{{ac}}}")
@@ -18,6 +18,8 @@ import numpy as np
 import base64
 import requests
 from openai import OpenAI
+from src.response_cache import cached_response
+from src.agent.transport import call_with_retries, get_retry_policy
 
 def calculate_cos_similarity_A_and_Batch_B(A, B):
     dot_product = np.dot(A, B.T)
@@ -62,39 +64,31 @@ class LLMClient:
             raise ValueError("VLM_API_KEY environment variable is not set")
         if not self.base_url:
             raise ValueError("VLM_BASE_URL environment variable is not set")
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
         self.model = "qwen2.5-vl-72b-instruct"
 
     def encode_image(self, image_path):
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
 
+    @cached_response()
     def get_response_vlm(self, messages, max_retries=20, retry_delay=5, stream=False, temperature=0.1, **kwargs):
         """
-        Get response from VLM model with single image input
+        Get response from VLM model with single image input.
+        Retries go through src/agent/transport.py: max_retries caps them, retry_delay is the first backoff.
         """
-       
-        retries = 0
-        while retries <= max_retries:
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=temperature,
-                    stream=stream,
-                    **kwargs
-                ).choices[0].message.content
-
-                return response
-            
-            except requests.exceptions.RequestException as e:
-                print(f"Request failed with exception: {e}")
-            
-            retries += 1
-            if retries <= max_retries:
-                print(f"Retrying... Attempt {retries}/{max_retries}")
-                time.sleep(retry_delay)
-        
-        print("Max retries reached. Request failed.")
-        return None
+        policy = get_retry_policy()._replace(max_retries=max_retries, base_delay=retry_delay)
+
+        def request(timeout):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                stream=stream,
+                timeout=timeout,
+                **kwargs
+            )
+            return response if stream else response.choices[0].message.content
+
+        return call_with_retries(request, endpoint=self.base_url, policy=policy)
 